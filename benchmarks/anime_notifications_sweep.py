@@ -0,0 +1,85 @@
+"""
+Seed anime_notifications.db with subscriptions and time a notification sweep.
+
+Compares the original schema (version 1, UNIQUE constraints only) against the
+latest migration. Run from the repository root:
+
+    python benchmarks/anime_notifications_sweep.py --subscriptions 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.anime_notifications_schema import MIGRATIONS, NOTIFIED_SQL, SUBSCRIBED_ANIME_SQL, SUBSCRIBERS_SQL  # noqa: E402
+from utils.migrations import migrate  # noqa: E402
+
+
+def seed(conn: sqlite3.Connection, subscriptions: int, shows: int, guilds: int, rng: random.Random):
+    rows = set()
+    while len(rows) < subscriptions:
+        guild_id = rng.randrange(guilds)
+        rows.add((rng.randrange(subscriptions // 3), rng.randrange(shows), guild_id))
+
+    conn.executemany(
+        "INSERT INTO anime_subscriptions (user_id, anime_id, anime_title, guild_id, channel_id) VALUES (?, ?, ?, ?, ?)",
+        ((user_id, anime_id, f"Anime {anime_id}", guild_id, guild_id * 10 + user_id % 3) for user_id, anime_id, guild_id in rows)
+    )
+    conn.executemany(
+        "INSERT INTO notified_episodes (anime_id, episode_number) VALUES (?, ?)",
+        ((anime_id, episode) for anime_id in range(shows) for episode in range(1, 13))
+    )
+    conn.commit()
+
+
+def sweep(conn: sqlite3.Connection, aired: list) -> float:
+    """One scheduler pass: list subscribed shows, then dedupe and fan out each aired episode"""
+    started = time.perf_counter()
+    conn.execute(SUBSCRIBED_ANIME_SQL).fetchall()
+    for anime_id, episode in aired:
+        conn.execute(NOTIFIED_SQL, (anime_id, episode)).fetchone()
+        conn.execute(SUBSCRIBERS_SQL, (anime_id,)).fetchall()
+    return time.perf_counter() - started
+
+
+def run(version: int, args) -> None:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        conn = sqlite3.connect(os.path.join(directory, "anime_notifications.db"))
+        migrate(conn, [m for m in MIGRATIONS if m[0] <= 1], "benchmark")
+        seed(conn, args.subscriptions, args.shows, args.guilds, rng)
+        migrate(conn, [m for m in MIGRATIONS if m[0] <= version], "benchmark")
+        conn.execute("ANALYZE")
+
+        aired = [(rng.randrange(args.shows), 13) for _ in range(args.aired)]
+        timings = sorted(sweep(conn, aired) for _ in range(args.repeat))
+        plan = conn.execute("EXPLAIN QUERY PLAN " + SUBSCRIBERS_SQL, (0,)).fetchall()
+        conn.close()
+
+    print(f"schema v{version}: best {timings[0] * 1000:.1f} ms, median {timings[len(timings) // 2] * 1000:.1f} ms "
+          f"for {args.aired} aired episodes over {args.subscriptions} subscriptions")
+    print(f"  subscribers plan: {'; '.join(row[-1] for row in plan)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    parser.add_argument("--shows", type=int, default=3_000)
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--aired", type=int, default=200, help="aired episodes handled per sweep")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    latest = max(migration[0] for migration in MIGRATIONS)
+    for version in sorted({1, latest}):
+        run(version, args)
+
+
+if __name__ == "__main__":
+    main()
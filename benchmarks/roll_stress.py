@@ -0,0 +1,132 @@
+"""
+Fire hundreds of simultaneous rolls at a small character pool and count double-claims.
+
+Every simulated roll runs utils.availability.roll_and_claim, the sequence /roll uses:
+a pick that looks like fetch_anime_character (choose an unclaimed character, wait as if
+on AniList and store_character, check it is still unclaimed), the in-memory reservation
+and the compare-and-set claim through the anigame.db writer. Three setups are compared:
+
+    reserve  the bot as it runs, bitset reservation plus the compare-and-set claim
+    cas      no reservation, losers are caught by the compare-and-set claim
+    unsafe   no reservation and the old unconditional UPDATE and INSERT
+
+Run from the repository root:
+
+    python benchmarks/roll_stress.py --rolls 500 --characters 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.anigame_db import AniGameDB  # noqa: E402
+from utils.anigame_schema import MIGRATIONS  # noqa: E402
+from utils.availability import AvailabilityIndex, claim_character, roll_and_claim  # noqa: E402
+from utils.migrations import migrate  # noqa: E402
+
+SERVER_ID = 1
+
+
+def seed(conn: sqlite3.Connection, characters: int, users: int):
+    migrate(conn, MIGRATIONS, "benchmark")
+    conn.executemany(
+        "INSERT INTO users (user_id, server_id, balance) VALUES (?, ?, 0)",
+        ((user_id, SERVER_ID) for user_id in range(users))
+    )
+    conn.executemany(
+        "INSERT INTO characters (character_id, anime_id, server_id, name, anime, image_url, available, role) "
+        "VALUES (?, ?, ?, ?, ?, '', 1, 'MAIN')",
+        ((character_id, character_id // 10, SERVER_ID, f"Character {character_id}", f"Anime {character_id // 10}")
+         for character_id in range(characters))
+    )
+
+
+def unsafe_claim(conn: sqlite3.Connection, user_id: int, server_id: int, character_id: int, now: int) -> bool:
+    conn.execute("UPDATE characters SET available = 0 WHERE character_id = ? AND server_id = ?", (character_id, server_id))
+    conn.execute(
+        "INSERT INTO collections (user_id, server_id, character_id, obtained_at) VALUES (?, ?, ?, ?)",
+        (user_id, server_id, character_id, now)
+    )
+    conn.execute("UPDATE users SET last_roll = ? WHERE user_id = ? AND server_id = ?", (now, user_id, server_id))
+    return True
+
+
+class UnreservedIndex(AvailabilityIndex):
+    """Availability index without reservations, for the cas and unsafe setups"""
+
+    def reserve(self, server_id: int, character_id: int) -> bool:
+        return True
+
+
+async def run(mode: str, args) -> None:
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db = AniGameDB(os.path.join(directory, "anigame.db"))
+        db.write_sync(lambda conn: seed(conn, args.characters, args.users), "seed")
+        availability = AvailabilityIndex() if mode == "reserve" else UnreservedIndex()
+        db.read_sync(availability.load, "load_availability")
+
+        cast = list(range(args.characters))
+        counts = {"picks": 0, "empty": 0, "failed": 0}
+
+        async def pick():
+            while True:
+                candidates = availability.unclaimed(SERVER_ID, cast)
+                if not candidates:
+                    counts["empty"] += 1
+                    return None
+                character_id = rng.choice(candidates)
+                counts["picks"] += 1
+
+                # Stand-in for the AniList and store_character awaits between choosing and returning
+                await asyncio.sleep(rng.random() * args.jitter_ms / 1000)
+                if not availability.is_claimed(SERVER_ID, character_id):
+                    return (character_id, character_id // 10, SERVER_ID)
+
+        async def roll(user_id: int):
+            claim = unsafe_claim if mode == "unsafe" else claim_character
+            character = await roll_and_claim(db, availability, pick, user_id, SERVER_ID, args.attempts, claim)
+            if character is None:
+                counts["failed"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(roll(rng.randrange(args.users)) for _ in range(args.rolls)))
+        elapsed = time.perf_counter() - started
+
+        duplicates = db.read_sync(lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM (SELECT character_id FROM collections WHERE server_id = ? "
+            "GROUP BY character_id HAVING COUNT(*) > 1)", (SERVER_ID,)
+        ).fetchone()[0])
+        rows = db.read_sync(lambda conn: conn.execute("SELECT COUNT(*) FROM collections").fetchone()[0])
+        db.close()
+
+    print(f"{mode:>7}: {args.rolls} rolls in {elapsed * 1000:.0f} ms, {rows} collection rows, "
+          f"{duplicates} double-claimed characters")
+    print(f"         {counts['picks']} picks, {args.rolls - counts['failed']} rolls claimed, "
+          f"{counts['failed']} rolls gave up ({counts['empty']} found nothing left)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rolls", type=int, default=500, help="simultaneous rolls")
+    parser.add_argument("--characters", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--attempts", type=int, default=5, help="picks per roll before giving up")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="longest simulated AniList wait")
+    parser.add_argument("--mode", choices=["reserve", "cas", "unsafe"], action="append",
+                        help="claim strategy to run (repeatable, default all)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for mode in args.mode or ["reserve", "cas", "unsafe"]:
+        asyncio.run(run(mode, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,211 @@
 import nextcord
-from nextcord.ext import commands
-import aiohttp
+from nextcord.ext import commands, tasks
 import random
-import asyncio
 import time
-import sqlite3
 import datetime
-import re
 import json
 from typing import Optional, Tuple, List, Dict, Any
+from utils.anigame_db import get_anigame_db, release_anigame_db
+from utils.ledger import BalanceLedger
+from utils.economy import get_economy
+from utils.cooldowns import CooldownStore, DAILY, ROLL, WEEKLY
+from utils.character_pool import CharacterPool
+from utils.migrations import migrate
+from utils.anigame_schema import MIGRATIONS
+from utils.character_search import get_character_search
+from utils.valuation import CharacterValuation
+from utils.availability import AvailabilityIndex, roll_and_claim
+from utils.trade_engine import TradeEngine, TradeError
+from utils.leaderboard import BALANCE, COLLECTION_SIZE, COLLECTION_VALUE, get_leaderboards
+from utils.anilist_client import AniListError, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_anilist_client, release_anilist_client
+
+class CollectionView(nextcord.ui.View):
+    """Prev/next pager for /collection that renders each page once and caches it for the view's lifetime"""
+
+    def __init__(self, cog, owner_id: int, target_user, server_id: int, total: int, max_pages: int, balance: int):
+        super().__init__(timeout=60)
+        self.cog = cog
+        self.owner_id = owner_id
+        self.target_user = target_user
+        self.server_id = server_id
+        self.total = total
+        self.max_pages = max_pages
+        self.balance = balance
+        self.page = 1
+        self.pages: Dict[int, nextcord.Embed] = {}
+        self.bounds: Dict[int, Tuple[Tuple[int, int], Tuple[int, int]]] = {}  # page -> (first key, last key)
+
+    async def interaction_check(self, interaction: nextcord.Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    async def get_page(self, page: int) -> nextcord.Embed:
+        """Return a page's embed, querying only pages that haven't been rendered yet"""
+        if page not in self.pages:
+            user_id = self.target_user.id
+            if page == 1:
+                rows = await self.cog.fetch_collection_page(user_id, self.server_id)
+            elif page - 1 in self.bounds:
+                rows = await self.cog.fetch_collection_page(user_id, self.server_id, after=self.bounds[page - 1][1])
+            elif page + 1 in self.bounds:
+                rows = await self.cog.fetch_collection_page(user_id, self.server_id, before=self.bounds[page + 1][0])
+            else:
+                start = await self.cog.collection_page_start(user_id, self.server_id, page)
+                rows = await self.cog.fetch_collection_page(user_id, self.server_id, after=start)
+            
+            if rows:
+                self.bounds[page] = ((rows[0][9], rows[0][8]), (rows[-1][9], rows[-1][8]))
+            self.pages[page] = self.render(page, rows)
+        
+        self.page = page
+        self.previous_page.disabled = page <= 1
+        self.next_page.disabled = page >= self.max_pages
+        return self.pages[page]
+
+    def render(self, page: int, characters: List[tuple]) -> nextcord.Embed:
+        # Create embed
+        embed = nextcord.Embed(
+            title=f"{self.target_user.display_name}'s Anime Collection",
+            description=f"Showing page {page}/{self.max_pages} ({self.total}/{self.cog.max_collection} characters)",
+            color=0x1F85DE
+        )
+
+        # Add balance info in the footer
+        embed.set_footer(text=f"Balance: {self.balance} credits | Use /roll or /buyroll to get more characters!")
+        
+        # Add each character to the embed with thumbnails
+        for idx, character in enumerate(characters):
+            char_id, anime_id, char_server_id, name, anime, image_url, available, role, collection_id, _ = character
+            
+            # Set character thumbnail to embed
+            if idx == 0:  # Set the first character as the main thumbnail
+                embed.set_thumbnail(url=image_url)
+            
+            # Add character info to embed
+            embed.add_field(
+                name=f"{name} (ID: {char_id})",
+                value=f"From: {anime}\nRole: {role}\nCollection ID: {collection_id}\n[View Image]({image_url})",
+                inline=False
+            )
+        
+        return embed
+
+    @nextcord.ui.button(label="Previous Page", style=nextcord.ButtonStyle.gray)
+    async def previous_page(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
+        embed = await self.get_page(self.page - 1)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @nextcord.ui.button(label="Next Page", style=nextcord.ButtonStyle.gray)
+    async def next_page(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
+        embed = await self.get_page(self.page + 1)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+class TradeView(nextcord.ui.View):
+    """Accept/decline buttons of one trade offer, persistent so they keep working after a restart"""
+
+    def __init__(self, cog, trade_id: int):
+        super().__init__(timeout=None)
+        self.cog = cog
+        self.trade_id = trade_id
+        
+        # Custom IDs carry the trade, which is how a restored view finds it again
+        accept_button = nextcord.ui.Button(
+            label="Accept Trade",
+            style=nextcord.ButtonStyle.green,
+            custom_id=f"anigame_trade_accept_{trade_id}"
+        )
+        decline_button = nextcord.ui.Button(
+            label="Decline Trade",
+            style=nextcord.ButtonStyle.red,
+            custom_id=f"anigame_trade_decline_{trade_id}"
+        )
+        accept_button.callback = self.accept
+        decline_button.callback = self.decline
+        self.add_item(accept_button)
+        self.add_item(decline_button)
+
+    async def accept(self, interaction: nextcord.Interaction):
+        if await self.cog.accept_trade(interaction, self.trade_id):
+            self.cog.drop_trade_view(self.trade_id)
+
+    async def decline(self, interaction: nextcord.Interaction):
+        if await self.cog.decline_trade(interaction, self.trade_id):
+            self.cog.drop_trade_view(self.trade_id)
 
 class AnimeCollect(commands.Cog):
     """Anime character collection system using AniList API - modern anime main characters"""
 
     def __init__(self, bot):
         self.bot = bot
-        self.anilist_api_url = "https://graphql.anilist.co"
         self.roll_cooldown = 86400  
+        self.daily_cooldown = 86400  # 24 hours
+        self.weekly_cooldown = 604800  # 7 days
+        self.daily_amount = 250
+        self.weekly_amount = 1000
         self.roll_cost = 100
         self.max_collection = 100
         self.min_year = 2012  # Minimum year for anime
+        self.max_roll_attempts = 5  # Random anime to try before giving up on a roll
+        self.collection_page_size = 5
         
-        # Connect to SQLite database
-        self.conn = sqlite3.connect('anigame.db')
-        self.cursor = self.conn.cursor()
+        # Shared off-loop storage engine for anigame.db
+        self.db = get_anigame_db(bot)
+        self.economy = get_economy(bot)
         self.setup_database()
+        self.search_index = get_character_search(bot)
+        self.valuation = CharacterValuation()
+        
+        # In-memory mirror of which characters are claimed in each server
+        self.availability = AvailabilityIndex()
+        self.db.read_sync(self.availability.load, "load_availability")
+        
+        # Cooldowns are checked in memory and written to the database in the background
+        self.cooldowns = CooldownStore(self.db, {ROLL: self.roll_cooldown, DAILY: self.daily_cooldown, WEEKLY: self.weekly_cooldown})
+        self.db.read_sync(self.cooldowns.load, "load_cooldowns")
+        
+        # Per-server rankings, balances reach them through the ledger
+        self.leaderboards = get_leaderboards(bot)
+        
+        # Shared rate-limited AniList client (with its on-disk response cache)
+        self.anilist = get_anilist_client(bot)
+        
+        # Pre-warmed per-server pool of rollable characters, refilled in the background
+        self.character_pool = CharacterPool(self.fetch_pool_candidates, self.find_claimed_characters)
+        self.refill_character_pools.start()
+        
+        # Pending trades live in the database, their buttons are re-attached on startup
+        self.trades = TradeEngine(self.db)
+        self.trade_views: Dict[int, TradeView] = {}
+        self.expire_trades.start()
+
+    async def cog_unload(self):
+        """Stop background work and release the shared storage engine and AniList client when the cog is unloaded"""
+        self.refill_character_pools.cancel()
+        self.expire_trades.cancel()
+        for trade_id in list(self.trade_views):
+            self.drop_trade_view(trade_id)
+        await release_anigame_db(self.bot)
+        await release_anilist_client(self.bot)
 
     def setup_database(self):
-        """Create necessary tables if they don't exist - with server_id field for server separation"""
-        # Define all tables in a single place with server_id fields
-        tables = [
-            '''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER,
-                server_id INTEGER,
-                balance INTEGER DEFAULT 0,
-                last_roll INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, server_id)
-            )
-            ''',
-            '''
-            CREATE TABLE IF NOT EXISTS characters (
-                character_id INTEGER,
-                anime_id INTEGER,
-                server_id INTEGER,
-                name TEXT,
-                anime TEXT,
-                image_url TEXT,
-                available INTEGER DEFAULT 1,
-                role TEXT DEFAULT 'MAIN',
-                PRIMARY KEY (character_id, server_id)
-            )
-            ''',
-            '''
-            CREATE TABLE IF NOT EXISTS collections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                server_id INTEGER,
-                character_id INTEGER,
-                obtained_at INTEGER,
-                FOREIGN KEY (user_id, server_id) REFERENCES users (user_id, server_id)
-            )
-            ''',
-            '''
-            CREATE TABLE IF NOT EXISTS trades (
-                trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sender_id INTEGER,
-                receiver_id INTEGER,
-                server_id INTEGER,
-                character_id INTEGER,
-                status TEXT DEFAULT 'pending',
-                created_at INTEGER
-            )
-            ''',
-            '''
-            CREATE TABLE IF NOT EXISTS trade_requests (
-                trade_id INTEGER PRIMARY KEY,
-                request_char_id INTEGER,
-                FOREIGN KEY (trade_id) REFERENCES trades (trade_id)
-            )
-            ''',
-            '''
-            CREATE TABLE IF NOT EXISTS rewards_cooldown (
-                user_id INTEGER,
-                server_id INTEGER,
-                last_daily INTEGER DEFAULT 0,
-                last_weekly INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, server_id)
-            )
-            '''
-        ]
+        """Bring anigame.db up to the latest schema version - with server_id field for server separation"""
+        # Migrations run inside one transaction on the writer thread
+        self.db.write_sync(lambda conn: migrate(conn, MIGRATIONS, "anigame.db"), "setup_database")
+
+    async def anilist_query(self, query: str, variables: Dict[str, Any], kind: str, priority: int = PRIORITY_INTERACTIVE) -> Optional[Dict[str, Any]]:
+        """Run an AniList GraphQL query through the shared client and cache, returning its data or None"""
+        try:
+            data = await self.anilist.query(query, variables, priority=priority, cache_kind=kind)
+        except AniListError as e:
+            print(f"Error querying AniList: {e}")
+            return None
         
-        # Execute all table creation statements
-        for table in tables:
-            self.cursor.execute(table)
+        if not data or "errors" in data:
+            print(f"AniList API error: {data.get('errors') if data else 'empty response'}")
+            return None
         
-        self.conn.commit()
+        return data.get("data")
 
-    async def fetch_random_modern_anime(self, session: aiohttp.ClientSession) -> Dict[str, Any]:
+    async def fetch_random_modern_anime(self, priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
         """Fetch a random modern anime from AniList API"""
         # GraphQL query for random modern anime
         # Fetches popular anime from 2012 onwards
@@ -129,44 +237,20 @@ class AnimeCollect(commands.Cog):
             "minYear": self.min_year * 10000  # AniList format: YYYYMMDD (we only need year, so multiply by 10000)
         }
         
-        try:
-            async with session.post(
-                self.anilist_api_url,
-                json={"query": query, "variables": variables},
-                timeout=10
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if "errors" in data:
-                        print(f"AniList API error: {data['errors']}")
-                        return None
-                    
-                    anime_list = data.get("data", {}).get("Page", {}).get("media", [])
-                    
-                    if not anime_list:
-                        print("No anime found")
-                        return None
-                    
-                    # Pick a random anime from the results
-                    return random.choice(anime_list)
-                else:
-                    # Handle API rate limiting
-                    if response.status == 429:
-                        print("Rate limited by AniList API, waiting...")
-                        await asyncio.sleep(2)
-                        return await self.fetch_random_modern_anime(session)
-                    
-                    print(f"AniList API returned status {response.status}")
-                    response_text = await response.text()
-                    print(f"Error details: {response_text[:200]}")
-                    return None
-                    
-        except Exception as e:
-            print(f"Error fetching random anime from AniList: {e}")
+        data = await self.anilist_query(query, variables, "popularity_page", priority)
+        if not data:
+            return None
+        
+        anime_list = data.get("Page", {}).get("media", [])
+        
+        if not anime_list:
+            print("No anime found")
             return None
+        
+        # Pick a random anime from the results
+        return random.choice(anime_list)
 
-    async def fetch_anime_main_characters(self, session: aiohttp.ClientSession, anime_id: int) -> List[Dict[str, Any]]:
+    async def fetch_anime_main_characters(self, anime_id: int, priority: int = PRIORITY_INTERACTIVE) -> List[Dict[str, Any]]:
         """Fetch main characters for a specific anime from AniList API"""
         # GraphQL query for main anime characters
         query = """
@@ -201,61 +285,148 @@ class AnimeCollect(commands.Cog):
             "animeId": anime_id
         }
         
-        try:
-            async with session.post(
-                self.anilist_api_url,
-                json={"query": query, "variables": variables},
-                timeout=10
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if "errors" in data:
-                        print(f"AniList API error: {data['errors']}")
-                        return []
-                    
-                    media_data = data.get("data", {}).get("Media", {})
-                    title = media_data.get("title", {}).get("english") or media_data.get("title", {}).get("romaji", "Unknown Anime")
-                    year = media_data.get("startDate", {}).get("year")
-                    
-                    characters_data = []
-                    if "characters" in media_data and "edges" in media_data["characters"]:
-                        for edge in media_data["characters"]["edges"]:
-                            node = edge.get("node", {})
-                            role = edge.get("role")
-                            
-                            if node and role == "MAIN":
-                                characters_data.append({
-                                    "id": node.get("id"),
-                                    "name": node.get("name", {}).get("full", "Unknown"),
-                                    "image_url": node.get("image", {}).get("large"),
-                                    "anime_title": title,
-                                    "anime_id": anime_id,
-                                    "anime_year": year,
-                                    "role": "MAIN"
-                                })
-                    
-                    return characters_data
-                else:
-                    # Handle API rate limiting
-                    if response.status == 429:
-                        print("Rate limited by AniList API, waiting...")
-                        await asyncio.sleep(2)
-                        return await self.fetch_anime_main_characters(session, anime_id)
-                    
-                    print(f"AniList API returned status {response.status}")
-                    response_text = await response.text()
-                    print(f"Error details: {response_text[:200]}")
-                    return []
-                    
-        except Exception as e:
-            print(f"Error fetching characters from AniList: {e}")
+        data = await self.anilist_query(query, variables, "media_characters", priority)
+        if not data:
+            return []
+        
+        media_data = data.get("Media") or {}
+        title = media_data.get("title", {}).get("english") or media_data.get("title", {}).get("romaji", "Unknown Anime")
+        year = media_data.get("startDate", {}).get("year")
+        
+        characters_data = []
+        if "characters" in media_data and "edges" in media_data["characters"]:
+            for edge in media_data["characters"]["edges"]:
+                node = edge.get("node", {})
+                role = edge.get("role")
+                
+                if node and role == "MAIN":
+                    characters_data.append({
+                        "id": node.get("id"),
+                        "name": node.get("name", {}).get("full", "Unknown"),
+                        "image_url": node.get("image", {}).get("large"),
+                        "anime_title": title,
+                        "anime_id": anime_id,
+                        "anime_year": year,
+                        "role": "MAIN"
+                    })
+        
+        return characters_data
+
+    async def fetch_pool_candidates(self) -> List[Dict[str, Any]]:
+        """Fetch the main characters of one random modern anime for the character pool"""
+        anime = await self.fetch_random_modern_anime(PRIORITY_BACKGROUND)
+        if not anime:
             return []
+        return await self.fetch_anime_main_characters(anime["id"], PRIORITY_BACKGROUND)
+
+    async def find_claimed_characters(self, server_id: int, character_ids: List[int]) -> set:
+        """Return which of the given characters are already claimed in a server"""
+        return {char_id for char_id in character_ids if self.availability.is_claimed(server_id, char_id)}
 
-    async def fetch_anime_character(self, session: aiohttp.ClientSession, server_id: int) -> Optional[tuple]:
-        """Fetch a random main character from a random modern anime"""
-        # First, get a random modern anime
-        anime = await self.fetch_random_modern_anime(session)
+    async def store_character(self, server_id: int, char_data: Dict[str, Any]) -> Optional[tuple]:
+        """Return the server's row for a fetched character, inserting it if needed, or None if it's claimed"""
+        char_id = char_data["id"]
+        name = char_data["name"]
+        anime_title = char_data["anime_title"]
+        anime_year = char_data["anime_year"]
+        
+        # Format anime name with year
+        anime_display = f"{anime_title} ({anime_year})" if anime_year else anime_title
+        
+        # Claimed characters are known in memory, no need to look them up
+        if self.availability.is_claimed(server_id, char_id):
+            return None
+        
+        # Check if character already exists in this server
+        existing_char = await self.db.fetchone(
+            "SELECT * FROM characters WHERE character_id = ? AND server_id = ?", 
+            (char_id, server_id)
+        )
+        
+        # If character exists and is not available, skip
+        if existing_char and existing_char[6] == 0:  # index 6 is 'available'
+            return None
+        
+        # If character exists and is available, return it
+        if existing_char:
+            print(f"Found existing available character: {name}")
+            return existing_char
+        
+        # Insert and read back the stored row in the same write transaction
+        def insert_character(conn):
+            conn.execute(
+                "INSERT OR IGNORE INTO characters (character_id, anime_id, server_id, name, anime, image_url, available, role, anime_year) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)",
+                (char_id, char_data["anime_id"], server_id, name, anime_display, char_data["image_url"], char_data["role"], anime_year)
+            )
+            return conn.execute(
+                "SELECT * FROM characters WHERE character_id = ? AND server_id = ?", 
+                (char_id, server_id)
+            ).fetchone()
+        
+        char = await self.db.write(insert_character, "insert_character")
+        print(f"Added new character to database: {name}")
+        return char
+
+    async def pick_pooled_character(self, server_id: int) -> Optional[tuple]:
+        """Take characters from the server's pool until one is still unclaimed"""
+        while True:
+            char_data = self.character_pool.take(server_id)
+            if char_data is None:
+                return None
+            
+            character = await self.store_character(server_id, char_data)
+            if character and not self.availability.is_claimed(server_id, character[0]):
+                return character
+
+    @tasks.loop(seconds=15)
+    async def refill_character_pools(self):
+        """Keep every active server's character pool topped up in the background"""
+        for server_id in self.character_pool.needs_refill():
+            try:
+                await self.character_pool.refill(server_id)
+            except Exception as e:
+                print(f"Error refilling character pool for server {server_id}: {e}")
+
+    @refill_character_pools.before_loop
+    async def before_refill_character_pools(self):
+        """Wait until the bot is ready, then start warming pools for servers that already play"""
+        await self.bot.wait_until_ready()
+        rows = await self.db.fetchall("SELECT DISTINCT server_id FROM users")
+        self.character_pool.track(row[0] for row in rows)
+
+    @tasks.loop(minutes=10)
+    async def expire_trades(self):
+        """Expire trade offers nobody answered within the trade TTL and close their messages"""
+        for trade in await self.trades.expire():
+            self.drop_trade_view(trade.trade_id)
+            if not trade.message_id:
+                continue
+            
+            try:
+                channel = self.bot.get_channel(trade.channel_id) or await self.bot.fetch_channel(trade.channel_id)
+                message = await channel.fetch_message(trade.message_id)
+                await self.close_trade_message(message, "Trade Expired", 0x808080)
+            except Exception as e:
+                print(f"Error closing expired trade {trade.trade_id}: {e}")
+
+    @expire_trades.before_loop
+    async def before_expire_trades(self):
+        """Wait until the bot is ready, then re-attach the buttons of every pending trade"""
+        await self.bot.wait_until_ready()
+        for trade in await self.trades.pending():
+            view = TradeView(self, trade.trade_id)
+            self.trade_views[trade.trade_id] = view
+            self.bot.add_view(view, message_id=trade.message_id)
+
+    async def fetch_anime_character(self, server_id: int, attempt: int = 1) -> Optional[tuple]:
+        """Fetch a random unclaimed main character, from the pre-warmed pool when possible"""
+        # Serve the roll locally if the pool has an unclaimed character
+        character = await self.pick_pooled_character(server_id)
+        if character:
+            return character
+        
+        # Pool is empty, fall back to fetching a random modern anime directly
+        anime = await self.fetch_random_modern_anime()
         
         if not anime:
             print("Could not find a random modern anime")
@@ -267,36 +438,17 @@ class AnimeCollect(commands.Cog):
         
         print(f"Selected anime: {anime_title} ({anime_year}) - ID: {anime_id}")
         
-        # Check if we already have characters from this anime for this server
-        self.cursor.execute(
-            "SELECT COUNT(*) FROM characters WHERE anime_id = ? AND server_id = ?", 
-            (anime_id, server_id)
-        )
-        existing_count = self.cursor.fetchone()[0]
-        
-        # If we already have characters from this anime in the database, try to get an available one
-        if existing_count > 0:
-            self.cursor.execute(
-                "SELECT * FROM characters WHERE anime_id = ? AND server_id = ? AND available = 1 ORDER BY RANDOM() LIMIT 1", 
-                (anime_id, server_id)
-            )
-            character = self.cursor.fetchone()
-            
-            # If we found an available character, return it
-            if character:
-                print(f"Found existing character: {character[3]}")
-                return character
-        
-        # If we don't have any available characters from this anime (or none at all),
-        # fetch character data from the API
-        print(f"Fetching main characters for {anime_title}")
-        characters = await self.fetch_anime_main_characters(session, anime_id)
+        # Fetch the main cast (usually served from the AniList cache)
+        characters = await self.fetch_anime_main_characters(anime_id)
         
         if not characters:
             print(f"No main characters found for anime ID {anime_id}")
             return None
         
-        print(f"Found {len(characters)} main characters")
+        # Keep only characters that are unclaimed in this server, checked in memory
+        unclaimed_ids = set(self.availability.unclaimed(server_id, [c["id"] for c in characters]))
+        characters = [c for c in characters if c["id"] in unclaimed_ids]
+        print(f"Found {len(characters)} unclaimed main characters")
         
         # Shuffle characters to get random ones
         random.shuffle(characters)
@@ -304,125 +456,52 @@ class AnimeCollect(commands.Cog):
         # Process characters
         for char_data in characters:
             try:
-                char_id = char_data["id"]
-                name = char_data["name"]
-                image_url = char_data["image_url"]
-                role = char_data["role"]
-                
-                # Format anime name with year
-                anime_display = f"{anime_title} ({anime_year})" if anime_year else anime_title
-                
-                # Check if character already exists in this server
-                self.cursor.execute(
-                    "SELECT * FROM characters WHERE character_id = ? AND server_id = ?", 
-                    (char_id, server_id)
-                )
-                existing_char = self.cursor.fetchone()
-                
-                # If character exists and is not available, skip
-                if existing_char and existing_char[6] == 0:  # index 6 is 'available'
-                    continue
-                    
-                # If character doesn't exist, add to database
-                if not existing_char:
-                    self.cursor.execute(
-                        "INSERT OR IGNORE INTO characters (character_id, anime_id, server_id, name, anime, image_url, available, role) VALUES (?, ?, ?, ?, ?, ?, 1, ?)",
-                        (char_id, anime_id, server_id, name, anime_display, image_url, role)
-                    )
-                    self.conn.commit()
-                    
-                    # Get the inserted character
-                    self.cursor.execute(
-                        "SELECT * FROM characters WHERE character_id = ? AND server_id = ?", 
-                        (char_id, server_id)
-                    )
-                    char = self.cursor.fetchone()
-                    print(f"Added new character to database: {name}")
+                char = await self.store_character(server_id, char_data)
+                # Another roll may have reserved it while we were storing it
+                if char and not self.availability.is_claimed(server_id, char[0]):
                     return char
-                else:
-                    # If character exists and is available, return it
-                    print(f"Found existing available character: {name}")
-                    return existing_char
-                    
             except Exception as e:
                 print(f"Error processing character: {e}")
                 continue
         
         # If we couldn't find any suitable characters, try another anime
+        if attempt >= self.max_roll_attempts:
+            print(f"No suitable character found after {attempt} anime, giving up")
+            return None
+        
         print("No suitable character found, trying another anime")
-        return await self.fetch_anime_character(session, server_id)
-
-    def ensure_user_exists(self, user_id: int, server_id: int):
-        """Make sure the user exists in the database for the specific server"""
-        self.cursor.execute("SELECT user_id FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        if not self.cursor.fetchone():
-            self.cursor.execute("INSERT INTO users (user_id, server_id, balance, last_roll) VALUES (?, ?, 0, 0)", (user_id, server_id))
-            self.conn.commit()
-
-    def get_user_balance(self, user_id: int, server_id: int) -> int:
-        """Get a user's balance for the specific server"""
-        self.ensure_user_exists(user_id, server_id)
-        self.cursor.execute("SELECT balance FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        return self.cursor.fetchone()[0]
-
-    def update_user_balance(self, user_id: int, server_id: int, amount: int) -> int:
-        """Update a user's balance for the specific server"""
-        self.ensure_user_exists(user_id, server_id)
-        new_balance = self.get_user_balance(user_id, server_id) + amount
-        self.cursor.execute("UPDATE users SET balance = ? WHERE user_id = ? AND server_id = ?", (new_balance, user_id, server_id))
-        self.conn.commit()
-        return new_balance
-
-    def get_collection_count(self, user_id: int, server_id: int) -> int:
+        return await self.fetch_anime_character(server_id, attempt + 1)
+
+    async def get_collection_count(self, user_id: int, server_id: int) -> int:
         """Get the number of characters in a user's collection for the specific server"""
-        self.cursor.execute("SELECT COUNT(*) FROM collections WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        return self.cursor.fetchone()[0]
+        return await self.db.fetchval("SELECT COUNT(*) FROM collections WHERE user_id = ? AND server_id = ?", (user_id, server_id))
 
-    async def add_character_to_collection(self, user_id: int, server_id: int, character: tuple):
-        """Add a character to a user's collection and mark as unavailable"""
-        char_id, anime_id, server_id_check, name, anime, image_url, available, role = character
-        
-        # Verify server_id matches
-        if server_id != server_id_check:
-            raise ValueError("Server ID mismatch when adding character to collection")
-        
-        # Mark character as unavailable
-        self.cursor.execute("UPDATE characters SET available = 0 WHERE character_id = ? AND server_id = ?", (char_id, server_id))
-        
-        # Add to user's collection
-        current_time = int(time.time())
-        self.cursor.execute(
-            "INSERT INTO collections (user_id, server_id, character_id, obtained_at) VALUES (?, ?, ?, ?)",
-            (user_id, server_id, char_id, current_time)
+    async def roll_character(self, user_id: int, server_id: int) -> Optional[tuple]:
+        """Pick and claim a random character, picking again if a concurrent roll claimed it first"""
+        # Reserve in memory, then compare-and-set in the database, so a character is never handed out twice
+        character = await roll_and_claim(
+            self.db, self.availability, lambda: self.fetch_anime_character(server_id), user_id, server_id, self.max_roll_attempts
         )
-        
-        # Update last roll time
-        self.cursor.execute("UPDATE users SET last_roll = ? WHERE user_id = ? AND server_id = ?", (current_time, user_id, server_id))
-        self.conn.commit()
+        if character:
+            # The claim committed last_roll, bought rolls reset the free roll too
+            self.cooldowns.record(ROLL, user_id, server_id)
+            await self.leaderboards.refresh_collections(server_id, [user_id])
+        return character
 
-    async def can_roll(self, user_id: int, server_id: int) -> bool:
-        """Check if a user can roll (24-hour cooldown) for the specific server"""
-        self.ensure_user_exists(user_id, server_id)
-        self.cursor.execute("SELECT last_roll FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        last_roll = self.cursor.fetchone()[0]
-        current_time = int(time.time())
-        return current_time - last_roll >= self.roll_cooldown
-
-    def get_time_until_next_roll(self, user_id: int, server_id: int) -> str:
-        """Get formatted time until next roll is available for the specific server"""
-        self.cursor.execute("SELECT last_roll FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        last_roll = self.cursor.fetchone()[0]
-        time_left = self.roll_cooldown - (int(time.time()) - last_roll)
+    @staticmethod
+    def format_time_left(time_left: int, with_days: bool = False) -> str:
+        """Format a cooldown's remaining seconds"""
         if time_left <= 0:
             return "now"
         
-        hours, remainder = divmod(time_left, 3600)
+        days, remainder = divmod(time_left, 86400) if with_days else (0, time_left)
+        hours, remainder = divmod(remainder, 3600)
         minutes, seconds = divmod(remainder, 60)
-        return f"{hours}h {minutes}m {seconds}s"
+        return f"{days}d {hours}h {minutes}m {seconds}s" if with_days else f"{hours}h {minutes}m {seconds}s"
 
     async def get_character_embed(self, character: tuple) -> nextcord.Embed:
         """Create an embed for a character"""
-        char_id, anime_id, server_id, name, anime, image_url, available, role = character
+        char_id, anime_id, server_id, name, anime, image_url, available, role, *_ = character
         
         embed = nextcord.Embed(
             title=f"{name}",
@@ -436,32 +515,9 @@ class AnimeCollect(commands.Cog):
         
         return embed
 
-    def calculate_sell_price(self, anime: str) -> int:
+    def calculate_sell_price(self, anime_year: Optional[int]) -> int:
         """Calculate sell price based on anime year"""
-        try:
-            # Try to extract year from anime name format "Anime Name (YYYY)"
-            year_match = re.search(r'\((\d{4})\)', anime)
-            if year_match:
-                year = int(year_match.group(1))
-                current_year = datetime.datetime.now().year
-                
-                # Newer anime characters are worth more
-                years_old = current_year - year
-                
-                if years_old <= 1:  # Current year or last year
-                    return random.randint(130, 150)
-                elif years_old <= 3:  # Last 3 years
-                    return random.randint(100, 130)
-                elif years_old <= 5:  # Last 5 years
-                    return random.randint(80, 100)
-                else:  # Older than 5 years
-                    return random.randint(50, 80)
-            else:
-                # Default random price if year not found
-                return random.randint(50, 150)
-        except Exception:
-            # Fallback to random pricing
-            return random.randint(50, 150)
+        return self.valuation.price(anime_year)
 
     # Commands
     @nextcord.slash_command(name="roll", description="Roll for a random anime character (once every 24 hours)")
@@ -469,37 +525,44 @@ class AnimeCollect(commands.Cog):
         """Roll for a random anime character (once every 24 hours)"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
+        
+        # Check cooldown first, a rejected roll never touches the database
+        time_left = self.cooldowns.remaining(ROLL, user_id, server_id)
+        if time_left:
+            await interaction.response.send_message(
+                f"You can roll again in {self.format_time_left(time_left)}. Or use `/buyroll` to roll immediately!")
+            return
+        
+        await self.economy.ensure_user(user_id, server_id)
         
         # Check if collection is full
-        if self.get_collection_count(user_id, server_id) >= self.max_collection:
+        if await self.get_collection_count(user_id, server_id) >= self.max_collection:
             await interaction.response.send_message("Your collection is full! Sell some characters before rolling again.")
             return
         
-        # Check cooldown
-        if not await self.can_roll(user_id, server_id):
-            time_left = self.get_time_until_next_roll(user_id, server_id)
+        # Start the cooldown now, so a second /roll sent meanwhile is rejected
+        time_left = self.cooldowns.try_use(ROLL, user_id, server_id)
+        if time_left:
             await interaction.response.send_message(
-                f"You can roll again in {time_left}. Or use `/buyroll` to roll immediately!")
+                f"You can roll again in {self.format_time_left(time_left)}. Or use `/buyroll` to roll immediately!")
             return
         
         # Make sure we respond immediately to avoid timeout
         await interaction.response.send_message("Rolling for a character... please wait!")
         
         try:
-            # Fetch a random character (on-demand fetching)
-            async with aiohttp.ClientSession() as session:
-                character = await self.fetch_anime_character(session, server_id)
-                
-                if not character:
-                    await interaction.channel.send("No suitable characters found. Please try again later.")
-                    return
-                
-                await self.add_character_to_collection(user_id, server_id, character)
-                
-                embed = await self.get_character_embed(character)
-                await interaction.channel.send(f"{interaction.user.mention} rolled and got:", embed=embed)
+            # Fetch and claim a random character (on-demand fetching)
+            character = await self.roll_character(user_id, server_id)
+            
+            if not character:
+                self.cooldowns.release(ROLL, user_id, server_id)
+                await interaction.channel.send("No suitable characters found. Please try again later.")
+                return
+            
+            embed = await self.get_character_embed(character)
+            await interaction.channel.send(f"{interaction.user.mention} rolled and got:", embed=embed)
         except Exception as e:
+            self.cooldowns.release(ROLL, user_id, server_id)
             await interaction.channel.send(f"An error occurred: {str(e)}")
 
     @nextcord.slash_command(name="buyroll", description="Buy a roll for credits")
@@ -507,16 +570,16 @@ class AnimeCollect(commands.Cog):
         """Buy a roll for 100 credits"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
+        await self.economy.ensure_user(user_id, server_id)
         
         # Check if collection is full
-        if self.get_collection_count(user_id, server_id) >= self.max_collection:
+        if await self.get_collection_count(user_id, server_id) >= self.max_collection:
             await interaction.response.send_message("Your collection is full! Sell some characters before rolling again.")
             return
         
-        # Check if user has enough credits
-        balance = self.get_user_balance(user_id, server_id)
-        if balance < self.roll_cost:
+        # Deduct credits, only if the user has enough
+        if await self.economy.debit(user_id, server_id, self.roll_cost) is None:
+            balance = await self.economy.balance(user_id, server_id)
             await interaction.response.send_message(f"You don't have enough credits! You need {self.roll_cost} credits, but you only have {balance}.")
             return
         
@@ -524,26 +587,20 @@ class AnimeCollect(commands.Cog):
         await interaction.response.send_message(f"Spending {self.roll_cost} credits to roll for a character... please wait!")
         
         try:
-            # Deduct credits
-            self.update_user_balance(user_id, server_id, -self.roll_cost)
+            # Fetch and claim a random character (on-demand fetching)
+            character = await self.roll_character(user_id, server_id)
             
-            # Fetch a random character (on-demand fetching)
-            async with aiohttp.ClientSession() as session:
-                character = await self.fetch_anime_character(session, server_id)
-                
-                if not character:
-                    # Refund if no character available
-                    self.update_user_balance(user_id, server_id, self.roll_cost)
-                    await interaction.channel.send("No suitable characters found. Your credits have been refunded.")
-                    return
-                
-                await self.add_character_to_collection(user_id, server_id, character)
-                
-                embed = await self.get_character_embed(character)
-                await interaction.channel.send(f"{interaction.user.mention} spent {self.roll_cost} credits and got:", embed=embed)
+            if not character:
+                # Refund if no character available
+                await self.economy.credit(user_id, server_id, self.roll_cost)
+                await interaction.channel.send("No suitable characters found. Your credits have been refunded.")
+                return
+            
+            embed = await self.get_character_embed(character)
+            await interaction.channel.send(f"{interaction.user.mention} spent {self.roll_cost} credits and got:", embed=embed)
         except Exception as e:
             # Refund on error
-            self.update_user_balance(user_id, server_id, self.roll_cost)
+            await self.economy.credit(user_id, server_id, self.roll_cost)
             await interaction.channel.send(f"An error occurred: {str(e)}. Your credits have been refunded.")
 
     @nextcord.slash_command(name="collection", description="View your or someone else's anime character collection")
@@ -557,92 +614,75 @@ class AnimeCollect(commands.Cog):
         server_id = interaction.guild_id
         target_user = user or interaction.user
         target_id = target_user.id
-        self.ensure_user_exists(target_id, server_id)
+        await self.economy.ensure_user(target_id, server_id)
         
         await interaction.response.defer()
         
         # Get collection count
-        collection_count = self.get_collection_count(target_id, server_id)
+        collection_count = await self.get_collection_count(target_id, server_id)
         if collection_count == 0:
             await interaction.followup.send(f"{target_user.display_name} doesn't have any characters in their collection yet!")
             return
         
         # Calculate pagination
-        items_per_page = 5
-        max_pages = (collection_count + items_per_page - 1) // items_per_page
+        max_pages = (collection_count + self.collection_page_size - 1) // self.collection_page_size
         
         if page < 1 or page > max_pages:
             page = 1
         
-        offset = (page - 1) * items_per_page
+        balance = await self.economy.balance(target_id, server_id)
+        view = CollectionView(self, interaction.user.id, target_user, server_id, collection_count, max_pages, balance)
+        embed = await view.get_page(page)
+        await interaction.followup.send(embed=embed, view=view)
+
+    async def fetch_collection_page(
+        self,
+        user_id: int,
+        server_id: int,
+        after: Optional[Tuple[int, int]] = None,
+        before: Optional[Tuple[int, int]] = None,
+    ) -> List[tuple]:
+        """
+        Fetch one page of a collection, newest first, by keyset on (obtained_at, id)
         
-        # Get character data for the page
-        self.cursor.execute("""
+        Args:
+            user_id: Owner of the collection
+            server_id: Server the collection belongs to
+            after: Key of the last row on the previous page
+            before: Key of the first row on the next page
+        """
+        keyset = ""
+        params: Tuple[Any, ...] = (user_id, server_id)
+        order = "DESC"
+        if after:
+            keyset = "AND (collections.obtained_at, collections.id) < (?, ?)"
+            params += after
+        elif before:
+            keyset = "AND (collections.obtained_at, collections.id) > (?, ?)"
+            params += before
+            order = "ASC"
+        
+        rows = await self.db.fetchall(f"""
             SELECT characters.character_id, characters.anime_id, characters.server_id, characters.name, 
-                characters.anime, characters.image_url, characters.available, characters.role, collections.id
+                characters.anime, characters.image_url, characters.available, characters.role, collections.id,
+                collections.obtained_at
             FROM collections
             JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
-            WHERE collections.user_id = ? AND collections.server_id = ?
-            ORDER BY collections.obtained_at DESC
-            LIMIT ? OFFSET ?
-        """, (target_id, server_id, items_per_page, offset))
-        
-        characters = self.cursor.fetchall()
+            WHERE collections.user_id = ? AND collections.server_id = ? {keyset}
+            ORDER BY collections.obtained_at {order}, collections.id {order}
+            LIMIT ?
+        """, params + (self.collection_page_size,))
         
-        # Create embed
-        embed = nextcord.Embed(
-            title=f"{target_user.display_name}'s Anime Collection",
-            description=f"Showing page {page}/{max_pages} ({collection_count}/{self.max_collection} characters)",
-            color=0x1F85DE
-        )
+        return rows[::-1] if before else rows
 
-        # Add balance info in the footer
-        balance = self.get_user_balance(target_id, server_id)
-        embed.set_footer(text=f"Balance: {balance} credits | Use /roll or /buyroll to get more characters!")
-        
-        # Add each character to the embed with thumbnails
-        for idx, character in enumerate(characters):
-            char_id, anime_id, char_server_id, name, anime, image_url, available, role, collection_id = character
-            
-            # Set character thumbnail to embed
-            if idx == 0:  # Set the first character as the main thumbnail
-                embed.set_thumbnail(url=image_url)
-            
-            # Add character info to embed
-            embed.add_field(
-                name=f"{name} (ID: {char_id})",
-                value=f"From: {anime}\nRole: {role}\nCollection ID: {collection_id}\n[View Image]({image_url})",
-                inline=False
-            )
-        
-        # Navigation buttons
-        view = nextcord.ui.View(timeout=60)
-        
-        # Add prev button if not on first page
-        if page > 1:
-            prev_button = nextcord.ui.Button(label="Previous Page", style=nextcord.ButtonStyle.gray)
-            
-            async def prev_callback(button_interaction):
-                if button_interaction.user.id != interaction.user.id:
-                    return
-                await self.collection(button_interaction, target_user, page - 1)
-                
-            prev_button.callback = prev_callback
-            view.add_item(prev_button)
-        
-        # Add next button if not on last page
-        if page < max_pages:
-            next_button = nextcord.ui.Button(label="Next Page", style=nextcord.ButtonStyle.gray)
-            
-            async def next_callback(button_interaction):
-                if button_interaction.user.id != interaction.user.id:
-                    return
-                await self.collection(button_interaction, target_user, page + 1)
-                
-            next_button.callback = next_callback
-            view.add_item(next_button)
-        
-        await interaction.followup.send(embed=embed, view=view)
+    async def collection_page_start(self, user_id: int, server_id: int, page: int) -> Optional[Tuple[int, int]]:
+        """Key of the last row before a page, found on the collection index alone (for /collection page:N)"""
+        return await self.db.fetchone("""
+            SELECT obtained_at, id FROM collections
+            WHERE user_id = ? AND server_id = ?
+            ORDER BY obtained_at DESC, id DESC
+            LIMIT 1 OFFSET ?
+        """, (user_id, server_id, (page - 1) * self.collection_page_size - 1))
 
     @nextcord.slash_command(name="sell", description="Sell a character from your collection")
     async def sell(
@@ -657,37 +697,49 @@ class AnimeCollect(commands.Cog):
         """Sell a specific character from your collection for credits"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
+        await self.economy.ensure_user(user_id, server_id)
         
         # Check if the user owns this character
-        self.cursor.execute("""
-            SELECT collections.id, characters.character_id, characters.name, characters.anime
+        character = await self.db.fetchone("""
+            SELECT collections.id, characters.character_id, characters.name, characters.anime_year
             FROM collections
             JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
             WHERE collections.user_id = ? AND collections.server_id = ? AND characters.character_id = ?
         """, (user_id, server_id, character_id))
         
-        character = self.cursor.fetchone()
-        
         if not character:
             await interaction.response.send_message("You don't own a character with that ID!", ephemeral=True)
             return
         
-        collection_id, char_id, char_name, anime = character
+        collection_id, char_id, char_name, anime_year = character
         
         # Calculate sell price based on anime year
-        sell_price = self.calculate_sell_price(anime)
-        
-        # Mark character as available again
-        self.cursor.execute("UPDATE characters SET available = 1 WHERE character_id = ? AND server_id = ?", (char_id, server_id))
-        
-        # Remove character from collection
-        self.cursor.execute("DELETE FROM collections WHERE id = ?", (collection_id,))
-        
-        # Add credits to user
-        new_balance = self.update_user_balance(user_id, server_id, sell_price)
+        sell_price = self.calculate_sell_price(anime_year)
+        
+        def release_character(conn):
+            # Remove character from collection, only if it's still this user's (a repeated /sell, /sellall or trade may have moved it)
+            deleted = conn.execute(
+                "DELETE FROM collections WHERE id = ? AND user_id = ? AND server_id = ?",
+                (collection_id, user_id, server_id)
+            ).rowcount
+            if not deleted:
+                return None
+            
+            # Mark character as available again and pay out in the same transaction
+            conn.execute("UPDATE characters SET available = 1 WHERE character_id = ? AND server_id = ?", (char_id, server_id))
+            return BalanceLedger.credit_in_transaction(conn, user_id, server_id, sell_price)
+        
+        committed = await self.db.write(release_character, "sell")
+        if committed is None:
+            await interaction.response.send_message("You don't own a character with that ID!", ephemeral=True)
+            return
         
-        self.conn.commit()
+        self.availability.release(server_id, [char_id])
+        self.economy.apply_committed(user_id, server_id, sell_price)
+        # The cached balance also counts changes still queued for the ledger, the committed one doesn't
+        new_balance = await self.economy.balance(user_id, server_id)
+        self.economy.ledger.notify(user_id, server_id, new_balance)
+        await self.leaderboards.refresh_collections(server_id, [user_id])
         
         await interaction.response.send_message(
             f"You sold {char_name} for {sell_price} credits! Your new balance is {new_balance} credits."
@@ -698,24 +750,16 @@ class AnimeCollect(commands.Cog):
         """Sell all characters in your collection for credits"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
-        
-        # Get all characters in the user's collection
-        self.cursor.execute("""
-            SELECT collections.id, characters.character_id, characters.name, characters.anime
-            FROM collections
-            JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
-            WHERE collections.user_id = ? AND collections.server_id = ?
-        """, (user_id, server_id))
+        await self.economy.ensure_user(user_id, server_id)
         
-        characters = self.cursor.fetchall()
+        # Count the user's collection, it's priced and sold in one transaction on confirm
+        character_count = await self.get_collection_count(user_id, server_id)
         
-        if not characters:
+        if not character_count:
             await interaction.response.send_message("You don't have any characters to sell!")
             return
         
         # Ask for confirmation since this is a significant action
-        character_count = len(characters)
         
         embed = nextcord.Embed(
             title=f"Sell All Characters?",
@@ -731,23 +775,36 @@ class AnimeCollect(commands.Cog):
             if confirm_interaction.user.id != user_id:
                 return
                 
-            # Calculate prices for all characters
-            total_credits = 0
-            for collection_id, char_id, char_name, anime in characters:
-                # Calculate sell price based on anime year
-                sell_price = self.calculate_sell_price(anime)
-                total_credits += sell_price
+            def sell_all(conn):
+                # Price whatever is in the collection at confirm time, in one pass
+                owned = conn.execute("""
+                    SELECT characters.character_id, characters.anime_year FROM collections
+                    JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
+                    WHERE collections.user_id = ? AND collections.server_id = ?
+                """, (user_id, server_id)).fetchall()
+                total = int(self.valuation.price_batch([year for _, year in owned]).sum())
                 
-                # Mark character as available again
-                self.cursor.execute("UPDATE characters SET available = 1 WHERE character_id = ? AND server_id = ?", (char_id, server_id))
-            
-            # Remove all characters from collection
-            self.cursor.execute("DELETE FROM collections WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-            
-            # Add credits to user
-            new_balance = self.update_user_balance(user_id, server_id, total_credits)
-            
-            self.conn.commit()
+                # Mark every owned character available again with one set-based update
+                conn.execute("""
+                    UPDATE characters SET available = 1
+                    WHERE server_id = ? AND character_id IN (
+                        SELECT character_id FROM collections WHERE user_id = ? AND server_id = ?
+                    )
+                """, (server_id, user_id, server_id))
+                
+                # Remove all characters from collection and pay out in the same transaction
+                conn.execute("DELETE FROM collections WHERE user_id = ? AND server_id = ?", (user_id, server_id))
+                balance = BalanceLedger.credit_in_transaction(conn, user_id, server_id, total)
+                return [char_id for char_id, _ in owned], total, balance
+            
+            sold_ids, total_credits, _ = await self.db.write(sell_all, "sellall")
+            self.availability.release(server_id, sold_ids)
+            self.economy.apply_committed(user_id, server_id, total_credits)
+            # The cached balance also counts changes still queued for the ledger, the committed one doesn't
+            new_balance = await self.economy.balance(user_id, server_id)
+            self.economy.ledger.notify(user_id, server_id, new_balance)
+            await self.leaderboards.refresh_collections(server_id, [user_id])
+            character_count = len(sold_ids)
             
             await interaction.edit_original_message(
                 content=f"Sold {character_count} characters for a total of {total_credits} credits! Your new balance is {new_balance} credits.",
@@ -804,58 +861,26 @@ class AnimeCollect(commands.Cog):
             await interaction.response.send_message("You can't trade with yourself!", ephemeral=True)
             return
         
-        # Check if sender owns the offered character
-        self.cursor.execute("""
-            SELECT characters.character_id, characters.name, characters.image_url
-            FROM collections
-            JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
-            WHERE collections.user_id = ? AND collections.server_id = ? AND characters.character_id = ?
-        """, (sender_id, server_id, offer_character_id))
-        
-        offer_character = self.cursor.fetchone()
-        
-        if not offer_character:
+        # Unclaimed characters can't be owned by anyone, reject those without a query
+        if not self.availability.is_claimed(server_id, offer_character_id):
             await interaction.response.send_message("You don't own the character you're trying to offer!", ephemeral=True)
             return
         
-        offer_char_id, offer_char_name, offer_image_url = offer_character
-        
-        # Check if receiver owns the requested character (if specified)
-        request_char_name = "any character"
-        request_image_url = None
-        
-        if request_character_id > 0:
-            self.cursor.execute("""
-                SELECT characters.character_id, characters.name, characters.image_url
-                FROM collections
-                JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
-                WHERE collections.user_id = ? AND collections.server_id = ? AND characters.character_id = ?
-            """, (receiver_id, server_id, request_character_id))
-            
-            request_character = self.cursor.fetchone()
-            
-            if not request_character:
-                await interaction.response.send_message(f"{user.display_name} doesn't own the character you're requesting!", ephemeral=True)
-                return
-            
-            request_char_id, request_char_name, request_image_url = request_character
+        if request_character_id > 0 and not self.availability.is_claimed(server_id, request_character_id):
+            await interaction.response.send_message(f"{user.display_name} doesn't own the character you're requesting!", ephemeral=True)
+            return
         
-        # Create a trade entry
-        current_time = int(time.time())
-        self.cursor.execute(
-            "INSERT INTO trades (sender_id, receiver_id, server_id, character_id, status, created_at) VALUES (?, ?, ?, ?, 'pending', ?)",
-            (sender_id, receiver_id, server_id, offer_char_id, current_time)
-        )
-        self.conn.commit()
-        trade_id = self.cursor.lastrowid
-        
-        # Store request character ID if specified
-        if request_character_id > 0:
-            self.cursor.execute(
-                "INSERT INTO trade_requests (trade_id, request_char_id) VALUES (?, ?)",
-                (trade_id, request_character_id)
+        # Ownership is checked again inside the transaction that records the trade
+        try:
+            trade_id, offered, requested = await self.trades.create(
+                sender_id, receiver_id, server_id, offer_character_id, request_character_id
             )
-            self.conn.commit()
+        except TradeError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        
+        offer_char_id, offer_char_name, offer_image_url = offered
+        request_char_name = requested[1] if requested else "any character"
         
         # Create trade embed
         embed = nextcord.Embed(
@@ -877,182 +902,103 @@ class AnimeCollect(commands.Cog):
         )
         
         embed.set_thumbnail(url=offer_image_url)
-        embed.set_footer(text=f"Trade ID: {trade_id}")
+        embed.set_footer(text=f"Trade ID: {trade_id} | Expires in {self.trades.ttl // 3600} hours")
         
-        # Create buttons
-        view = nextcord.ui.View(timeout=86400)  # 24 hour timeout
+        view = TradeView(self, trade_id)
+        self.trade_views[trade_id] = view
         
-        accept_button = nextcord.ui.Button(
-            label="Accept Trade",
-            style=nextcord.ButtonStyle.green
+        # Send the trade offer
+        await interaction.response.send_message(f"{user.mention}, you have a trade offer from {interaction.user.display_name}!", embed=embed, view=view)
+        message = await interaction.original_message()
+        await self.trades.attach_message(trade_id, message.channel.id, message.id)
+
+    async def accept_trade(self, interaction: nextcord.Interaction, trade_id: int) -> bool:
+        """Handle the accept button of a trade offer, returning True once the trade is completed"""
+        try:
+            result = await self.trades.accept(trade_id, interaction.user.id)
+        except TradeError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return False
+        
+        await self.leaderboards.refresh_collections(result.trade.server_id, [result.trade.sender_id, result.trade.receiver_id])
+        
+        sender = interaction.guild.get_member(result.trade.sender_id) if interaction.guild else None
+        sender_name = sender.display_name if sender else f"<@{result.trade.sender_id}>"
+        
+        # Notify both users
+        await interaction.response.send_message(
+            f"Trade completed! {sender_name} received {result.received_name} and {interaction.user.display_name} received {result.offered_name}.",
+            ephemeral=False
         )
         
-        decline_button = nextcord.ui.Button(
-            label="Decline Trade",
-            style=nextcord.ButtonStyle.red
+        # Update the original message to show the trade is completed
+        await self.close_trade_message(interaction.message, "Trade Completed", 0x00FF00)
+        return True
+
+    async def decline_trade(self, interaction: nextcord.Interaction, trade_id: int) -> bool:
+        """Handle the decline button of a trade offer, returning True once the trade is declined"""
+        try:
+            trade = await self.trades.decline(trade_id, interaction.user.id)
+        except TradeError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return False
+        
+        sender = interaction.guild.get_member(trade.sender_id) if interaction.guild else None
+        sender_name = sender.display_name if sender else f"<@{trade.sender_id}>"
+        
+        # Notify both users
+        await interaction.response.send_message(
+            f"{interaction.user.display_name} declined the trade offer from {sender_name}.",
+            ephemeral=False
         )
         
-        async def accept_callback(button_interaction):
-            # Ensure only the receiver can accept
-            if button_interaction.user.id != receiver_id:
-                await button_interaction.response.send_message("This trade isn't for you to accept!", ephemeral=True)
-                return
-            
-            # Get trade details again to make sure it's still valid
-            self.cursor.execute("SELECT * FROM trades WHERE trade_id = ? AND status = 'pending'", (trade_id,))
-            trade = self.cursor.fetchone()
-            
-            if not trade:
-                await button_interaction.response.send_message("This trade is no longer valid!", ephemeral=True)
-                return
-                
-            # Verify server_id matches current server
-            if trade[3] != server_id:  # index 3 is server_id
-                await button_interaction.response.send_message("This trade is from a different server!", ephemeral=True)
-                return
-                
-            # Get the offered character ID
-            offered_char_id = trade[4]  # index 4 is character_id
-            
-            # Get the requested character ID if it exists
-            self.cursor.execute("SELECT request_char_id FROM trade_requests WHERE trade_id = ?", (trade_id,))
-            request_result = self.cursor.fetchone()
-            requested_char_id = request_result[0] if request_result else 0
-            
-            # Verify both users still own their respective characters
-            self.cursor.execute("""
-                SELECT character_id FROM collections 
-                WHERE user_id = ? AND server_id = ? AND character_id = ?
-            """, (sender_id, server_id, offered_char_id))
-            
-            if not self.cursor.fetchone():
-                await button_interaction.response.send_message(
-                    f"{interaction.user.display_name} no longer owns the offered character!",
-                    ephemeral=True
-                )
-                return
-            
-            if requested_char_id > 0:
-                self.cursor.execute("""
-                    SELECT character_id FROM collections 
-                    WHERE user_id = ? AND server_id = ? AND character_id = ?
-                """, (receiver_id, server_id, requested_char_id))
-                
-                if not self.cursor.fetchone():
-                    await button_interaction.response.send_message(
-                        "You no longer own the requested character!",
-                        ephemeral=True
-                    )
-                    return
-            
-            # If specific character requested, perform swap
-            if requested_char_id > 0:
-                # Update collections for offered character
-                self.cursor.execute("""
-                    UPDATE collections 
-                    SET user_id = ? 
-                    WHERE user_id = ? AND server_id = ? AND character_id = ?
-                """, (receiver_id, sender_id, server_id, offered_char_id))
-                
-                # Update collections for requested character
-                self.cursor.execute("""
-                    UPDATE collections 
-                    SET user_id = ? 
-                    WHERE user_id = ? AND server_id = ? AND character_id = ?
-                """, (sender_id, receiver_id, server_id, requested_char_id))
-            else:
-                # If no specific character requested, get a random character from receiver
-                self.cursor.execute("""
-                    SELECT character_id, 
-                    (SELECT name FROM characters WHERE character_id = collections.character_id AND server_id = collections.server_id) as name
-                    FROM collections
-                    WHERE user_id = ? AND server_id = ?
-                    ORDER BY RANDOM()
-                    LIMIT 1
-                """, (receiver_id, server_id))
-                
-                random_char = self.cursor.fetchone()
-                
-                if not random_char:
-                    await button_interaction.response.send_message(
-                        f"{user.display_name} doesn't have any characters to trade!",
-                        ephemeral=True
-                    )
-                    return
-                
-                random_char_id, random_char_name = random_char
-                
-                # Update collections for offered character
-                self.cursor.execute("""
-                    UPDATE collections 
-                    SET user_id = ? 
-                    WHERE user_id = ? AND server_id = ? AND character_id = ?
-                """, (receiver_id, sender_id, server_id, offered_char_id))
-                
-                # Update collections for random character
-                self.cursor.execute("""
-                    UPDATE collections 
-                    SET user_id = ? 
-                    WHERE user_id = ? AND server_id = ? AND character_id = ?
-                """, (sender_id, receiver_id, server_id, random_char_id))
-                
-                # Update request_char_name for notification
-                request_char_name = f"{random_char_name} (ID: {random_char_id})"
-                requested_char_id = random_char_id
-            
-            # Update trade status
-            self.cursor.execute("UPDATE trades SET status = 'completed' WHERE trade_id = ?", (trade_id,))
-            self.conn.commit()
-            
-            # Get character names for notification
-            self.cursor.execute("SELECT name FROM characters WHERE character_id = ? AND server_id = ?", (offered_char_id, server_id))
-            offer_name_result = self.cursor.fetchone()
-            offer_char_name = offer_name_result[0] if offer_name_result else f"Character #{offered_char_id}"
-            
-            self.cursor.execute("SELECT name FROM characters WHERE character_id = ? AND server_id = ?", (requested_char_id, server_id))
-            request_name_result = self.cursor.fetchone()
-            request_char_name = request_name_result[0] if request_name_result else f"Character #{requested_char_id}"
-            
-            # Notify both users
-            await button_interaction.response.send_message(
-                f"Trade completed! {interaction.user.display_name} received {request_char_name} and {user.display_name} received {offer_char_name}.",
-                ephemeral=False
-            )
-            
-            # Update the original message to show the trade is completed
-            embed.title = "Trade Completed"
-            embed.color = 0x00FF00
-            await button_interaction.message.edit(embed=embed, view=None)
+        # Update the original message to show the trade is declined
+        await self.close_trade_message(interaction.message, "Trade Declined", 0xFF0000)
+        return True
+
+    async def close_trade_message(self, message: nextcord.Message, title: str, color: int):
+        """Retitle a trade offer's embed and remove its buttons"""
+        embed = message.embeds[0] if message.embeds else None
+        if embed:
+            embed.title = title
+            embed.color = color
+        await message.edit(embed=embed, view=None)
+
+    def drop_trade_view(self, trade_id: int):
+        """Stop listening for a finished trade's buttons"""
+        view = self.trade_views.pop(trade_id, None)
+        if view:
+            view.stop()
+
+    @nextcord.slash_command(name="trades", description="View the trade offers waiting for you")
+    async def trades_command(self, interaction: nextcord.Interaction):
+        """List the pending trade offers sent to the user in this server"""
+        trades = await self.trades.incoming(interaction.user.id, interaction.guild_id)
         
-        async def decline_callback(button_interaction):
-            # Ensure only the receiver can decline
-            if button_interaction.user.id != receiver_id:
-                await button_interaction.response.send_message("This trade isn't for you to decline!", ephemeral=True)
-                return
-            
-            # Update trade status
-            self.cursor.execute("UPDATE trades SET status = 'declined' WHERE trade_id = ?", (trade_id,))
-            self.conn.commit()
-            
-            # Notify both users
-            await button_interaction.response.send_message(
-                f"{user.display_name} declined the trade offer from {interaction.user.display_name}.",
-                ephemeral=False
-            )
-            
-            # Update the original message to show the trade is declined
-            embed.title = "Trade Declined"
-            embed.color = 0xFF0000
-            await button_interaction.message.edit(embed=embed, view=None)
+        if not trades:
+            await interaction.response.send_message("You have no pending trade offers.", ephemeral=True)
+            return
         
-        accept_button.callback = accept_callback
-        decline_button.callback = decline_callback
+        embed = nextcord.Embed(
+            title="Pending Trade Offers",
+            description=f"{len(trades)} offer(s) waiting for you",
+            color=0x1F85DE
+        )
         
-        view.add_item(accept_button)
-        view.add_item(decline_button)
+        for trade in trades[:25]:
+            expires_at = trade.created_at + self.trades.ttl
+            link = f"https://discord.com/channels/{trade.server_id}/{trade.channel_id}/{trade.message_id}" if trade.message_id else None
+            embed.add_field(
+                name=f"Trade ID: {trade.trade_id}",
+                value=(
+                    f"From: <@{trade.sender_id}>\n"
+                    f"Offering ID: {trade.character_id} | Requesting: {trade.request_char_id or 'any character'}\n"
+                    f"Expires <t:{expires_at}:R>" + (f" | [Open offer]({link})" if link else "")
+                ),
+                inline=False
+            )
         
-        # Send the trade offer
-        await interaction.response.send_message(f"{user.mention}, you have a trade offer from {interaction.user.display_name}!", embed=embed, view=view)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
     @nextcord.slash_command(name="delete_data", description="Delete anime collection data for this server (Admin only)")
     async def delete_data(self, interaction: nextcord.Interaction, confirm: str = nextcord.SlashOption(
@@ -1089,28 +1035,34 @@ class AnimeCollect(commands.Cog):
                 return
                 
             # Delete data for this server only
-            try:
+            def delete_server_data(conn):
                 # Delete collections first (foreign key constraints)
-                self.cursor.execute("DELETE FROM collections WHERE server_id = ?", (server_id,))
+                conn.execute("DELETE FROM collections WHERE server_id = ?", (server_id,))
                 
-                # Delete characters
-                self.cursor.execute("DELETE FROM characters WHERE server_id = ?", (server_id,))
+                # Delete characters and their search entries
+                conn.execute("DELETE FROM characters WHERE server_id = ?", (server_id,))
+                conn.execute("DELETE FROM characters_fts WHERE server_id = ?", (server_id,))
                 
                 # Delete trades (need to find trades for this server first)
-                self.cursor.execute("SELECT trade_id FROM trades WHERE server_id = ?", (server_id,))
-                trade_ids = [row[0] for row in self.cursor.fetchall()]
+                trade_ids = [row[0] for row in conn.execute("SELECT trade_id FROM trades WHERE server_id = ?", (server_id,)).fetchall()]
                 
                 if trade_ids:
                     # Delete trade requests for these trades
-                    self.cursor.execute(f"DELETE FROM trade_requests WHERE trade_id IN ({','.join(['?']*len(trade_ids))})", trade_ids)
+                    conn.execute(f"DELETE FROM trade_requests WHERE trade_id IN ({','.join(['?']*len(trade_ids))})", trade_ids)
                 
                 # Delete trades
-                self.cursor.execute("DELETE FROM trades WHERE server_id = ?", (server_id,))
+                conn.execute("DELETE FROM trades WHERE server_id = ?", (server_id,))
                 
                 # Delete users
-                self.cursor.execute("DELETE FROM users WHERE server_id = ?", (server_id,))
-                
-                self.conn.commit()
+                conn.execute("DELETE FROM users WHERE server_id = ?", (server_id,))
+            
+            try:
+                await self.db.write(delete_server_data, "delete_data")
+                self.availability.clear_server(server_id)
+                self.leaderboards.clear_server(server_id)
+                self.economy.invalidate_server(server_id)
+                # last_roll went with the users rows, daily and weekly cooldowns are kept
+                self.cooldowns.clear_server(ROLL, server_id)
                 
                 await interaction.edit_original_message(
                     content=f"✅ Successfully deleted all anime collection data for this server.",
@@ -1142,6 +1094,78 @@ class AnimeCollect(commands.Cog):
         
         await interaction.response.send_message(embed=embed, view=confirm_view)
 
+    @nextcord.slash_command(name="dbstats", description="Show anigame.db query latency (Bot owner only)")
+    async def dbstats(self, interaction: nextcord.Interaction):
+        """Show per-query latency recorded by the shared storage engine"""
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("This command can only be used by the bot owner!", ephemeral=True)
+            return
+
+        report = self.db.latency_report()
+        embed = nextcord.Embed(
+            title="anigame.db Query Latency",
+            description="```\n" + ("\n".join(report) or "No queries recorded yet") + "\n```",
+            color=0x1F85DE
+        )
+        embed.add_field(name="AniList Cache", value=self.anilist.cache.stats_report(), inline=False)
+        embed.add_field(name="Balance Cache", value=self.economy.stats_report(), inline=False)
+        embed.add_field(name="Character Pool", value=self.character_pool.stats_report(), inline=False)
+        notifications = self.bot.get_cog("AnimeNotifications")
+        if notifications is not None:
+            embed.add_field(name="Airing Notifications", value=notifications.dispatcher.latency_report(), inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @nextcord.slash_command(name="leaderboard", description="Show the server's top players")
+    async def leaderboard(
+        self,
+        interaction: nextcord.Interaction,
+        category: str = nextcord.SlashOption(
+            name="category",
+            description="What to rank players by",
+            required=False,
+            default=BALANCE,
+            choices={"Balance": BALANCE, "Collection size": COLLECTION_SIZE, "Collection value": COLLECTION_VALUE}
+        ),
+        page: int = nextcord.SlashOption(
+            name="page",
+            description="Page of the leaderboard",
+            required=False,
+            default=1,
+            min_value=1
+        )
+    ):
+        """Show a page of the server's ranking and the user's own rank"""
+        server_id = interaction.guild_id
+        board = self.leaderboards.board(server_id, category)
+        units = {BALANCE: "credits", COLLECTION_SIZE: "characters", COLLECTION_VALUE: "credits"}[category]
+        titles = {BALANCE: "Richest Players", COLLECTION_SIZE: "Largest Collections", COLLECTION_VALUE: "Most Valuable Collections"}
+
+        per_page = 10
+        max_pages = max(1, (len(board) + per_page - 1) // per_page)
+        page = min(page, max_pages)
+        entries = board.top(per_page, (page - 1) * per_page)
+
+        lines = []
+        for rank, (user_id, score) in enumerate(entries, start=(page - 1) * per_page + 1):
+            member = interaction.guild.get_member(user_id) if interaction.guild else None
+            name = member.display_name if member else f"<@{user_id}>"
+            lines.append(f"**{rank}.** {name} - {score:,} {units}")
+
+        embed = nextcord.Embed(
+            title=titles[category],
+            description="\n".join(lines) or "Nobody is ranked yet.",
+            color=0x1F85DE
+        )
+
+        rank = board.rank(interaction.user.id)
+        if rank:
+            footer = f"Your rank: #{rank} of {len(board)} ({board.score(interaction.user.id):,} {units})"
+        else:
+            footer = "You're not ranked yet"
+        embed.set_footer(text=f"Page {page}/{max_pages} | {footer}")
+
+        await interaction.response.send_message(embed=embed)
+
     @nextcord.slash_command(name="search", description="Search for available characters")
     async def search(
         self, 
@@ -1160,23 +1184,15 @@ class AnimeCollect(commands.Cog):
         """Search for available characters"""
         server_id = interaction.guild_id
         
-        # Build the query based on provided parameters
-        query = "SELECT * FROM characters WHERE available = 1 AND server_id = ?"
-        params = [server_id]
-        
-        if anime_name:
-            query += " AND anime LIKE ?"
-            params.append(f"%{anime_name}%")
-            
-        if character_name:
-            query += " AND name LIKE ?"
-            params.append(f"%{character_name}%")
-            
-        query += " LIMIT 10"  # Limit results
-        
-        # Execute the query
-        self.cursor.execute(query, params)
-        characters = self.cursor.fetchall()
+        # Ranked prefix/fuzzy match on the full-text index, or any available characters without criteria
+        if anime_name or character_name:
+            characters = await self.search_index.search(
+                server_id, name=character_name, anime=anime_name, available=True, limit=10
+            )
+        else:
+            characters = await self.db.fetchall(
+                "SELECT * FROM characters WHERE available = 1 AND server_id = ? LIMIT 10", (server_id,)
+            )
         
         if not characters:
             await interaction.response.send_message("No available characters found matching your search criteria.")
@@ -1190,7 +1206,7 @@ class AnimeCollect(commands.Cog):
         )
         
         for character in characters:
-            char_id, anime_id, char_server_id, name, anime, image_url, available, role = character
+            char_id, anime_id, char_server_id, name, anime, image_url, available, role, *_ = character
             embed.add_field(
                 name=f"{name} (ID: {char_id})",
                 value=f"From: {anime}\nRole: {role}",
@@ -1199,6 +1215,48 @@ class AnimeCollect(commands.Cog):
         
         await interaction.response.send_message(embed=embed)
 
+    @search.on_autocomplete("anime_name")
+    async def search_anime_autocomplete(self, interaction: nextcord.Interaction, anime_name: str):
+        """Suggest anime titles that still have available characters"""
+        rows = await self.search_index.search(interaction.guild_id, anime=anime_name, available=True, limit=50)
+        titles = list(dict.fromkeys(row[4] for row in rows))[:25]
+        await interaction.response.send_autocomplete({title[:100]: title for title in titles})
+
+    @search.on_autocomplete("character_name")
+    async def search_character_autocomplete(self, interaction: nextcord.Interaction, character_name: str):
+        """Suggest available character names"""
+        rows = await self.search_index.search(interaction.guild_id, name=character_name, available=True, limit=25)
+        await interaction.response.send_autocomplete({self.search_index.label(row): row[3] for row in rows})
+
+    async def owned_character_choices(self, interaction: nextcord.Interaction, text: Optional[str]) -> Dict[str, int]:
+        """Autocomplete choices from the invoking user's collection, newest first when nothing is typed"""
+        if self.search_index.tokens(text):
+            return await self.search_index.autocomplete(interaction.guild_id, text, owner_id=interaction.user.id)
+        rows = await self.db.fetchall("""
+            SELECT characters.* FROM collections
+            JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
+            WHERE collections.user_id = ? AND collections.server_id = ?
+            ORDER BY collections.obtained_at DESC, collections.id DESC
+            LIMIT 25
+        """, (interaction.user.id, interaction.guild_id))
+        return {self.search_index.label(row): row[0] for row in rows}
+
+    @sell.on_autocomplete("character_id")
+    async def sell_character_autocomplete(self, interaction: nextcord.Interaction, character_id: str):
+        await interaction.response.send_autocomplete(await self.owned_character_choices(interaction, character_id))
+
+    @trade.on_autocomplete("offer_character_id")
+    async def trade_offer_autocomplete(self, interaction: nextcord.Interaction, offer_character_id: str):
+        await interaction.response.send_autocomplete(await self.owned_character_choices(interaction, offer_character_id))
+
+    @trade.on_autocomplete("request_character_id")
+    async def trade_request_autocomplete(self, interaction: nextcord.Interaction, request_character_id: str):
+        """Suggest characters other users own"""
+        choices = await self.search_index.autocomplete(
+            interaction.guild_id, request_character_id, available=False, exclude_owner_id=interaction.user.id
+        )
+        await interaction.response.send_autocomplete(choices)
+
     @nextcord.slash_command(name="addbal", description="Add credits to a user's balance (Server owner only)")
     async def addbal(
         self, 
@@ -1225,11 +1283,11 @@ class AnimeCollect(commands.Cog):
             return
         
         #Ensure the user exists in the database
-        self.ensure_user_exists(user.id, server_id)
+        await self.economy.ensure_user(user.id, server_id)
         
         #gives credits to user
-        previous_balance = self.get_user_balance(user.id, server_id)
-        new_balance = self.update_user_balance(user.id, server_id, amount)
+        previous_balance = await self.economy.balance(user.id, server_id)
+        new_balance = await self.economy.credit(user.id, server_id, amount)
         
         await interaction.response.send_message(
             f"Added {amount} credits to {user.mention}'s balance!\n"
@@ -1263,11 +1321,11 @@ class AnimeCollect(commands.Cog):
             return
         
         # Ensure both users exist in the database
-        self.ensure_user_exists(sender_id, server_id)
-        self.ensure_user_exists(receiver_id, server_id)
+        await self.economy.ensure_user(sender_id, server_id)
+        await self.economy.ensure_user(receiver_id, server_id)
         
         # Check if sender has enough credits
-        sender_balance = self.get_user_balance(sender_id, server_id)
+        sender_balance = await self.economy.balance(sender_id, server_id)
         if sender_balance < amount:
             await interaction.response.send_message(
                 f"You don't have enough credits! Your balance: {sender_balance} credits.",
@@ -1292,11 +1350,17 @@ class AnimeCollect(commands.Cog):
             if confirm_interaction.user.id != sender_id:
                 return
             
-            # Deduct from sender
-            new_sender_balance = self.update_user_balance(sender_id, server_id, -amount)
+            # Move the credits only if the sender's balance still covers the payment
+            balances = await self.economy.transfer(sender_id, receiver_id, server_id, amount)
+            if balances is None:
+                await interaction.edit_original_message(
+                    content="Payment failed: you no longer have enough credits.",
+                    embed=None,
+                    view=None
+                )
+                return
             
-            # Add to receiver
-            new_receiver_balance = self.update_user_balance(receiver_id, server_id, amount)
+            new_sender_balance, new_receiver_balance = balances
             
             # Create payment success embed
             success_embed = nextcord.Embed(
@@ -1364,15 +1428,13 @@ class AnimeCollect(commands.Cog):
             return
         
         # Check if sender owns the character
-        self.cursor.execute("""
+        character = await self.db.fetchone("""
             SELECT collections.id, characters.character_id, characters.name, characters.image_url, characters.anime
             FROM collections
             JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
             WHERE collections.user_id = ? AND collections.server_id = ? AND characters.character_id = ?
         """, (sender_id, server_id, character_id))
         
-        character = self.cursor.fetchone()
-        
         if not character:
             await interaction.response.send_message("You don't own a character with that ID!", ephemeral=True)
             return
@@ -1380,7 +1442,7 @@ class AnimeCollect(commands.Cog):
         collection_id, char_id, char_name, char_image, anime_name = character
         
         # Check if receiver's collection is full
-        if self.get_collection_count(receiver_id, server_id) >= self.max_collection:
+        if await self.get_collection_count(receiver_id, server_id) >= self.max_collection:
             await interaction.response.send_message(
                 f"{user.display_name}'s collection is full! They need to make room before receiving gifts.",
                 ephemeral=True
@@ -1404,12 +1466,19 @@ class AnimeCollect(commands.Cog):
             if confirm_interaction.user.id != sender_id:
                 return
             
-            # Transfer character ownership
-            self.cursor.execute(
-                "UPDATE collections SET user_id = ? WHERE id = ?",
-                (receiver_id, collection_id)
+            # Transfer character ownership, only if the sender still owns it
+            result = await self.db.execute(
+                "UPDATE collections SET user_id = ? WHERE id = ? AND user_id = ? AND server_id = ?",
+                (receiver_id, collection_id, sender_id, server_id)
             )
-            self.conn.commit()
+            if not result.rowcount:
+                await interaction.edit_original_message(
+                    content=f"Gift failed, you no longer own {char_name}.",
+                    embed=None,
+                    view=None
+                )
+                return
+            await self.leaderboards.refresh_collections(server_id, [sender_id, receiver_id])
             
             # Create gift success embed
             success_embed = nextcord.Embed(
@@ -1442,6 +1511,11 @@ class AnimeCollect(commands.Cog):
         view.add_item(cancel_button)
         
         await interaction.response.send_message(embed=embed, view=view)
+
+    @gift.on_autocomplete("character_id")
+    async def gift_character_autocomplete(self, interaction: nextcord.Interaction, character_id: str):
+        await interaction.response.send_autocomplete(await self.owned_character_choices(interaction, character_id))
+
     @nextcord.slash_command(name="take", description="Remove credits from a user's balance (Server owner only)")
     async def take(
         self, 
@@ -1466,22 +1540,16 @@ class AnimeCollect(commands.Cog):
             await interaction.response.send_message("This command can only be used by the server owner!", ephemeral=True)
             return
         
-        # Ensure the target user exists in the database
-        self.ensure_user_exists(user.id, server_id)
-        
-        # Get current balance
-        current_balance = self.get_user_balance(user.id, server_id)
-        
-        # Make sure they have enough to take
-        if current_balance < amount:
+        # Remove the credits, only if they have enough to take
+        new_balance = await self.economy.debit(user.id, server_id, amount)
+        if new_balance is None:
+            current_balance = await self.economy.balance(user.id, server_id)
             await interaction.response.send_message(
                 f"{user.display_name} only has {current_balance} credits. You can't take {amount} credits.",
                 ephemeral=True
             )
             return
-        
-        # Remove the credits (update balance with negative amount)
-        new_balance = self.update_user_balance(user.id, server_id, -amount)
+        current_balance = new_balance + amount
         
         # Send confirmation message
         await interaction.response.send_message(
@@ -1494,157 +1562,72 @@ class AnimeCollect(commands.Cog):
         """Claim daily credits (once every 24 hours)"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
-        
-        # Set up the rewards table if it doesn't exist
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rewards_cooldown (
-                user_id INTEGER,
-                server_id INTEGER,
-                last_daily INTEGER DEFAULT 0,
-                last_weekly INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, server_id)
-            )
-        ''')
-        self.conn.commit()
         
-        # Make sure user exists in rewards table
-        self.cursor.execute(
-            "SELECT user_id FROM rewards_cooldown WHERE user_id = ? AND server_id = ?", 
-            (user_id, server_id)
-        )
-        if not self.cursor.fetchone():
-            self.cursor.execute(
-                "INSERT INTO rewards_cooldown (user_id, server_id, last_daily, last_weekly) VALUES (?, ?, 0, 0)", 
-                (user_id, server_id)
-            )
-            self.conn.commit()
-        
-        # Get the last claim time
-        self.cursor.execute(
-            "SELECT last_daily FROM rewards_cooldown WHERE user_id = ? AND server_id = ?", 
-            (user_id, server_id)
-        )
-        last_claim = self.cursor.fetchone()[0]
-        current_time = int(time.time())
-        daily_cooldown = 86400  # 24 hours
-        daily_amount = 250
-        
-        # Check if enough time has passed
-        if current_time - last_claim < daily_cooldown:
-            # Calculate time remaining
-            time_left = daily_cooldown - (current_time - last_claim)
-            hours, remainder = divmod(time_left, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            time_str = f"{hours}h {minutes}m {seconds}s"
-            
+        # Check and start the cooldown in memory, a rejected claim never touches the database
+        time_left = self.cooldowns.try_use(DAILY, user_id, server_id)
+        if time_left:
             await interaction.response.send_message(
-                f"❌ You've already claimed your daily credits. You can claim again in {time_str}.",
+                f"❌ You've already claimed your daily credits. You can claim again in {self.format_time_left(time_left)}.",
                 ephemeral=True
             )
             return
-        
-        # Update last claim time
-        self.cursor.execute(
-            "UPDATE rewards_cooldown SET last_daily = ? WHERE user_id = ? AND server_id = ?", 
-            (current_time, user_id, server_id)
-        )
+        current_time = int(time.time())
         
         # Add credits to user balance
-        new_balance = self.update_user_balance(user_id, server_id, daily_amount)
+        try:
+            new_balance = await self.economy.credit(user_id, server_id, self.daily_amount)
+        except Exception:
+            self.cooldowns.release(DAILY, user_id, server_id)
+            raise
         
         # Create embed
         embed = nextcord.Embed(
             title="Daily Credits Claimed!",
-            description=f"You've received {daily_amount} credits!",
+            description=f"You've received {self.daily_amount} credits!",
             color=0x00FF00
         )
         
         embed.add_field(name="Current Balance", value=f"{new_balance} credits", inline=False)
-        next_claim = datetime.datetime.fromtimestamp(current_time + daily_cooldown).strftime('%Y-%m-%d %H:%M:%S')
+        next_claim = datetime.datetime.fromtimestamp(current_time + self.daily_cooldown).strftime('%Y-%m-%d %H:%M:%S')
         embed.set_footer(text=f"Next claim available: {next_claim}")
         
         await interaction.response.send_message(embed=embed)
-        self.conn.commit()
 
     @nextcord.slash_command(name="weekly", description="Claim your weekly credits")
     async def weekly(self, interaction: nextcord.Interaction):
         """Claim weekly credits (once every 7 days)"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
-        
-        # Set up the rewards table if it doesn't exist
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rewards_cooldown (
-                user_id INTEGER,
-                server_id INTEGER,
-                last_daily INTEGER DEFAULT 0,
-                last_weekly INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, server_id)
-            )
-        ''')
-        self.conn.commit()
         
-        # Make sure user exists in rewards table
-        self.cursor.execute(
-            "SELECT user_id FROM rewards_cooldown WHERE user_id = ? AND server_id = ?", 
-            (user_id, server_id)
-        )
-        if not self.cursor.fetchone():
-            self.cursor.execute(
-                "INSERT INTO rewards_cooldown (user_id, server_id, last_daily, last_weekly) VALUES (?, ?, 0, 0)", 
-                (user_id, server_id)
-            )
-            self.conn.commit()
-        
-        # Get the last claim time
-        self.cursor.execute(
-            "SELECT last_weekly FROM rewards_cooldown WHERE user_id = ? AND server_id = ?", 
-            (user_id, server_id)
-        )
-        last_claim = self.cursor.fetchone()[0]
-        current_time = int(time.time())
-        weekly_cooldown = 604800  # 7 days
-        weekly_amount = 1000
-        
-        # Check if enough time has passed
-        if current_time - last_claim < weekly_cooldown:
-            # Calculate time remaining
-            time_left = weekly_cooldown - (current_time - last_claim)
-            days, remainder = divmod(time_left, 86400)
-            hours, remainder = divmod(remainder, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            time_str = f"{days}d {hours}h {minutes}m {seconds}s"
-            
+        # Check and start the cooldown in memory, a rejected claim never touches the database
+        time_left = self.cooldowns.try_use(WEEKLY, user_id, server_id)
+        if time_left:
             await interaction.response.send_message(
-                f"❌ You've already claimed your weekly credits. You can claim again in {time_str}.",
+                f"❌ You've already claimed your weekly credits. You can claim again in {self.format_time_left(time_left, with_days=True)}.",
                 ephemeral=True
             )
             return
-        
-        # Update last claim time
-        self.cursor.execute(
-            "UPDATE rewards_cooldown SET last_weekly = ? WHERE user_id = ? AND server_id = ?", 
-            (current_time, user_id, server_id)
-        )
+        current_time = int(time.time())
         
         # Add credits to user balance
-        new_balance = self.update_user_balance(user_id, server_id, weekly_amount)
+        try:
+            new_balance = await self.economy.credit(user_id, server_id, self.weekly_amount)
+        except Exception:
+            self.cooldowns.release(WEEKLY, user_id, server_id)
+            raise
         
         # Create embed
         embed = nextcord.Embed(
             title="Weekly Credits Claimed!",
-            description=f"You've received {weekly_amount} credits!",
+            description=f"You've received {self.weekly_amount} credits!",
             color=0x00FF00
         )
         
         embed.add_field(name="Current Balance", value=f"{new_balance} credits", inline=False)
-        next_claim = datetime.datetime.fromtimestamp(current_time + weekly_cooldown).strftime('%Y-%m-%d %H:%M:%S')
+        next_claim = datetime.datetime.fromtimestamp(current_time + self.weekly_cooldown).strftime('%Y-%m-%d %H:%M:%S')
         embed.set_footer(text=f"Next claim available: {next_claim}")
         
         await interaction.response.send_message(embed=embed)
-        self.conn.commit()
 
 
     @nextcord.slash_command(name="gamble", description="Gamble your credits by guessing a number")
@@ -1668,13 +1651,11 @@ class AnimeCollect(commands.Cog):
         """Gamble credits by guessing a number between 1 and 3. Win triple your bet if correct!"""
         user_id = interaction.user.id
         server_id = interaction.guild_id
-        self.ensure_user_exists(user_id, server_id)
-        
-        # Get current balance
-        current_balance = self.get_user_balance(user_id, server_id)
         
-        # Check if user has enough credits
-        if current_balance < amount:
+        # Take the stake up front, so concurrent gambles can't bet the same credits
+        new_balance = await self.economy.debit(user_id, server_id, amount)
+        if new_balance is None:
+            current_balance = await self.economy.balance(user_id, server_id)
             await interaction.response.send_message(
                 f"You don't have enough credits to gamble that amount! Your balance: {current_balance} credits.",
                 ephemeral=True
@@ -1689,7 +1670,7 @@ class AnimeCollect(commands.Cog):
         if guess == correct_number:
             # User wins triple their bet (since it's a 1/3 chance)
             winnings = amount * 2  # They get their bet back plus 2x more
-            new_balance = self.update_user_balance(user_id, server_id, winnings)
+            new_balance = await self.economy.credit(user_id, server_id, amount + winnings)
             
             embed = nextcord.Embed(
                 title="🎉 You Won!",
@@ -1701,8 +1682,7 @@ class AnimeCollect(commands.Cog):
             embed.add_field(name="New Balance", value=f"{new_balance} credits", inline=True)
             
         else:
-            # User loses their bet
-            new_balance = self.update_user_balance(user_id, server_id, -amount)
+            # User loses their bet, which was already taken
             
             embed = nextcord.Embed(
                 title="💸 You Lost",
@@ -1760,11 +1740,11 @@ class AnimeCollect(commands.Cog):
             return
         
         # Ensure both users exist in database
-        self.ensure_user_exists(challenger_id, server_id)
-        self.ensure_user_exists(target_id, server_id)
+        await self.economy.ensure_user(challenger_id, server_id)
+        await self.economy.ensure_user(target_id, server_id)
         
         # Check if challenger has enough credits
-        challenger_balance = self.get_user_balance(challenger_id, server_id)
+        challenger_balance = await self.economy.balance(challenger_id, server_id)
         if challenger_balance < amount:
             await interaction.response.send_message(
                 f"You don't have enough credits for this challenge! Your balance: {challenger_balance} credits.",
@@ -1789,7 +1769,7 @@ class AnimeCollect(commands.Cog):
             inline=True
         )
         
-        target_balance = self.get_user_balance(target_id, server_id)
+        target_balance = await self.economy.balance(target_id, server_id)
         embed.add_field(
             name=f"{user.display_name}'s Balance",
             value=f"{target_balance} credits",
@@ -1824,28 +1804,20 @@ class AnimeCollect(commands.Cog):
                 await button_interaction.response.send_message("This challenge isn't for you to accept!", ephemeral=True)
                 return
             
-            # Recheck balances to ensure both users still have enough credits
-            current_challenger_balance = self.get_user_balance(challenger_id, server_id)
-            current_target_balance = self.get_user_balance(target_id, server_id)
-            
-            if current_challenger_balance < amount:
-                await button_interaction.response.send_message(
-                    f"{interaction.user.display_name} no longer has enough credits for this challenge!",
-                    ephemeral=False
-                )
-                return
-                
-            if current_target_balance < amount:
-                await button_interaction.response.send_message(
-                    f"You don't have enough credits for this challenge!",
-                    ephemeral=True
-                )
+            # Deduct stakes from both users, only if both still have enough credits
+            if await self.economy.debit_many(server_id, {challenger_id: amount, target_id: amount}) is None:
+                if await self.economy.balance(challenger_id, server_id) < amount:
+                    await button_interaction.response.send_message(
+                        f"{interaction.user.display_name} no longer has enough credits for this challenge!",
+                        ephemeral=False
+                    )
+                else:
+                    await button_interaction.response.send_message(
+                        f"You don't have enough credits for this challenge!",
+                        ephemeral=True
+                    )
                 return
             
-            # Deduct stakes from both users
-            self.update_user_balance(challenger_id, server_id, -amount)
-            self.update_user_balance(target_id, server_id, -amount)
-            
             # Determine winner (50/50 chance)
             if random.random() >= 0.5:
                 winner_id = challenger_id
@@ -1861,7 +1833,7 @@ class AnimeCollect(commands.Cog):
                 loser_name = interaction.user.display_name
             
             # Award the pot to the winner
-            self.update_user_balance(winner_id, server_id, amount * 2)
+            await self.economy.credit(winner_id, server_id, amount * 2)
             
             # Create result embed
             result_embed = nextcord.Embed(
@@ -1,14 +1,20 @@
 import nextcord
 from nextcord.ext import commands, tasks
 from nextcord import SlashOption
-import aiohttp
 import asyncio
 import datetime
 import json
 import os
+import time
 from typing import Dict, List, Optional
 import sqlite3
 from dotenv import load_dotenv
+from utils.anilist_client import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, get_anilist_client, release_anilist_client
+from utils.airing_schedule import AiringSchedule
+from utils.notification_dispatcher import NotificationDispatcher
+from utils.migrations import migrate
+from utils.anime_notifications_schema import DB_PATH, MIGRATIONS
+from utils.subscription_index import SubscriptionIndex
 
 # Load environment variables
 load_dotenv()
@@ -21,85 +27,59 @@ class AnimeNotifications(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.session = None
-        self.anilist_url = "https://graphql.anilist.co"
+        self.anilist = get_anilist_client(bot)
+        
+        # Airing checks look back this many seconds, batching up to 50 anime per request (AniList's page size limit)
+        self.airing_window = 1800
+        self.airing_batch_size = 50
+        
+        # Next airing of every subscribed show; the scheduler sleeps until the earliest one
+        self.airing_schedule = AiringSchedule()
+        self.schedule_changed = asyncio.Event()
+        self.schedule_resync_interval = 6 * 3600  # full re-sync to pick up delays and reschedules
+        self.airing_retry_delay = 60  # AniList can lag a little behind the actual airing
+        self.next_schedule_sync = 0.0
+        self.last_catch_up = time.time() - self.airing_window
+        self.dispatcher = NotificationDispatcher(bot)
+        
+        # In-memory copy of the subscriptions, kept in sync by the commands that change them
+        self.subscriptions = SubscriptionIndex()
         
         # Database setup
-        self.db_path = "anime_notifications.db"
+        self.db_path = DB_PATH
         self.setup_database()
         
         # Start the background tasks
         self.check_airing_episodes.start()
 
     def setup_database(self):
-        """Set up the SQLite database for storing subscriptions"""
+        """Bring the subscription database up to the latest schema version"""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-                    # Create tables if they don't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS anime_subscriptions (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            anime_id INTEGER NOT NULL,
-            anime_title TEXT NOT NULL,
-            guild_id INTEGER NOT NULL,
-            channel_id INTEGER NOT NULL,
-            UNIQUE(user_id, anime_id, guild_id)
-        )
-        ''')
-        
-        # Table to track notified episodes
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notified_episodes (
-            id INTEGER PRIMARY KEY,
-            anime_id INTEGER NOT NULL,
-            episode_number INTEGER NOT NULL,
-            UNIQUE(anime_id, episode_number)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-
-    async def cog_load(self):
-        """Create aiohttp session when cog loads"""
-        self.session = aiohttp.ClientSession()
+        try:
+            migrate(conn, MIGRATIONS, "anime_notifications.db")
+            self.subscriptions.load(conn)
+        finally:
+            conn.close()
 
     async def cog_unload(self):
-        """Close aiohttp session and cancel tasks when cog unloads"""
-        if self.session:
-            await self.session.close()
+        """Cancel tasks and release the shared AniList client when cog unloads"""
         self.check_airing_episodes.cancel()
+        await release_anilist_client(self.bot)
 
-    async def fetch_anilist_data(self, query, variables=None):
+    async def fetch_anilist_data(self, query, variables=None, cache_kind=None, priority=PRIORITY_INTERACTIVE):
         """
-        Fetch data from AniList GraphQL API
+        Fetch data from AniList GraphQL API through the shared rate-limited client
         
         Args:
             query: GraphQL query string
             variables: Variables for the query
+            cache_kind: Response kind for the shared AniList cache (None to bypass it)
+            priority: Queue priority, background polling yields to user commands
             
         Returns:
             JSON response data
         """
-        if not self.session:
-            self.session = aiohttp.ClientSession()
-            
-        json_data = {
-            'query': query,
-            'variables': variables or {}
-        }
-        
-        try:
-            async with self.session.post(self.anilist_url, json=json_data) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"API error: {response.status}. Details: {error_text}")
-        except aiohttp.ClientError as e:
-            raise Exception(f"Network error: {str(e)}")
+        return await self.anilist.query(query, variables, priority=priority, cache_kind=cache_kind)
 
     @nextcord.slash_command(
         name="anime",
@@ -196,7 +176,7 @@ class AnimeNotifications(commands.Cog):
         variables = {'search': title}
         
         try:
-            data = await self.fetch_anilist_data(query, variables)
+            data = await self.fetch_anilist_data(query, variables, cache_kind="search")
             results = data['data']['Page']['media']
             
             if not results:
@@ -217,7 +197,7 @@ class AnimeNotifications(commands.Cog):
                 if anime['nextAiringEpisode']:
                     next_ep = anime['nextAiringEpisode']
                     airing_time = datetime.datetime.fromtimestamp(next_ep['airingAt'])
-                    time_until = self.format_time_until(next_ep['timeUntilAiring'])
+                    time_until = self.format_time_until(next_ep['airingAt'] - int(time.time()))
                     airing_info = f"\nEpisode {next_ep['episode']} airs {time_until}"
                 
                 embed.add_field(
@@ -275,6 +255,7 @@ class AnimeNotifications(commands.Cog):
         variables = {'id': anime_id}
         
         try:
+            # Bypass the cache, a stale nextAiringEpisode would schedule an episode that already aired
             data = await self.fetch_anilist_data(query, variables)
             anime = data['data']['Media']
             
@@ -296,13 +277,16 @@ class AnimeNotifications(commands.Cog):
                     (interaction.user.id, anime_id, title_display, interaction.guild_id, interaction.channel_id)
                 )
                 conn.commit()
+                self.subscriptions.add(interaction.user.id, anime_id, interaction.guild_id, interaction.channel_id)
                 
                 # Get next episode info
                 next_ep = anime['nextAiringEpisode']
                 airing_info = ""
-                if next_ep:
+                if next_ep and next_ep['airingAt'] > time.time():
+                    self.airing_schedule.set(anime_id, next_ep['airingAt'], next_ep['episode'])
+                    self.schedule_changed.set()
                     airing_time = datetime.datetime.fromtimestamp(next_ep['airingAt'])
-                    time_until = self.format_time_until(next_ep['timeUntilAiring'])
+                    time_until = self.format_time_until(next_ep['airingAt'] - int(time.time()))
                     airing_info = f"Episode {next_ep['episode']} airs {time_until}"
                 
                 embed = nextcord.Embed(
@@ -363,6 +347,7 @@ class AnimeNotifications(commands.Cog):
                 (interaction.user.id, anime_id)
             )
             conn.commit()
+            self.subscriptions.remove(interaction.user.id, anime_id)
             
             embed = nextcord.Embed(
                 title="Anime Subscription Removed",
@@ -417,6 +402,7 @@ class AnimeNotifications(commands.Cog):
                 (channel.id, interaction.user.id, interaction.guild.id)
             )
             conn.commit()
+            self.subscriptions.set_channel(interaction.user.id, interaction.guild.id, channel.id)
             
             embed = nextcord.Embed(
                 title="Notification Channel Updated",
@@ -525,7 +511,7 @@ class AnimeNotifications(commands.Cog):
         variables = {'id': anime_id}
         
         try:
-            data = await self.fetch_anilist_data(query, variables)
+            data = await self.fetch_anilist_data(query, variables, cache_kind="airing")
             anime = data['data']['Media']
             
             if anime['status'] != 'RELEASING':
@@ -534,65 +520,64 @@ class AnimeNotifications(commands.Cog):
             next_ep = anime['nextAiringEpisode']
             if next_ep:
                 airing_time = datetime.datetime.fromtimestamp(next_ep['airingAt'])
-                time_until = self.format_time_until(next_ep['timeUntilAiring'])
+                time_until = self.format_time_until(next_ep['airingAt'] - int(time.time()))
                 return f"Episode {next_ep['episode']} airs {time_until}\n({airing_time.strftime('%Y-%m-%d %H:%M UTC')})"
             else:
                 return None
         except Exception:
             return None
 
-    @tasks.loop(minutes=10)
+    @tasks.loop()
     async def check_airing_episodes(self):
         """
-        Background task that checks for recently aired or upcoming episodes
-        and sends notifications to subscribed users
+        Background task that sleeps until the next subscribed episode airs
+        and then sends notifications to subscribed users
         """
         try:
-            # Get all active subscriptions from the database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if time.time() >= self.next_schedule_sync:
+                await self.sync_airing_schedule()
             
-            cursor.execute("SELECT DISTINCT anime_id FROM anime_subscriptions")
-            anime_ids = [row[0] for row in cursor.fetchall()]
-            
-            if not anime_ids:
-                # No subscriptions, nothing to do
-                conn.close()
+            # Sleep until the earliest airing or the next full re-sync, waking early if a subscription adds a show
+            next_airing = self.airing_schedule.next_airing()
+            wake_at = min(next_airing, self.next_schedule_sync) if next_airing else self.next_schedule_sync
+            self.schedule_changed.clear()
+            try:
+                await asyncio.wait_for(self.schedule_changed.wait(), timeout=max(0.0, wake_at - time.time()))
                 return
+            except asyncio.TimeoutError:
+                pass
             
-            # Check each anime for new episodes
-            for anime_id in anime_ids:
-                await self.check_anime_for_notifications(anime_id, conn)
-                
-                # Sleep briefly between API calls to avoid rate limiting
-                await asyncio.sleep(1)
+            due = self.airing_schedule.pop_due(time.time())
+            if due:
+                await self.process_due_airings(due)
                 
         except Exception as e:
             print(f"Error in check_airing_episodes task: {str(e)}")
-        finally:
-            if 'conn' in locals() and conn:
-                conn.close()
+            await asyncio.sleep(self.airing_retry_delay)
 
-    async def check_anime_for_notifications(self, anime_id: int, conn: sqlite3.Connection):
-        """Check if an anime has a new episode that needs notifications"""
+    async def sync_airing_schedule(self, anime_ids: Optional[List[int]] = None):
+        """
+        Refresh the next airing of subscribed anime from AniList
+        
+        Args:
+            anime_ids: Anime to refresh, or None for a full re-sync of every subscription
+        """
+        full_sync = anime_ids is None
+        if full_sync:
+            anime_ids = self.subscriptions.anime_ids()
+            
+            # Shows nobody is subscribed to anymore drop out of the schedule here
+            for anime_id in self.airing_schedule.tracked() - set(anime_ids):
+                self.airing_schedule.remove(anime_id)
+        
         query = '''
-        query ($id: Int) {
-            Media(id: $id, type: ANIME) {
-                id
-                title {
-                    romaji
-                    english
-                }
-                status
-                nextAiringEpisode {
-                    airingAt
-                    timeUntilAiring
-                    episode
-                }
-                airingSchedule {
-                    nodes {
+        query ($ids: [Int], $page: Int) {
+            Page(page: $page, perPage: 50) {
+                media(id_in: $ids, type: ANIME) {
+                    id
+                    status
+                    nextAiringEpisode {
                         airingAt
-                        timeUntilAiring
                         episode
                     }
                 }
@@ -600,76 +585,166 @@ class AnimeNotifications(commands.Cog):
         }
         '''
         
-        variables = {'id': anime_id}
+        now = time.time()
+        finished = []
+        for start in range(0, len(anime_ids), self.airing_batch_size):
+            batch = anime_ids[start:start + self.airing_batch_size]
+            try:
+                data = await self.fetch_anilist_data(query, {'ids': batch, 'page': 1}, priority=PRIORITY_BACKGROUND)
+                media = data['data']['Page']['media']
+            except Exception as e:
+                print(f"Error syncing airing schedule for {len(batch)} anime: {str(e)}")
+                continue
+            
+            for anime in media:
+                next_ep = anime['nextAiringEpisode']
+                if not next_ep:
+                    self.airing_schedule.remove(anime['id'])
+                    if anime['status'] in ('FINISHED', 'CANCELLED'):
+                        finished.append(anime['id'])
+                elif next_ep['airingAt'] <= now:
+                    # AniList hasn't moved on to the next episode yet, look again shortly
+                    self.airing_schedule.set(anime['id'], int(now + self.airing_retry_delay), next_ep['episode'])
+                else:
+                    self.airing_schedule.set(anime['id'], next_ep['airingAt'], next_ep['episode'])
+        
+        if finished:
+            self.prune_notified_episodes(finished)
         
+        if full_sync:
+            # Notify for anything that aired while the bot was offline or got rescheduled earlier
+            aired = await self.fetch_aired_episodes(anime_ids, int(self.last_catch_up) - 1, int(now) + 1)
+            self.last_catch_up = now
+            await self.notify_aired_episodes(aired)
+            self.next_schedule_sync = now + self.schedule_resync_interval
+
+    def prune_notified_episodes(self, anime_ids: List[int]):
+        """Forget notified episodes of shows that finished airing, they can't air again"""
+        conn = sqlite3.connect(self.db_path)
         try:
-            data = await self.fetch_anilist_data(query, variables)
-            anime = data['data']['Media']
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM notified_episodes WHERE anime_id = ?", [(anime_id,) for anime_id in anime_ids])
+            conn.commit()
+        finally:
+            conn.close()
+        
+        for anime_id in anime_ids:
+            self.subscriptions.forget_notified(anime_id)
+
+    async def process_due_airings(self, due: List[tuple]):
+        """Confirm which due episodes have aired, notify their subscribers and reschedule the shows"""
+        anime_ids = [anime_id for anime_id, _, _ in due]
+        # Look back a full window since retried entries are scheduled after their real airing time
+        earliest = min(airing_at for _, _, airing_at in due)
+        aired = await self.fetch_aired_episodes(anime_ids, earliest - self.airing_window, int(time.time()) + 1)
+        await self.notify_aired_episodes(aired)
+        
+        await self.sync_airing_schedule(anime_ids)
+
+    async def fetch_aired_episodes(self, anime_ids: List[int], aired_after: int, aired_before: int) -> List[Dict]:
+        """
+        Fetch every episode of the given anime that aired inside a time window
+        
+        Args:
+            anime_ids: AniList IDs of the anime to check
+            aired_after: Start of the window (unix timestamp, exclusive)
+            aired_before: End of the window (unix timestamp, exclusive)
             
-            if anime['status'] != 'RELEASING':
-                return  # Anime is not currently airing
+        Returns:
+            airingSchedule nodes with mediaId, episode, airingAt and the media title
+        """
+        query = '''
+        query ($ids: [Int], $from: Int, $to: Int, $page: Int) {
+            Page(page: $page, perPage: 50) {
+                pageInfo {
+                    hasNextPage
+                }
+                airingSchedules(mediaId_in: $ids, airingAt_greater: $from, airingAt_lesser: $to, sort: TIME) {
+                    mediaId
+                    episode
+                    airingAt
+                    media {
+                        title {
+                            romaji
+                            english
+                        }
+                    }
+                }
+            }
+        }
+        '''
+        
+        aired = []
+        for start in range(0, len(anime_ids), self.airing_batch_size):
+            batch = anime_ids[start:start + self.airing_batch_size]
+            page = 1
+            while True:
+                variables = {'ids': batch, 'from': aired_after, 'to': aired_before, 'page': page}
+                try:
+                    data = await self.fetch_anilist_data(query, variables, priority=PRIORITY_BACKGROUND)
+                    result = data['data']['Page']
+                except Exception as e:
+                    print(f"Error fetching airing schedules for {len(batch)} anime: {str(e)}")
+                    break
                 
-            # Get episodes that have aired in the last 30 minutes
-            # (This gives some buffer for API delays and our check interval)
-            current_time = datetime.datetime.now().timestamp()
-            recently_aired = []
+                aired.extend(result['airingSchedules'])
+                if not result['pageInfo']['hasNextPage']:
+                    break
+                page += 1
+        
+        return aired
+
+    async def notify_aired_episodes(self, aired: List[Dict]):
+        """Notify subscribers about aired episodes they haven't been notified about yet"""
+        pending = []
+        for episode in aired:
+            anime_id = episode['mediaId']
+            if self.subscriptions.is_notified(anime_id, episode['episode']):
+                continue  # Already notified
+            # Mark before sending so an overlapping catch-up can't notify twice
+            self.subscriptions.mark_notified(anime_id, episode['episode'])
+            pending.append(episode)
+        
+        if not pending:
+            return
+        
+        await asyncio.gather(*(self.notify_aired_episode(episode) for episode in pending))
+        
+        # Persist the notified episodes once the messages are out
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO notified_episodes (anime_id, episode_number) VALUES (?, ?)",
+                [(episode['mediaId'], episode['episode']) for episode in pending]
+            )
+            conn.commit()
+        except Exception as e:
+            print(f"Error recording notified episodes: {str(e)}")
+        finally:
+            conn.close()
+
+    async def notify_aired_episode(self, episode: Dict):
+        """Send one aired episode to everyone subscribed to its anime"""
+        anime_id = episode['mediaId']
+        
+        try:
+            subscriptions = self.subscriptions.subscribers(anime_id)
+            title = episode['media']['title']
+            title_display = title['english'] or title['romaji']
             
-            for node in anime['airingSchedule']['nodes']:
-                # Check if episode aired in the last 30 minutes
-                time_since_aired = current_time - node['airingAt']
-                if 0 <= time_since_aired <= 1800:  # 30 minutes in seconds
-                    recently_aired.append(node)
+            embed = nextcord.Embed(
+                title="🎬 New Anime Episode Released!",
+                description=f"**{title_display}** Episode {episode['episode']} is now available!",
+                color=nextcord.Color.gold(),
+                timestamp=datetime.datetime.fromtimestamp(episode['airingAt'])
+            )
             
-            cursor = conn.cursor()
+            # Send notifications to all subscribed users, one packed mention message per channel
+            await self.dispatcher.dispatch(subscriptions, embed, episode['airingAt'])
             
-            for episode in recently_aired:
-                # Check if we've already notified for this episode
-                cursor.execute(
-                    "SELECT id FROM notified_episodes WHERE anime_id = ? AND episode_number = ?",
-                    (anime_id, episode['episode'])
-                )
-                
-                if cursor.fetchone():
-                    continue  # Already notified
-                
-                # Get all users subscribed to this anime
-                cursor.execute(
-                    "SELECT user_id, guild_id, channel_id FROM anime_subscriptions WHERE anime_id = ?",
-                    (anime_id,)
-                )
-                
-                subscriptions = cursor.fetchall()
-                title_display = anime['title']['english'] or anime['title']['romaji']
-                
-                # Send notifications to all subscribed users
-                for user_id, guild_id, channel_id in subscriptions:
-                    try:
-                        channel = self.bot.get_channel(channel_id)
-                        if not channel:
-                            continue
-                            
-                        embed = nextcord.Embed(
-                            title="🎬 New Anime Episode Released!",
-                            description=f"**{title_display}** Episode {episode['episode']} is now available!",
-                            color=nextcord.Color.gold(),
-                            timestamp=datetime.datetime.fromtimestamp(episode['airingAt'])
-                        )
-                        
-                        # Add a mention for the user
-                        await channel.send(f"<@{user_id}>", embed=embed)
-                        
-                    except Exception as e:
-                        print(f"Error sending notification: {str(e)}")
-                
-                # Mark this episode as notified
-                cursor.execute(
-                    "INSERT OR IGNORE INTO notified_episodes (anime_id, episode_number) VALUES (?, ?)",
-                    (anime_id, episode['episode'])
-                )
-                conn.commit()
-                
         except Exception as e:
-            print(f"Error checking anime {anime_id}: {str(e)}")
+            print(f"Error notifying for anime {anime_id}: {str(e)}")
 
     @check_airing_episodes.before_loop
     async def before_check_airing_episodes(self):
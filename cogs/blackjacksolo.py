@@ -2,8 +2,9 @@ import nextcord
 from nextcord.ext import commands
 import random
 import asyncio
-import sqlite3
 from typing import List, Dict, Tuple, Optional
+from utils.anigame_db import get_anigame_db, release_anigame_db
+from utils.economy import get_economy
 
 class Card:
     def __init__(self, suit: str, value: str):
@@ -198,36 +199,14 @@ class BlackjackCog(commands.Cog):
         self.bot = bot
         self.active_games: Dict[int, Dict[int, BlackjackGame]] = {}  # server_id -> {user_id: game}
         self.pending_invites: Dict[int, Dict[int, Dict]] = {}  # server_id -> {target_id: {sender_id, bet}}
-        self.conn = sqlite3.connect('anigame.db')
-        self.cursor = self.conn.cursor()
+        self.db = get_anigame_db(bot)
+        self.economy = get_economy(bot)
         self.min_bet = 10
         self.max_bet = 100000
     
-    def cog_unload(self):
-        """Close the database connection when the cog is unloaded"""
-        if self.conn:
-            self.conn.close()
-    
-    def ensure_user_exists(self, user_id: int, server_id: int):
-        """Make sure the user exists in the database for the specific server"""
-        self.cursor.execute("SELECT user_id FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        if not self.cursor.fetchone():
-            self.cursor.execute("INSERT INTO users (user_id, server_id, balance, last_roll) VALUES (?, ?, 0, 0)", (user_id, server_id))
-            self.conn.commit()
-
-    def get_user_balance(self, user_id: int, server_id: int) -> int:
-        """Get a user's balance for the specific server"""
-        self.ensure_user_exists(user_id, server_id)
-        self.cursor.execute("SELECT balance FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id))
-        return self.cursor.fetchone()[0]
-
-    def update_user_balance(self, user_id: int, server_id: int, amount: int) -> int:
-        """Update a user's balance for the specific server"""
-        self.ensure_user_exists(user_id, server_id)
-        new_balance = self.get_user_balance(user_id, server_id) + amount
-        self.cursor.execute("UPDATE users SET balance = ? WHERE user_id = ? AND server_id = ?", (new_balance, user_id, server_id))
-        self.conn.commit()
-        return new_balance
+    async def cog_unload(self):
+        """Release the shared storage engine when the cog is unloaded"""
+        await release_anigame_db(self.bot)
     
     @nextcord.slash_command(name="blackjack", description="Play a game of Blackjack")
     async def blackjack(self, interaction: nextcord.Interaction):
@@ -261,7 +240,7 @@ class BlackjackCog(commands.Cog):
             return
         
         # Check if user has enough credits
-        balance = self.get_user_balance(user_id, server_id)
+        balance = await self.economy.balance(user_id, server_id)
         if balance < bet:
             await interaction.response.send_message(f"You don't have enough credits! You need {bet} credits, but you only have {balance}.", ephemeral=True)
             return
@@ -284,7 +263,7 @@ class BlackjackCog(commands.Cog):
                 return
                 
             # Check if opponent has enough credits
-            opponent_balance = self.get_user_balance(opponent.id, server_id)
+            opponent_balance = await self.economy.balance(opponent.id, server_id)
             if opponent_balance < bet:
                 await interaction.response.send_message(f"{opponent.display_name} doesn't have enough credits for this bet!", ephemeral=True)
                 return
@@ -325,26 +304,20 @@ class BlackjackCog(commands.Cog):
                     await button_interaction.response.send_message("This challenge is no longer valid!", ephemeral=True)
                     return
                 
-                # Recheck balances
-                current_sender_balance = self.get_user_balance(user_id, server_id)
-                current_opponent_balance = self.get_user_balance(opponent.id, server_id)
-                
-                if current_sender_balance < bet:
-                    await button_interaction.response.send_message(
-                        f"{interaction.user.display_name} no longer has enough credits for this challenge!",
-                        ephemeral=False
-                    )
+                # Deduct bets from both players, only if both still have enough credits
+                if await self.economy.debit_many(server_id, {user_id: bet, opponent.id: bet}) is None:
+                    if await self.economy.balance(user_id, server_id) < bet:
+                        await button_interaction.response.send_message(
+                            f"{interaction.user.display_name} no longer has enough credits for this challenge!",
+                            ephemeral=False
+                        )
+                    else:
+                        await button_interaction.response.send_message(
+                            "You don't have enough credits for this challenge!",
+                            ephemeral=True
+                        )
                     # Clean up the invite
-                    del self.pending_invites[server_id][opponent.id]
-                    return
-                    
-                if current_opponent_balance < bet:
-                    await button_interaction.response.send_message(
-                        "You don't have enough credits for this challenge!",
-                        ephemeral=True
-                    )
-                    #clean up the invite
-                    del self.pending_invites[server_id][opponent.id]
+                    self.pending_invites[server_id].pop(opponent.id, None)
                     return
                 
                 #Get invitation data and clean it up BEFORE creating the game
@@ -358,10 +331,6 @@ class BlackjackCog(commands.Cog):
                     print(f"Error deleting challenge message: {e}")
                     #Continue even if deletion fails
                 
-                #Deduct bets from both players
-                self.update_user_balance(user_id, server_id, -bet)
-                self.update_user_balance(opponent.id, server_id, -bet)
-                
                 #Start the PvP game
                 if server_id not in self.active_games:
                     self.active_games[server_id] = {}
@@ -400,22 +369,22 @@ class BlackjackCog(commands.Cog):
                     # Game is over immediately with a natural blackjack
                     if game.game_status == "player_blackjack":
                         # Player (opponent) wins
-                        self.update_user_balance(opponent.id, server_id, bet * 2)  # Return bet + dealer's bet
+                        await self.economy.credit(opponent.id, server_id, bet * 2)  # Return bet + dealer's bet
                         await button_interaction.response.send_message(
                             f"{opponent.mention} got Blackjack and won {bet} credits from {interaction.user.mention}!",
                             embed=game_embed
                         )
                     elif game.game_status == "dealer_blackjack":
                         # Dealer (sender) wins
-                        self.update_user_balance(user_id, server_id, bet * 2)  # Return bet + player's bet
+                        await self.economy.credit(user_id, server_id, bet * 2)  # Return bet + player's bet
                         await button_interaction.response.send_message(
                             f"{interaction.user.mention} (dealer) got Blackjack and won {bet} credits from {opponent.mention}!",
                             embed=game_embed
                         )
                     else:  # Tie
                         # Return bets to both players
-                        self.update_user_balance(user_id, server_id, bet)
-                        self.update_user_balance(opponent.id, server_id, bet)
+                        await self.economy.credit(user_id, server_id, bet)
+                        await self.economy.credit(opponent.id, server_id, bet)
                         await button_interaction.response.send_message(
                             f"Both players got Blackjack! It's a tie, all bets returned.",
                             embed=game_embed
@@ -476,8 +445,10 @@ class BlackjackCog(commands.Cog):
             return
             
         # If no opponent specified, play against the dealer (bot)
-        # Deduct bet amount from user balance
-        self.update_user_balance(user_id, server_id, -bet)
+        # Deduct bet amount from user balance, unless another command spent it meanwhile
+        if await self.economy.debit(user_id, server_id, bet) is None:
+            await interaction.response.send_message(f"You don't have enough credits! You need {bet} credits.", ephemeral=True)
+            return
         
         # Create a new game for the user
         if server_id not in self.active_games:
@@ -496,7 +467,7 @@ class BlackjackCog(commands.Cog):
             
             # Process payout
             payout = game.calculate_payout()
-            new_balance = self.update_user_balance(user_id, server_id, payout + bet)  # Return the bet + any winnings
+            new_balance = await self.economy.credit(user_id, server_id, payout + bet)  # Return the bet + any winnings
             
             embed.add_field(name="Payout", value=f"{payout} credits", inline=True)
             embed.add_field(name="New Balance", value=f"{new_balance} credits", inline=True)
@@ -707,7 +678,7 @@ class BlackjackCog(commands.Cog):
             embed = self._create_game_embed(game, False)
             
             # Update user balance (they already lost their bet when starting)
-            new_balance = self.get_user_balance(user_id, server_id)
+            new_balance = await self.economy.balance(user_id, server_id)
             embed.add_field(name="New Balance", value=f"{new_balance} credits", inline=True)
             
             await interaction.response.edit_message(embed=embed, view=None)
@@ -737,7 +708,7 @@ class BlackjackCog(commands.Cog):
         
         # Determine payout
         payout = game.calculate_payout()
-        new_balance = self.update_user_balance(user_id, server_id, payout + game.bet)  # Return the bet + any winnings
+        new_balance = await self.economy.credit(user_id, server_id, payout + game.bet)  # Return the bet + any winnings
         
         # Show final game state
         embed = self._create_game_embed(game, False)
@@ -770,14 +741,10 @@ class BlackjackCog(commands.Cog):
             await interaction.response.send_message("You can only double down on your initial hand.", ephemeral=True)
             return
         
-        # Check if user has enough credits to double down
-        balance = self.get_user_balance(user_id, server_id)
-        if balance < game.bet:
+        # Deduct the additional bet if the user has enough credits to double down
+        if await self.economy.debit(user_id, server_id, game.bet) is None:
             await interaction.response.send_message(f"You don't have enough credits to double down! You need {game.bet} more credits.", ephemeral=True)
             return
-        
-        # Deduct the additional bet
-        self.update_user_balance(user_id, server_id, -game.bet)
         game.bet *= 2  # Double the bet
         
         # Give player exactly one more card then stand
@@ -786,7 +753,7 @@ class BlackjackCog(commands.Cog):
         
         # Determine payout
         payout = game.calculate_payout()
-        new_balance = self.update_user_balance(user_id, server_id, payout + game.bet)  # Return the bet + any winnings
+        new_balance = await self.economy.credit(user_id, server_id, payout + game.bet)  # Return the bet + any winnings
         
         # Show final game state
         embed = self._create_game_embed(game, False)
@@ -847,12 +814,12 @@ class BlackjackCog(commands.Cog):
             # Determine winner and update balances
             if game.game_status == "player_bust":
                 # Dealer wins
-                self.update_user_balance(dealer_id, server_id, game.bet * 2)  # Return bet + player's bet
+                await self.economy.credit(dealer_id, server_id, game.bet * 2)  # Return bet + player's bet
                 winner = dealer.display_name
                 loser = player.display_name
             else:  # dealer_bust
                 # Player wins
-                self.update_user_balance(player_id, server_id, game.bet * 2)  # Return bet + dealer's bet
+                await self.economy.credit(player_id, server_id, game.bet * 2)  # Return bet + dealer's bet
                 winner = player.display_name
                 loser = dealer.display_name
             
@@ -934,18 +901,18 @@ class BlackjackCog(commands.Cog):
             # Update balances based on game result
             if game.game_status == "player_win":
                 # Player wins
-                self.update_user_balance(player_id, server_id, game.bet * 2)  # Return bet + dealer's bet
+                await self.economy.credit(player_id, server_id, game.bet * 2)  # Return bet + dealer's bet
                 winner = player.display_name
                 loser = dealer.display_name
             elif game.game_status == "dealer_win":
                 #dealer wins
-                self.update_user_balance(dealer_id, server_id, game.bet * 2)  # Return bet + player's bet
+                await self.economy.credit(dealer_id, server_id, game.bet * 2)  # Return bet + player's bet
                 winner = dealer.display_name
                 loser = player.display_name
             else:  # tie
                 #Return bets to both players
-                self.update_user_balance(player_id, server_id, game.bet)
-                self.update_user_balance(dealer_id, server_id, game.bet)
+                await self.economy.credit(player_id, server_id, game.bet)
+                await self.economy.credit(dealer_id, server_id, game.bet)
                 winner = None
             
             if winner:
@@ -981,8 +948,8 @@ class BlackjackCog(commands.Cog):
         game = self.active_games[server_id][player_id]
         
         #Return bets to both players
-        self.update_user_balance(player_id, server_id, game.bet)
-        self.update_user_balance(dealer_id, server_id, game.bet)
+        await self.economy.credit(player_id, server_id, game.bet)
+        await self.economy.credit(dealer_id, server_id, game.bet)
         
         #Get the players
         player = await self.bot.fetch_user(player_id)
@@ -1,13 +1,19 @@
 import nextcord
-from nextcord.ext import commands
+from nextcord.ext import commands, tasks
 from nextcord import SlashOption
 import aiohttp
 import asyncio
 import datetime
 import urllib.parse
 import os
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from dotenv import load_dotenv
+from utils.coc_cache import get_coc_cache
+from utils.single_flight import SingleFlight
+from utils.cwl import CWLAggregator
+from utils.coc_schema import get_coc_db, release_coc_db
+from utils.war_tracker import WarTracker
+from utils.legend_tracker import LegendDay, get_legend_tracker, next_reset
 
 # Load environment variables from .env file
 load_dotenv("tkn.env")
@@ -28,10 +34,23 @@ class ClashOfClans(commands.Cog):
         self.base_url = "https://api.clashofclans.com/v1"
         self.headers = {"Authorization": f"Bearer {self.api_key}"}
         self.session = None
-        # Store the last known season ID to detect season changes
-        self.last_season_id = None
-        # Store legend league reset time (will be updated dynamically)
-        self.legend_reset_time = None
+        # Shared response cache, honours the API's Cache-Control max-age
+        self.cache = get_coc_cache(bot)
+        # Concurrent lookups of the same endpoint share one request
+        self.inflight = SingleFlight()
+        # Fetches every CWL round war in parallel and keeps finished ones
+        self.cwl = CWLAggregator(self.fetch_data)
+        # coc.db is opened once and shared with the legends cog, so its writers never contend
+        self.db = get_coc_db(bot)
+        # Legend League players snapshotted in the background, shared with the legends cog
+        self.legend_tracker = get_legend_tracker(bot)
+
+        # Registered clans' wars, polled in the background and recorded in coc.db
+        self.war_tracker = WarTracker(self.db, self.fetch_data)
+        self.war_tracker.load()
+        if self.api_key:
+            self.poll_wars.start()
+            self.snapshot_legends.start()
 
     async def cog_load(self):
         """Create aiohttp session when cog loads"""
@@ -39,12 +58,86 @@ class ClashOfClans(commands.Cog):
 
     async def cog_unload(self):
         """Close aiohttp session when cog unloads"""
+        self.poll_wars.cancel()
+        self.snapshot_legends.cancel()
         if self.session:
             await self.session.close()
+        release_coc_db(self.bot)
+
+    @tasks.loop(seconds=30)
+    async def poll_wars(self):
+        """Poll the wars that are due and announce their new attacks"""
+        due = self.war_tracker.due()
+        results = await asyncio.gather(*(self.war_tracker.poll(clan_tag) for clan_tag in due), return_exceptions=True)
+
+        for clan_tag, result in zip(due, results):
+            if isinstance(result, Exception):
+                print(f"Error tracking war for clan {clan_tag}: {result}")
+                continue
+            war, new_attacks = result
+            if new_attacks:
+                await self.announce_attacks(clan_tag, war, new_attacks)
+
+    @poll_wars.before_loop
+    async def before_poll_wars(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(minutes=5)
+    async def snapshot_legends(self):
+        """Snapshot every tracked Legend League player's trophies"""
+        semaphore = asyncio.Semaphore(8)
+
+        async def snapshot(player_tag: str):
+            async with semaphore:
+                player_data = await self.fetch_data(f"players/{urllib.parse.quote(player_tag)}")
+            self.legend_tracker.snapshot(player_tag, player_data)
+
+        player_tags = self.legend_tracker.tracked()
+        results = await asyncio.gather(*(snapshot(player_tag) for player_tag in player_tags), return_exceptions=True)
+        for player_tag, result in zip(player_tags, results):
+            if isinstance(result, Exception):
+                print(f"Error snapshotting Legend League player {player_tag}: {result}")
+
+    @snapshot_legends.before_loop
+    async def before_snapshot_legends(self):
+        await self.bot.wait_until_ready()
+
+    async def announce_attacks(self, clan_tag: str, war: Dict[str, Any], attacks: List[Any]):
+        """Post a clan's new war attacks to every channel tracking it"""
+        clan = self.war_tracker.clans.get(clan_tag)
+        if clan is None:
+            return
+
+        lines = []
+        for attack in attacks:
+            icon = "🛡️" if attack.is_opponent else "⚔️"
+            lines.append(
+                f"{icon} **{attack.attacker_name}** → {attack.defender_name}: "
+                f"{'⭐' * attack.stars or '0 ⭐'} {attack.destruction}%"
+            )
+
+        embed = nextcord.Embed(
+            title=f"War: {war['clan']['name']} vs {war['opponent']['name']}",
+            description="\n".join(lines[-20:]) + (f"\n...and {len(lines) - 20} earlier attacks" if len(lines) > 20 else ""),
+            color=nextcord.Color.red()
+        )
+        embed.set_footer(
+            text=f"⭐ {war['clan']['stars']} - {war['opponent']['stars']} | "
+                 f"💥 {war['clan']['destructionPercentage']:.1f}% - {war['opponent']['destructionPercentage']:.1f}%"
+        )
+
+        for channel_id in list(clan.channels.values()):
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                continue
+            try:
+                await channel.send(embed=embed)
+            except nextcord.HTTPException as e:
+                print(f"Error posting war attacks for clan {clan_tag} to channel {channel_id}: {e}")
 
     async def fetch_data(self, endpoint: str) -> Dict[str, Any]:
         """
-        Fetches data from the Clash of Clans API.
+        Fetches data from the Clash of Clans API, served from the shared cache while fresh.
 
         Args:
             endpoint: The API endpoint to query
@@ -54,7 +147,16 @@ class ClashOfClans(commands.Cog):
         """
         if not self.api_key:
             raise Exception("COC_API_KEY environment variable not set")
-            
+        
+        return await self.cache.fetch(endpoint, lambda: self.inflight.do(endpoint, lambda: self.request(endpoint)))
+
+    async def request(self, endpoint: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Query the Clash of Clans API directly.
+
+        Returns:
+            The API response and its Cache-Control header
+        """
         url = f"{self.base_url}/{endpoint}"
 
         # Create a session if one doesn't exist
@@ -64,7 +166,7 @@ class ClashOfClans(commands.Cog):
         try:
             async with self.session.get(url, headers=self.headers) as response:
                 if response.status == 200:
-                    return await response.json()
+                    return await response.json(), response.headers.get("Cache-Control")
                 elif response.status == 403:
                     error_text = await response.text()
                     raise Exception(f"Invalid API key or unauthorized access. Details: {error_text}")
@@ -123,6 +225,26 @@ class ClashOfClans(commands.Cog):
             value="Get Legend League attack results for a player",
             inline=False
         )
+        embed.add_field(
+            name="/coc legendtrack / legenduntrack",
+            value="Start or stop recording a Legend League player's daily attacks and defenses",
+            inline=False
+        )
+        embed.add_field(
+            name="/coc track <clan_tag> <#channel>",
+            value="Post a clan's war attacks to a channel as they happen (Admin only)",
+            inline=False
+        )
+        embed.add_field(
+            name="/coc untrack <clan_tag>",
+            value="Stop posting a clan's war attacks (Admin only)",
+            inline=False
+        )
+        embed.add_field(
+            name="/coc attacks",
+            value="Get a player's war attack history from tracked wars",
+            inline=False
+        )
 
         embed.set_footer(text="Note: Player and clan tags should include the # symbol")
         await interaction.response.send_message(embed=embed)
@@ -478,6 +600,34 @@ class ClashOfClans(commands.Cog):
                     inline=False
                 )
 
+                # Standings and member stars need every war of every round
+                summary = await self.cwl.summarize(cwl_data)
+
+                standings = []
+                for i, standing in enumerate(summary.standings()):
+                    standings.append(f"{i+1}. {standing.name}: ⭐ {standing.stars} | 💥 {standing.destruction:.0f}% | {standing.wins}W/{standing.wars}")
+
+                embed.add_field(
+                    name="🏆 Standings",
+                    value="\n".join(standings[:8]),
+                    inline=False
+                )
+
+                own_tag = clan_tag.upper() if clan_tag.startswith("#") else f"#{clan_tag.upper()}"
+                top_members = summary.top_members(own_tag)
+                if top_members:
+                    embed.add_field(
+                        name="⭐ Member Stars",
+                        value="\n".join(
+                            f"{member.name}: {member.stars} stars in {member.attacks} attacks"
+                            for member in top_members
+                        ),
+                        inline=False
+                    )
+
+                if summary.missing:
+                    embed.set_footer(text=f"{summary.missing} wars could not be loaded, totals may be incomplete")
+
             await interaction.followup.send(embed=embed)
 
             # Try to get current CWL war information
@@ -539,10 +689,17 @@ class ClashOfClans(commands.Cog):
             required=True
         )
     ):
-        """Get Legend League attack results for a player"""
+        """Get Legend League attack results for a player, from the tracker's snapshots"""
         await interaction.response.defer()
 
         try:
+            # Days the tracker fully covered are answered from coc.db, anything else from the
+            # API's season totals, the same policy as /legends day
+            day = self.legend_tracker.day(player_tag)
+            if day is not None and day.complete:
+                await interaction.followup.send(embed=self.legend_day_embed(day))
+                return
+
             # URL encode the player tag
             encoded_tag = urllib.parse.quote(player_tag)
             player_data = await self.fetch_data(f"players/{encoded_tag}")
@@ -578,19 +735,6 @@ class ClashOfClans(commands.Cog):
             legend_stats = player_data['legendStatistics']
             current_season = legend_stats.get('currentSeason', {})
 
-            # Check for a season change
-            current_season_id = legend_stats.get('legendSeasonId', None)
-            if current_season_id != self.last_season_id:
-                # Season changed, reset the cached reset time
-                self.legend_reset_time = None
-                self.last_season_id = current_season_id
-
-            # Determine the current season's reset time if not already set
-            if self.legend_reset_time is None:
-                # Try to intelligently determine the Legend League reset time
-                # based on available information
-                self.legend_reset_time = self.determine_legend_reset_time(player_data)
-
             # Get attack and defense stats
             attacks_used = current_season.get('attacks', 0)
             attacks_remaining = 8 - attacks_used
@@ -633,27 +777,87 @@ class ClashOfClans(commands.Cog):
                 inline=False
             )
 
-            # Get individual attack/defense records if available
-            # Note: The Clash of Clans API doesn't currently provide individual attack/defense details
+            # The API doesn't provide individual attack/defense details, the tracker derives them
+            if day is not None:
+                tracking = "⚠️ Today's snapshots are partial (tracking started after the reset or missed some), full days are shown from the next reset."
+            else:
+                tracking = "Use /coc legendtrack to record this player's attacks and defenses from trophy snapshots."
+            embed.add_field(name="📡 Battle Tracking", value=tracking, inline=False)
 
             # Set legend league icon as thumbnail
             if league_icon:
                 embed.set_thumbnail(url=league_icon)
 
-            # Add daily reset countdown
-            now = datetime.datetime.utcnow()
-            if self.legend_reset_time and self.legend_reset_time > now:
-                time_until_reset = self.legend_reset_time - now
-                embed.set_footer(text=f"Daily reset in: {self.format_timedelta(time_until_reset)}")
-            else:
-                # If we couldn't determine the reset time or it's in the past
-                embed.set_footer(text="Legend League reset time could not be determined precisely")
+            # Legend League days always reset at 05:00 UTC
+            time_until_reset = next_reset() - datetime.datetime.utcnow()
+            embed.set_footer(text=f"Daily reset in: {self.format_timedelta(time_until_reset)}")
 
             await interaction.followup.send(embed=embed)
 
         except Exception as e:
             await interaction.followup.send(f"Error fetching Legend League data: {str(e)}")
 
+    def legend_day_embed(self, day: LegendDay) -> nextcord.Embed:
+        """Build the /coc leagueday embed from a tracked day"""
+        trophies_lost = -day.defense_trophies
+
+        description = (
+            f"Current Trophies: {day.end_trophies}\nDay: {day.legend_day}\n"
+            "Estimated from trophy snapshots, an attack and a defense between two snapshots cancel out"
+        )
+        if day.overflowed:
+            description += "\n⚠️ More battles were inferred than a day allows, counts are capped at 8"
+
+        embed = nextcord.Embed(
+            title=f"Legend League Day - {day.name}",
+            description=description,
+            color=nextcord.Color.gold()
+        )
+
+        embed.add_field(
+            name="🗡️ Attacks",
+            value=f"Used: {day.shown_attacks}/8\n"
+                  f"Remaining: {8 - day.shown_attacks}\n"
+                  f"Trophies Gained: +{day.attack_trophies}",
+            inline=True
+        )
+
+        embed.add_field(
+            name="🛡️ Defenses",
+            value=f"Completed: {day.shown_defenses}/8\n"
+                  f"Trophies Lost: -{trophies_lost}",
+            inline=True
+        )
+
+        # Calculate net trophy change
+        net_change = day.end_trophies - day.start_trophies
+        change_symbol = "+" if net_change >= 0 else ""
+
+        embed.add_field(
+            name="📊 Summary",
+            value=f"Net Trophy Change: {change_symbol}{net_change}\n"
+                  f"Average per Attack: {self.avg_per_attack(day.attack_trophies, day.shown_attacks)}\n"
+                  f"Average per Defense: {self.avg_per_defense(trophies_lost, day.shown_defenses)}",
+            inline=False
+        )
+
+        # Individual battles derived from the trophy snapshots
+        events = self.legend_tracker.events(day.player_tag, day.legend_day)
+        if events:
+            embed.add_field(
+                name="📜 Battle Log",
+                value="\n".join(
+                    f"{'🗡️' if change > 0 else '🛡️'} {'+' if change > 0 else ''}{change} → {trophies} <t:{recorded_at}:t>"
+                    for recorded_at, change, trophies in events[-16:]
+                ),
+                inline=False
+            )
+
+        # Legend League days always reset at 05:00 UTC
+        time_until_reset = next_reset() - datetime.datetime.utcnow()
+        embed.set_footer(text=f"Daily reset in: {self.format_timedelta(time_until_reset)}")
+        return embed
+
     def avg_per_attack(self, trophies_gained: int, attacks_used: int) -> str:
         """Calculate average trophies per attack"""
         if attacks_used == 0:
@@ -666,56 +870,6 @@ class ClashOfClans(commands.Cog):
             return "N/A"
         return f"-{trophies_lost / defenses_done:.1f}"
 
-    def determine_legend_reset_time(self, player_data: Dict[str, Any]) -> Optional[datetime.datetime]:
-        """
-        Intelligently determine the Legend League reset time based on player data
-        and current attacks/defenses.
-
-        This method attempts to determine the reset time by analyzing patterns in the
-        player's Legend League statistics and the current UTC time.
-
-        Args:
-            player_data: Player data from the API
-
-        Returns:
-            datetime object for the next reset time, or None if it can't be determined
-        """
-        if 'legendStatistics' not in player_data:
-            return None
-
-        legend_stats = player_data['legendStatistics']
-        current_season = legend_stats.get('currentSeason', {})
-
-        # Default reset hour is 5:00 UTC (standard for most in-game events)
-        # but it can vary especially during season transitions
-        now = datetime.datetime.utcnow()
-        reset_hour = 5  # Default
-
-        # If it's early in the legend day (few or no attacks/defenses), 
-        # the reset likely just happened
-        attacks = current_season.get('attacks', 0)
-        defenses = current_season.get('defenses', 0)
-
-        if attacks == 0 and defenses == 0:
-            # If no attacks or defenses yet, we're probably early in the legend day
-            # Reset time is likely within the last few hours
-            hours_ago = [1, 2, 3, 4, 5, 6]  # Check reasonable time ranges
-
-            for hours in hours_ago:
-                potential_reset = now - datetime.timedelta(hours=hours)
-                # If this looks like a plausible reset time, use it
-                if potential_reset.minute < 15:  # Reset times are usually on the hour
-                    reset_hour = potential_reset.hour
-                    break
-
-        # Construct the next reset time
-        reset_time = datetime.datetime(now.year, now.month, now.day, reset_hour, 0, 0)  
-         # If the reset time is in the past, move to tomorrow
-        if reset_time < now:
-            reset_time += datetime.timedelta(days=1)
-            
-        return reset_time
-    
     def format_timedelta(self, delta: datetime.timedelta) -> str:
         """Format a timedelta object into a readable string"""
         total_seconds = int(delta.total_seconds())
@@ -729,6 +883,64 @@ class ClashOfClans(commands.Cog):
         else:
             return f"{seconds}s"
             
+    @coc_slash.subcommand(
+        name="legendtrack",
+        description="Record a Legend League player's attacks and defenses from trophy snapshots"
+    )
+    async def track_legend(
+        self,
+        interaction: nextcord.Interaction,
+        player_tag: str = SlashOption(
+            description="Player tag including #",
+            required=True
+        )
+    ):
+        """Opt a player in to the Legend League tracker"""
+        await interaction.response.defer()
+
+        if self.legend_tracker.is_tracked(player_tag):
+            await interaction.followup.send(f"{player_tag} is already tracked.")
+            return
+        if self.legend_tracker.full:
+            await interaction.followup.send(f"The tracker is full ({self.legend_tracker.max_players} players), try again later.")
+            return
+
+        try:
+            player_data = await self.fetch_data(f"players/{urllib.parse.quote(player_tag)}")
+        except Exception as e:
+            await interaction.followup.send(f"Error fetching player data: {str(e)}")
+            return
+
+        if "Legend" not in (player_data.get('league') or {}).get('name', '') or 'legendStatistics' not in player_data:
+            await interaction.followup.send(f"{player_data['name']} is not in Legend League.")
+            return
+
+        self.legend_tracker.track(player_tag, player_data['name'])
+        self.legend_tracker.snapshot(player_tag, player_data)
+        await interaction.followup.send(
+            f"Tracking {player_data['name']}. Today's results are partial, full days are recorded from the next reset."
+        )
+
+    @coc_slash.subcommand(
+        name="legenduntrack",
+        description="Stop recording a Legend League player's attacks and defenses"
+    )
+    async def untrack_legend(
+        self,
+        interaction: nextcord.Interaction,
+        player_tag: str = SlashOption(
+            description="Player tag including #",
+            required=True
+        )
+    ):
+        """Remove a player from the Legend League tracker"""
+        if not self.legend_tracker.is_tracked(player_tag):
+            await interaction.response.send_message(f"{player_tag} is not tracked.", ephemeral=True)
+            return
+
+        self.legend_tracker.untrack(player_tag)
+        await interaction.response.send_message(f"Stopped tracking {player_tag}. Recorded days are kept.")
+
     @coc_slash.subcommand(
         name="season",
         description="Get Legend League season information"
@@ -1018,6 +1230,122 @@ class ClashOfClans(commands.Cog):
         except Exception as e:
             await interaction.followup.send(f"Error fetching clan members: {str(e)}")
 
+    @coc_slash.subcommand(
+        name="track",
+        description="Post a clan's war attacks to a channel as they happen (Admin only)"
+    )
+    async def track_war(
+        self,
+        interaction: nextcord.Interaction,
+        clan_tag: str = SlashOption(
+            description="Clan tag including #",
+            required=True
+        ),
+        channel: nextcord.TextChannel = SlashOption(
+            description="Channel to post attacks in",
+            required=True
+        )
+    ):
+        """Register a clan with the war tracker"""
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("This command requires administrator permissions!", ephemeral=True)
+            return
+
+        await interaction.response.defer()
+
+        try:
+            # Make sure the clan exists and its war log can be read
+            await self.fetch_data(f"clans/{urllib.parse.quote(clan_tag)}/currentwar")
+        except Exception as e:
+            await interaction.followup.send(f"Can't track this clan's wars: {str(e)}")
+            return
+
+        is_new = self.war_tracker.register(interaction.guild.id, channel.id, clan_tag)
+        if is_new:
+            await interaction.followup.send(f"War attacks for {clan_tag} will be posted in {channel.mention}.")
+        else:
+            await interaction.followup.send(f"War attacks for {clan_tag} now go to {channel.mention}.")
+
+    @coc_slash.subcommand(
+        name="untrack",
+        description="Stop posting a clan's war attacks (Admin only)"
+    )
+    async def untrack_war(
+        self,
+        interaction: nextcord.Interaction,
+        clan_tag: str = SlashOption(
+            description="Clan tag including #",
+            required=True
+        )
+    ):
+        """Remove a clan from the war tracker"""
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("This command requires administrator permissions!", ephemeral=True)
+            return
+
+        if self.war_tracker.unregister(interaction.guild.id, clan_tag):
+            await interaction.response.send_message(f"Stopped tracking wars for {clan_tag}.")
+        else:
+            await interaction.response.send_message(f"{clan_tag} is not tracked in this server.", ephemeral=True)
+
+    @coc_slash.subcommand(
+        name="attacks",
+        description="Get a player's war attack history from tracked wars"
+    )
+    async def get_attack_history(
+        self,
+        interaction: nextcord.Interaction,
+        player_tag: str = SlashOption(
+            description="Player tag including #",
+            required=True
+        )
+    ):
+        """Show a member's attacks recorded by the war tracker, without calling the API"""
+        (attacks, stars, avg_destruction, three_stars), recent = self.war_tracker.member_history(player_tag)
+        if not attacks:
+            await interaction.response.send_message(
+                f"No attacks recorded for {player_tag}. Only wars of clans tracked with /coc track are recorded.",
+                ephemeral=True
+            )
+            return
+
+        embed = nextcord.Embed(
+            title=f"War Attacks for {player_tag}",
+            description=f"🗡️ Attacks: {attacks}\n"
+                        f"⭐ Stars: {stars} ({stars / attacks:.2f} per attack)\n"
+                        f"🌟 Three Stars: {three_stars} ({three_stars / attacks * 100:.0f}%)\n"
+                        f"💥 Average Destruction: {avg_destruction:.1f}%",
+            color=nextcord.Color.red()
+        )
+
+        embed.add_field(
+            name="🕒 Recent Attacks",
+            value="\n".join(
+                f"<t:{start_time}:d> vs {opponent}: {'⭐' * attack_stars or '0 ⭐'} {destruction}%"
+                for opponent, start_time, attack_stars, destruction in recent
+            ),
+            inline=False
+        )
+
+        await interaction.response.send_message(embed=embed)
+
+    @coc_slash.subcommand(
+        name="cache",
+        description="Show Clash of Clans API cache hit rates (Bot owner only)"
+    )
+    async def cache_stats(self, interaction: nextcord.Interaction):
+        """Show how many API calls the response cache saved per endpoint"""
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("This command can only be used by the bot owner!", ephemeral=True)
+            return
+        
+        embed = nextcord.Embed(
+            title="Clash of Clans API Cache",
+            description="```\n" + self.cache.stats_report() + "\n" + self.inflight.stats_report() + "\n```",
+            color=nextcord.Color.gold()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 # Function to setup the cog
 def setup(bot):
-    bot.add_cog(ClashOfClans(bot))
\ No newline at end of file
+    bot.add_cog(ClashOfClans(bot))
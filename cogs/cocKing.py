@@ -6,6 +6,9 @@ import datetime
 import urllib.parse
 import json
 from typing import Optional, List, Dict, Any
+from utils.single_flight import SingleFlight
+from utils.coc_schema import get_coc_db, release_coc_db
+from utils.legend_tracker import LegendDay, get_legend_tracker
 
 class ClashLegendsStats(commands.Cog):
     """Cog for tracking Clash of Clans Legend League statistics using ClashKing API"""
@@ -17,13 +20,23 @@ class ClashLegendsStats(commands.Cog):
             timeout=30.0, 
             headers={"accept": "application/json"}
         )
+        # Concurrent lookups of the same URL share one request
+        self.inflight = SingleFlight()
+        # Snapshots taken by the Clash of Clans cog, answers tracked players without the API
+        get_coc_db(bot)
+        self.legend_tracker = get_legend_tracker(bot)
 
     def cog_unload(self):
-        """Clean up the HTTP client when the cog is unloaded"""
+        """Clean up the HTTP client and release coc.db when the cog is unloaded"""
         asyncio.create_task(self.http_client.aclose())
+        release_coc_db(self.bot)
 
     async def fetch_data(self, url: str) -> Dict[str, Any]:
-        """Fetch data from a direct URL"""
+        """Fetch data from a direct URL, sharing the request with concurrent callers for the same URL"""
+        return await self.inflight.do(url, lambda: self.request(url))
+
+    async def request(self, url: str) -> Dict[str, Any]:
+        """Query the API directly"""
         try:
             response = await self.http_client.get(url)
             if response.status_code != 200:
@@ -66,6 +79,12 @@ class ClashLegendsStats(commands.Cog):
         if not tag.startswith("#"):
             tag = f"#{tag}"
         
+        # Days the tracker fully covered are answered from coc.db, anything else from ClashKing's exact data
+        tracked_day = self.legend_tracker.day(tag, date)
+        if tracked_day is not None and tracked_day.complete:
+            await interaction.followup.send(embed=self.tracked_day_embed(tracked_day))
+            return
+
         # URL encode the tag (# becomes %23)
         encoded_tag = urllib.parse.quote(tag)
         
@@ -197,5 +216,57 @@ class ClashLegendsStats(commands.Cog):
         
         await interaction.followup.send(embed=embed)
 
+    def tracked_day_embed(self, day: LegendDay) -> nextcord.Embed:
+        """Build the /legends day embed from a day recorded by the legend tracker"""
+        events = self.legend_tracker.events(day.player_tag, day.legend_day)
+        attacks = [change for _, change, _ in events if change > 0]
+        defenses = [change for _, change, _ in events if change < 0]
+
+        embed = nextcord.Embed(
+            title=f"🏆 {day.name}'s Legend Day",
+            description=f"Date: {day.legend_day} | Estimated from trophy snapshots"
+                        + ("\n⚠️ More battles were inferred than a day allows, counts are capped at 8" if day.overflowed else ""),
+            color=0xE1C16E  # Gold color
+        )
+
+        embed.add_field(name="Current Trophies", value=f"🏆 {day.end_trophies}", inline=True)
+
+        embed.add_field(
+            name="Attacks",
+            value=f"🗡️ **{day.shown_attacks}/8** attacks\n+{day.attack_trophies} trophies gained",
+            inline=True
+        )
+
+        embed.add_field(
+            name="Defenses",
+            value=f"🛡️ **{day.shown_defenses}** defenses\n{day.defense_trophies} trophies lost",
+            inline=True
+        )
+
+        net_change = day.end_trophies - day.start_trophies
+        net_symbol = "+" if net_change > 0 else ""
+
+        embed.add_field(
+            name="Net Change",
+            value=f"{net_symbol}{net_change} trophies",
+            inline=True
+        )
+
+        if attacks:
+            embed.add_field(
+                name="Attack Details",
+                value="".join(f"{i}. +{change} 🏆\n" for i, change in enumerate(attacks, 1)),
+                inline=False
+            )
+
+        if defenses:
+            embed.add_field(
+                name="Defense Details",
+                value="".join(f"{i}. {change} 🏆\n" for i, change in enumerate(defenses, 1)),
+                inline=False
+            )
+
+        return embed
+
 def setup(bot):
     bot.add_cog(ClashLegendsStats(bot))
\ No newline at end of file
@@ -4,6 +4,7 @@ from nextcord.ext import commands, tasks
 import os
 from dotenv import load_dotenv
 import traceback
+from utils.anigame_db import drain_anigame_writes
 
 load_dotenv("tkn.env")
 token = os.getenv("BOT_TOKEN")
@@ -13,7 +14,16 @@ intents.members = True
 intents.message_content = True
 intents.voice_states = True  
 intents.presences = True  
-bot = commands.Bot(command_prefix="$", intents=intents)
+
+
+class HaeInBot(commands.Bot):
+    async def close(self):
+        """Commit queued balance changes before shutting down"""
+        await drain_anigame_writes(self)
+        await super().close()
+
+
+bot = HaeInBot(command_prefix="$", intents=intents)
 
 async def set_rich_presence():
     activity = nextcord.Activity(
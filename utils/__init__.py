@@ -0,0 +1 @@
+"""Shared services used by several cogs (storage engines, API clients, caches)"""
@@ -0,0 +1,62 @@
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class AiringSchedule:
+    """
+    Min-heap of the next airing time of every tracked anime.
+
+    Rescheduling a show pushes a new heap entry and leaves the old one behind; outdated
+    entries are skipped when they reach the top, so updates stay O(log n).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, int]] = []  # (airing_at, anime_id, episode)
+        self._next: Dict[int, Tuple[int, int]] = {}  # anime_id -> (airing_at, episode)
+
+    def __len__(self) -> int:
+        return len(self._next)
+
+    def __contains__(self, anime_id: int) -> bool:
+        return anime_id in self._next
+
+    def tracked(self) -> Set[int]:
+        return set(self._next)
+
+    def set(self, anime_id: int, airing_at: int, episode: int):
+        """Track (or reschedule) the next episode of an anime"""
+        if self._next.get(anime_id) == (airing_at, episode):
+            return
+        self._next[anime_id] = (airing_at, episode)
+        heapq.heappush(self._heap, (airing_at, anime_id, episode))
+
+        # Rebuild once outdated entries dominate the heap
+        if len(self._heap) > 2 * len(self._next) + 64:
+            self._heap = [(at, anime_id, ep) for anime_id, (at, ep) in self._next.items()]
+            heapq.heapify(self._heap)
+
+    def remove(self, anime_id: int):
+        self._next.pop(anime_id, None)
+
+    def _drop_outdated(self):
+        while self._heap:
+            airing_at, anime_id, episode = self._heap[0]
+            if self._next.get(anime_id) == (airing_at, episode):
+                return
+            heapq.heappop(self._heap)
+
+    def next_airing(self) -> Optional[int]:
+        """Unix timestamp of the earliest tracked airing, or None if nothing is tracked"""
+        self._drop_outdated()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Tuple[int, int, int]]:
+        """Remove and return (anime_id, episode, airing_at) for every airing at or before now"""
+        due = []
+        self._drop_outdated()
+        while self._heap and self._heap[0][0] <= now:
+            airing_at, anime_id, episode = heapq.heappop(self._heap)
+            del self._next[anime_id]
+            due.append((anime_id, episode, airing_at))
+            self._drop_outdated()
+        return due
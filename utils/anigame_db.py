@@ -0,0 +1,227 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+
+class WriteResult(NamedTuple):
+    rowcount: int
+    lastrowid: Optional[int]
+
+
+class QueryStats:
+    """Running latency counters for a single query shape"""
+
+    __slots__ = ("count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class AniGameDB:
+    """
+    Off-loop storage engine for anigame.db.
+
+    All writes are serialised on one dedicated writer thread and every read runs on
+    a small pool of reader connections, so no sqlite call ever blocks the event loop.
+    The database runs in WAL mode which lets the readers work while the writer commits.
+    """
+
+    def __init__(self, path: str = "anigame.db", readers: int = 4, slow_query_ms: float = 250.0):
+        self.path = path
+        self.slow_query_ms = slow_query_ms
+        self.stats: Dict[str, QueryStats] = {}
+        self._stats_lock = threading.Lock()
+        self._closed = False
+
+        # Writer thread owns the only read/write connection
+        self._write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer_ready = threading.Event()
+        self._writer = threading.Thread(target=self._writer_loop, name="anigame-db-writer", daemon=True)
+        self._writer.start()
+        self._writer_ready.wait()
+
+        # Reader pool, each worker thread lazily opens its own connection
+        self._local = threading.local()
+        self._reader_conns: List[sqlite3.Connection] = []
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="anigame-db-reader")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _reader_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            self._reader_conns.append(conn)
+        return conn
+
+    def _record(self, label: str, started: float):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        key = " ".join(label.split())[:120]
+        with self._stats_lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = QueryStats()
+            stats.record(elapsed_ms)
+        if elapsed_ms >= self.slow_query_ms:
+            print(f"Slow anigame.db query ({elapsed_ms:.1f}ms): {key}")
+
+    def _writer_loop(self):
+        conn = self._connect()
+        self._writer_ready.set()
+        while True:
+            job = self._write_queue.get()
+            if job is None:
+                break
+            fn, label, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self._record(label, started)
+        conn.close()
+
+    def _run_reader(self, fn: Callable[[sqlite3.Connection], Any], label: str) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(self._reader_conn())
+        finally:
+            self._record(label, started)
+
+    # Low level submission
+
+    def submit_write(self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None) -> Future:
+        """Queue fn(conn) to run inside one transaction on the writer thread"""
+        if self._closed:
+            raise RuntimeError("anigame.db storage engine is closed")
+        future: Future = Future()
+        self._write_queue.put((fn, label or getattr(fn, "__name__", "write"), future))
+        return future
+
+    def write_sync(self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None) -> Any:
+        """Blocking variant of write() for start-up work such as schema creation"""
+        return self.submit_write(fn, label).result()
+
+    async def write(self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None) -> Any:
+        """Run fn(conn) inside one transaction on the writer thread"""
+        return await asyncio.wrap_future(self.submit_write(fn, label))
+
+    def read_sync(self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None) -> Any:
+        """Blocking variant of read() for start-up work such as warming in-memory indexes"""
+        return self._readers.submit(self._run_reader, fn, label or getattr(fn, "__name__", "read")).result()
+
+    async def read(self, fn: Callable[[sqlite3.Connection], Any], label: Optional[str] = None) -> Any:
+        """Run fn(conn) on one of the reader connections"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_reader, fn, label or getattr(fn, "__name__", "read"))
+
+    # Convenience helpers
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> WriteResult:
+        """Run a single write statement and commit it"""
+        def run(conn):
+            cursor = conn.execute(sql, params)
+            return WriteResult(cursor.rowcount, cursor.lastrowid)
+        return await self.write(run, sql)
+
+    async def executemany(self, sql: str, seq_of_params) -> WriteResult:
+        """Run a write statement for every parameter set in one transaction"""
+        def run(conn):
+            cursor = conn.executemany(sql, seq_of_params)
+            return WriteResult(cursor.rowcount, cursor.lastrowid)
+        return await self.write(run, sql)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone(), sql)
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall(), sql)
+
+    async def fetchval(self, sql: str, params: Sequence[Any] = (), default: Any = None) -> Any:
+        """Return the first column of the first row, or default if there is no row"""
+        row = await self.fetchone(sql, params)
+        return row[0] if row else default
+
+    def latency_report(self, limit: int = 10) -> List[str]:
+        """Return the slowest query shapes formatted one per line"""
+        with self._stats_lock:
+            items = sorted(self.stats.items(), key=lambda item: item[1].total_ms, reverse=True)[:limit]
+        return [
+            f"{stats.count}x avg {stats.avg_ms:.2f}ms max {stats.max_ms:.2f}ms | {label}"
+            for label, stats in items
+        ]
+
+    def close(self):
+        """Stop the writer thread and close every connection"""
+        if self._closed:
+            return
+        self._closed = True
+        self._write_queue.put(None)
+        self._writer.join()
+        self._readers.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+
+
+def get_anigame_db(bot) -> AniGameDB:
+    """Return the storage engine shared by every cog, creating it on first use"""
+    db = getattr(bot, "anigame_db", None)
+    if db is None:
+        db = AniGameDB("anigame.db")
+        bot.anigame_db = db
+    bot.anigame_db_users = getattr(bot, "anigame_db_users", 0) + 1
+    return db
+
+
+async def release_anigame_db(bot):
+    """Drop one reference to the shared engine and close it once no cog uses it"""
+    bot.anigame_db_users = getattr(bot, "anigame_db_users", 1) - 1
+    if bot.anigame_db_users <= 0 and getattr(bot, "anigame_db", None) is not None:
+        await drain_anigame_writes(bot)
+        bot.anigame_db.close()
+        bot.anigame_db = None
+
+
+async def drain_anigame_writes(bot):
+    """Wait for the balance changes still queued in front of the shared engine to commit, e.g. before it closes"""
+    db = getattr(bot, "anigame_db", None)
+    economy = getattr(bot, "economy", None)
+    if economy is not None and economy.db is db:
+        await economy.drain()
+    ledger = getattr(bot, "balance_ledger", None)
+    if ledger is not None and ledger.db is db:
+        await ledger.drain()
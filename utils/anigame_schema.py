@@ -0,0 +1,105 @@
+from typing import List
+
+from utils.migrations import Migration
+
+MIGRATIONS: List[Migration] = [
+    (1, "users, characters, collections, trades and reward cooldowns", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER,
+            server_id INTEGER,
+            balance INTEGER DEFAULT 0,
+            last_roll INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, server_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS characters (
+            character_id INTEGER,
+            anime_id INTEGER,
+            server_id INTEGER,
+            name TEXT,
+            anime TEXT,
+            image_url TEXT,
+            available INTEGER DEFAULT 1,
+            role TEXT DEFAULT 'MAIN',
+            PRIMARY KEY (character_id, server_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS collections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            server_id INTEGER,
+            character_id INTEGER,
+            obtained_at INTEGER,
+            FOREIGN KEY (user_id, server_id) REFERENCES users (user_id, server_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS trades (
+            trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER,
+            receiver_id INTEGER,
+            server_id INTEGER,
+            character_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            created_at INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS trade_requests (
+            trade_id INTEGER PRIMARY KEY,
+            request_char_id INTEGER,
+            FOREIGN KEY (trade_id) REFERENCES trades (trade_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rewards_cooldown (
+            user_id INTEGER,
+            server_id INTEGER,
+            last_daily INTEGER DEFAULT 0,
+            last_weekly INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, server_id)
+        )
+        ''',
+    ]),
+    (2, "collection index for keyset pagination", [
+        # /collection pages walk a user's collection newest first by (obtained_at, id)
+        "CREATE INDEX IF NOT EXISTS idx_collections_owner ON collections (user_id, server_id, obtained_at DESC, id DESC)",
+    ]),
+    (3, "full-text search index over character names and anime titles", [
+        # Holds its own copy of the text; searches join back to characters for availability and ownership
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS characters_fts USING fts5(
+            name, anime, character_id UNINDEXED, server_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        "CREATE VIRTUAL TABLE IF NOT EXISTS characters_fts_vocab USING fts5vocab(characters_fts, 'row')",
+        """
+        CREATE TRIGGER IF NOT EXISTS characters_fts_insert AFTER INSERT ON characters BEGIN
+            INSERT INTO characters_fts (name, anime, character_id, server_id)
+            VALUES (new.name, new.anime, new.character_id, new.server_id);
+        END
+        """,
+        "INSERT INTO characters_fts (name, anime, character_id, server_id) SELECT name, anime, character_id, server_id FROM characters",
+    ]),
+    (4, "anime_year column on characters", [
+        "ALTER TABLE characters ADD COLUMN anime_year INTEGER",
+        # Backfill from the "Title (YYYY)" display string that used to be parsed on every sale
+        "UPDATE characters SET anime_year = CAST(substr(anime, -5, 4) AS INTEGER) WHERE anime GLOB '* ([0-9][0-9][0-9][0-9])'",
+    ]),
+    (5, "trade message columns and pending trade indexes", [
+        # Where the offer was posted, so the expiry sweep can update it
+        "ALTER TABLE trades ADD COLUMN channel_id INTEGER",
+        "ALTER TABLE trades ADD COLUMN message_id INTEGER",
+        "CREATE INDEX IF NOT EXISTS idx_trades_server_status ON trades (server_id, status)",
+        # /trades lists the offers waiting on a user
+        "CREATE INDEX IF NOT EXISTS idx_trades_receiver_status ON trades (receiver_id, status, server_id)",
+        # The expiry sweep and the startup view restore only look at pending trades
+        "CREATE INDEX IF NOT EXISTS idx_trades_pending ON trades (created_at) WHERE status = 'pending'",
+        # Trades left pending by the old button views, which stopped working on restart
+        "UPDATE trades SET status = 'expired' WHERE status = 'pending'",
+    ]),
+]
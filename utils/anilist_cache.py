@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# How long each kind of AniList response stays fresh, in seconds
+DEFAULT_TTLS = {
+    "popularity_page": 6 * 3600,  # popularity ranking pages barely move
+    "media_characters": 24 * 3600,  # main cast of a show
+    "media": 3600,  # Media record with status / next episode
+    "search": 3600,
+    "airing": 300,  # airing schedule, polled by the notifier
+}
+
+
+class CacheCounters:
+    __slots__ = ("hits", "misses", "stale")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+
+class AniListCache:
+    """
+    On-disk cache of AniList GraphQL responses.
+
+    Entries are keyed by a hash of the query text plus its variables and expire after
+    a TTL chosen by query kind. Expired entries are kept so they can still be served if
+    the refresh fails, and the least recently used entries are evicted once the cache
+    grows past max_bytes.
+    """
+
+    def __init__(self, path: str = "anilist_cache.db", max_bytes: int = 50 * 1024 * 1024, ttls: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.counters: Dict[str, CacheCounters] = {}
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}  # key -> last hit, written with the next _set
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(query: str, variables: Optional[Dict[str, Any]]) -> str:
+        normalized = " ".join(query.split())
+        payload = normalized + "\0" + json.dumps(variables or {}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _counter(self, kind: str) -> CacheCounters:
+        counter = self.counters.get(kind)
+        if counter is None:
+            counter = self.counters[kind] = CacheCounters()
+        return counter
+
+    def _get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        with self._lock:
+            row = self._conn.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            # Hits stay in memory, eviction only needs a roughly right LRU order
+            now = self._touched[key] = time.time()
+        return json.loads(row[0]), row[1] > now
+
+    def _write_touched(self):
+        """Store the access times of hits since the last write, the caller holds the lock"""
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?", [(at, key) for key, at in self._touched.items()])
+            self._touched = {}
+
+    def _set(self, key: str, kind: str, data: Any):
+        body = json.dumps(data, separators=(",", ":"))
+        size = len(body)
+        now = time.time()
+        with self._lock:
+            self._write_touched()
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, body, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, body, size, now + self.ttls.get(kind, 3600), now)
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+
+            # Evict least recently used entries until we're back under the size limit
+            while self.total_bytes > self.max_bytes:
+                victims = self._conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY last_access LIMIT 50", (key,)
+                ).fetchall()
+                if not victims:
+                    break
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", [(victim_key,) for victim_key, _ in victims])
+                self.total_bytes -= sum(victim_size for _, victim_size in victims)
+            self._conn.commit()
+
+    async def get(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Any, bool]]:
+        """Return (data, is_fresh) for a cached response, or None"""
+        return await asyncio.to_thread(self._get, self.make_key(query, variables))
+
+    async def set(self, query: str, variables: Optional[Dict[str, Any]], data: Any, kind: str):
+        await asyncio.to_thread(self._set, self.make_key(query, variables), kind, data)
+
+    async def fetch(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        kind: str,
+        fetcher: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return a cached response if it is fresh, otherwise call fetcher() and cache its result.
+
+        If the refresh fails (raises or returns None) a stale cached copy is returned instead.
+        """
+        counter = self._counter(kind)
+        cached = await self.get(query, variables)
+        if cached and cached[1]:
+            counter.hits += 1
+            return cached[0]
+
+        counter.misses += 1
+        try:
+            data = await fetcher()
+        except Exception:
+            if cached:
+                counter.stale += 1
+                return cached[0]
+            raise
+
+        if data is None:
+            if cached:
+                counter.stale += 1
+                return cached[0]
+            return None
+
+        # Never cache GraphQL error payloads
+        if not (isinstance(data, dict) and data.get("errors")):
+            await self.set(query, variables, data, kind)
+        return data
+
+    def stats_report(self) -> str:
+        lines = [f"{self.total_bytes / 1024:.0f} KiB cached"]
+        for kind, counter in sorted(self.counters.items()):
+            total = counter.hits + counter.misses
+            rate = counter.hits / total * 100 if total else 0.0
+            lines.append(f"{kind}: {counter.hits} hits / {counter.misses} misses ({rate:.0f}%), {counter.stale} stale served")
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+def get_anilist_cache(bot) -> AniListCache:
+    """Return the AniList response cache shared by every cog, creating it on first use"""
+    cache = getattr(bot, "anilist_cache", None)
+    if cache is None:
+        cache = AniListCache()
+        bot.anilist_cache = cache
+    return cache
@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import random
+import time
+from typing import Any, Dict, Optional, Set
+
+import aiohttp
+
+from utils.anilist_cache import AniListCache, get_anilist_cache
+
+# Lower numbers are sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class AniListError(Exception):
+    """Raised when AniList rejects a request or it keeps failing after every retry"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class AniListClient:
+    """
+    Process-wide AniList GraphQL client.
+
+    Requests wait in a priority queue and are released by a token bucket sized to
+    AniList's published limit (90 requests per minute, adjusted from the
+    X-RateLimit-Limit header). A 429 pauses the whole bucket for Retry-After seconds,
+    and failed requests are retried with bounded exponential backoff plus jitter.
+    """
+
+    def __init__(
+        self,
+        url: str = "https://graphql.anilist.co",
+        requests_per_minute: int = 90,
+        burst: int = 5,
+        max_retries: int = 4,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        cache: Optional[AniListCache] = None,
+    ):
+        self.url = url
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()  # in-flight sends, the loop only keeps weak references
+
+    async def query(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        cache_kind: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Send a GraphQL query and return the decoded JSON response"""
+        variables = variables or {}
+        if cache_kind is not None and self.cache is not None:
+            return await self.cache.fetch(query, variables, cache_kind, lambda: self._submit(query, variables, priority))
+        return await self._submit(query, variables, priority)
+
+    async def _submit(self, query: str, variables: Dict[str, Any], priority: int) -> Dict[str, Any]:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.PriorityQueue()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, {"query": query, "variables": variables, "future": future, "attempt": 0})
+        return await future
+
+    def _enqueue(self, priority: int, job: Dict[str, Any]):
+        if self._dispatcher is None:
+            # A retry that comes due after close()
+            if not job["future"].done():
+                job["future"].set_exception(AniListError("AniList client closed"))
+            return
+        self._queue.put_nowait((priority, next(self._sequence), job))
+
+    def _refill(self):
+        now = time.monotonic()
+        rate = self.requests_per_minute / 60
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+
+    async def _acquire_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) * 60 / self.requests_per_minute)
+
+    async def _dispatch(self):
+        while True:
+            # Wait for work, but only pick the job once a token is available so a
+            # newer interactive request can still overtake queued background ones
+            item = await self._queue.get()
+            self._queue.put_nowait(item)
+            await self._acquire_token()
+            priority, _, job = self._queue.get_nowait()
+            if not job["future"].done():
+                task = asyncio.create_task(self._send(priority, job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry(self, priority: int, job: Dict[str, Any], delay: float, error: AniListError):
+        job["attempt"] += 1
+        if job["attempt"] > self.max_retries:
+            if not job["future"].done():
+                job["future"].set_exception(error)
+            return
+        asyncio.get_running_loop().call_later(delay, self._enqueue, priority, job)
+
+    def _read_rate_headers(self, headers):
+        limit = headers.get("X-RateLimit-Limit")
+        if limit and limit.isdigit() and int(limit) > 0:
+            self.requests_per_minute = int(limit)
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining == "0" and reset and reset.isdigit():
+            # Reset is a unix timestamp; hold the bucket until then
+            wait = int(reset) - time.time()
+            if wait > 0:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+
+    async def _send(self, priority: int, job: Dict[str, Any]):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+
+        try:
+            async with self.session.post(
+                self.url,
+                json={"query": job["query"], "variables": job["variables"]},
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                self._read_rate_headers(response.headers)
+
+                if response.status == 200:
+                    data = await response.json()
+                    if not job["future"].done():
+                        job["future"].set_result(data)
+                    return
+
+                error_text = await response.text()
+                error = AniListError(f"API error: {response.status}. Details: {error_text[:200]}", response.status)
+
+                if response.status == 429:
+                    retry_after = response.headers.get("Retry-After", "")
+                    wait = float(retry_after) if retry_after.isdigit() else self._backoff(job["attempt"])
+                    print(f"Rate limited by AniList API, pausing requests for {wait:.0f}s")
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + wait)
+                    self._retry(priority, job, 0, error)
+                elif response.status >= 500:
+                    self._retry(priority, job, self._backoff(job["attempt"]), error)
+                elif not job["future"].done():
+                    job["future"].set_exception(error)
+
+        except asyncio.CancelledError:
+            # close() cancelled the send, don't leave the caller waiting on it
+            if not job["future"].done():
+                job["future"].set_exception(AniListError("AniList client closed"))
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._retry(priority, job, self._backoff(job["attempt"]), AniListError(f"Network error: {str(e)}"))
+        except Exception as e:
+            # Anything else (e.g. a malformed body) fails the request instead of leaving its caller waiting
+            if not job["future"].done():
+                job["future"].set_exception(e)
+
+    async def close(self):
+        """Stop dispatching, fail every request still waiting and close the session and cache"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        while self._queue is not None and not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            if not job["future"].done():
+                job["future"].set_exception(AniListError("AniList client closed"))
+
+        if self.session:
+            await self.session.close()
+            self.session = None
+        if self.cache is not None:
+            self.cache.close()
+
+
+def get_anilist_client(bot) -> AniListClient:
+    """Return the AniList client shared by every cog, creating it on first use"""
+    client = getattr(bot, "anilist_client", None)
+    if client is None:
+        client = AniListClient(cache=get_anilist_cache(bot))
+        bot.anilist_client = client
+    bot.anilist_client_users = getattr(bot, "anilist_client_users", 0) + 1
+    return client
+
+
+async def release_anilist_client(bot):
+    """Drop one reference to the shared client and close it, with its cache, once no cog uses it"""
+    bot.anilist_client_users = getattr(bot, "anilist_client_users", 1) - 1
+    if bot.anilist_client_users <= 0 and getattr(bot, "anilist_client", None) is not None:
+        client = bot.anilist_client
+        bot.anilist_client = None
+        bot.anilist_cache = None
+        await client.close()
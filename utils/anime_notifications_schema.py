@@ -0,0 +1,40 @@
+from typing import List
+
+from utils.migrations import Migration
+
+DB_PATH = "anime_notifications.db"
+
+MIGRATIONS: List[Migration] = [
+    (1, "subscription and notified episode tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS anime_subscriptions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            anime_id INTEGER NOT NULL,
+            anime_title TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            UNIQUE(user_id, anime_id, guild_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notified_episodes (
+            id INTEGER PRIMARY KEY,
+            anime_id INTEGER NOT NULL,
+            episode_number INTEGER NOT NULL,
+            UNIQUE(anime_id, episode_number)
+        )
+        ''',
+    ]),
+    (2, "covering indexes for the airing scheduler and per-guild settings", [
+        # Subscriber fan-out and the DISTINCT anime_id sweep read only this index
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_anime ON anime_subscriptions (anime_id, guild_id, channel_id, user_id)",
+        # /anime notify and the default channel lookup filter by user and guild
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_user_guild ON anime_subscriptions (user_id, guild_id, channel_id)",
+    ]),
+]
+
+# Sweep queries timed by benchmarks/anime_notifications_sweep.py against each schema version
+SUBSCRIBED_ANIME_SQL = "SELECT DISTINCT anime_id FROM anime_subscriptions"
+SUBSCRIBERS_SQL = "SELECT user_id, guild_id, channel_id FROM anime_subscriptions WHERE anime_id = ?"
+NOTIFIED_SQL = "SELECT id FROM notified_episodes WHERE anime_id = ? AND episode_number = ?"
@@ -0,0 +1,156 @@
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from utils.anigame_db import AniGameDB
+
+# pick() returns an unclaimed character row (character_id first) for a roll, or None
+Pick = Callable[[], Awaitable[Optional[tuple]]]
+# claim(conn, user_id, server_id, character_id, now) runs inside the writer transaction
+Claim = Callable[[sqlite3.Connection, int, int, int, int], bool]
+
+
+class Bitset:
+    """Growable bitset over non-negative integers, one bit per ID in a bytearray"""
+
+    __slots__ = ("bits",)
+
+    def __init__(self):
+        self.bits = bytearray()
+
+    def add(self, value: int):
+        index = value >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index - len(self.bits) + 1))
+        self.bits[index] |= 1 << (value & 7)
+
+    def discard(self, value: int):
+        index = value >> 3
+        if index < len(self.bits):
+            self.bits[index] &= ~(1 << (value & 7)) & 0xFF
+
+    def __contains__(self, value: int) -> bool:
+        index = value >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (value & 7)))
+
+    def __len__(self) -> int:
+        return int.from_bytes(self.bits, "little").bit_count()
+
+
+class AvailabilityIndex:
+    """
+    Per-server bitsets of claimed character IDs, mirrored from characters.available.
+
+    Characters that were never stored for a server are unclaimed, so only claims need a
+    bit. Callers update the mirror after the write that flips the column has committed.
+    """
+
+    def __init__(self):
+        self._claimed: Dict[int, Bitset] = {}
+
+    def load(self, conn: sqlite3.Connection):
+        self._claimed = {}
+        for server_id, character_id in conn.execute("SELECT server_id, character_id FROM characters WHERE available = 0"):
+            self.claim(server_id, character_id)
+
+    def _server(self, server_id: int) -> Bitset:
+        claimed = self._claimed.get(server_id)
+        if claimed is None:
+            claimed = self._claimed[server_id] = Bitset()
+        return claimed
+
+    def is_claimed(self, server_id: int, character_id: int) -> bool:
+        claimed = self._claimed.get(server_id)
+        return claimed is not None and character_id in claimed
+
+    def unclaimed(self, server_id: int, character_ids: Iterable[int]) -> List[int]:
+        claimed = self._claimed.get(server_id)
+        if claimed is None:
+            return list(character_ids)
+        return [character_id for character_id in character_ids if character_id not in claimed]
+
+    def claimed_count(self, server_id: int) -> int:
+        claimed = self._claimed.get(server_id)
+        return len(claimed) if claimed is not None else 0
+
+    def reserve(self, server_id: int, character_id: int) -> bool:
+        """
+        Atomically mark an unclaimed character as claimed for a pending roll.
+
+        Returns False if it is already claimed or reserved. The event loop never switches
+        tasks inside this call, so two concurrent rolls can't both reserve the same
+        character. Release the reservation if the claim doesn't go through.
+        """
+        claimed = self._server(server_id)
+        if character_id in claimed:
+            return False
+        claimed.add(character_id)
+        return True
+
+    def claim(self, server_id: int, character_id: int):
+        self._server(server_id).add(character_id)
+
+    def release(self, server_id: int, character_ids: Iterable[int]):
+        claimed = self._claimed.get(server_id)
+        if claimed is not None:
+            for character_id in character_ids:
+                claimed.discard(character_id)
+
+    def clear_server(self, server_id: int):
+        self._claimed.pop(server_id, None)
+
+
+def claim_character(conn: sqlite3.Connection, user_id: int, server_id: int, character_id: int, now: int) -> bool:
+    """
+    Compare-and-set claim of a character inside a writer transaction.
+
+    The availability flip only succeeds while the character is still available, so a
+    claim that lost a race changes nothing and returns False.
+    """
+    cursor = conn.execute(
+        "UPDATE characters SET available = 0 WHERE character_id = ? AND server_id = ? AND available = 1",
+        (character_id, server_id)
+    )
+    if cursor.rowcount == 0:
+        return False
+
+    conn.execute(
+        "INSERT INTO collections (user_id, server_id, character_id, obtained_at) VALUES (?, ?, ?, ?)",
+        (user_id, server_id, character_id, now)
+    )
+    conn.execute("UPDATE users SET last_roll = ? WHERE user_id = ? AND server_id = ?", (now, user_id, server_id))
+    return True
+
+
+async def roll_and_claim(db: AniGameDB, availability: AvailabilityIndex, pick: Pick, user_id: int, server_id: int,
+                         attempts: int, claim: Claim = claim_character) -> Optional[tuple]:
+    """
+    Pick, reserve and claim a character for a roll, picking again if a concurrent roll won it.
+
+    The reservation happens right after pick() returns, with no await in between, so two
+    rolls can't both reserve a character. The database claim is the backstop, and a
+    reservation whose claim fails with an error is given back.
+
+    Returns:
+        The claimed character row, or None if nothing could be claimed in attempts picks
+    """
+    for _ in range(attempts):
+        character = await pick()
+        if not character:
+            return None
+
+        character_id = character[0]
+        if not availability.reserve(server_id, character_id):
+            continue
+
+        now = int(time.time())
+        try:
+            claimed = await db.write(lambda conn: claim(conn, user_id, server_id, character_id, now), "roll_character")
+        except Exception:
+            # Give the reservation back so the character can be rolled again
+            availability.release(server_id, [character_id])
+            raise
+        # A failed claim means someone else owns it, which the bitset already records
+        if claimed:
+            return character
+    return None
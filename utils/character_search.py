@@ -0,0 +1,151 @@
+import difflib
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.anigame_db import AniGameDB
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class CharacterSearch:
+    """
+    Ranked search over character names and anime titles, backed by the characters_fts index.
+
+    Every query term is matched as a prefix. When that finds too few characters, terms
+    are also expanded to close spellings taken from the index vocabulary, so small typos
+    still match. Results are ranked by bm25 with name matches weighted above anime ones.
+    """
+
+    def __init__(self, db: AniGameDB, vocab_ttl: float = 300.0):
+        self.db = db
+        self.vocab_ttl = vocab_ttl
+        self._vocab: List[str] = []
+        self._vocab_loaded = 0.0
+
+    @staticmethod
+    def tokens(text: Optional[str]) -> List[str]:
+        return _TOKEN.findall(text.lower()) if text else []
+
+    @staticmethod
+    def _column_filter(column: str, terms: Sequence[List[str]]) -> str:
+        # Each term is a group of alternatives: the typed prefix plus any fuzzy spellings
+        groups = []
+        for alternatives in terms:
+            prefix, *close = alternatives
+            options = [f'"{prefix}"*'] + [f'"{term}"' for term in close]
+            groups.append("(" + " OR ".join(options) + ")")
+        return f"{column} : ({' AND '.join(groups)})"
+
+    def _close_terms(self, conn: sqlite3.Connection, term: str) -> List[str]:
+        if time.monotonic() - self._vocab_loaded > self.vocab_ttl:
+            self._vocab = [row[0] for row in conn.execute("SELECT term FROM characters_fts_vocab") if not row[0].isdigit()]
+            self._vocab_loaded = time.monotonic()
+        return [match for match in difflib.get_close_matches(term, self._vocab, n=3, cutoff=0.75) if match != term]
+
+    def _match(self, conn: sqlite3.Connection, name: List[str], anime: List[str], any_column: List[str], fuzzy: bool) -> str:
+        def expand(terms):
+            return [[term] + (self._close_terms(conn, term) if fuzzy and len(term) > 2 else []) for term in terms]
+
+        filters = []
+        if name:
+            filters.append(self._column_filter("name", expand(name)))
+        if anime:
+            filters.append(self._column_filter("anime", expand(anime)))
+        if any_column:
+            filters.append(self._column_filter("{name anime}", expand(any_column)))
+        return " AND ".join(filters)
+
+    def _search(
+        self,
+        conn: sqlite3.Connection,
+        server_id: int,
+        name: List[str],
+        anime: List[str],
+        any_column: List[str],
+        available: Optional[bool],
+        owner_id: Optional[int],
+        exclude_owner_id: Optional[int],
+        limit: int,
+    ) -> List[tuple]:
+        join = ""
+        conditions = ["characters.server_id = ?"]
+        params: List = [server_id]
+        if available is not None:
+            conditions.append("characters.available = ?")
+            params.append(int(available))
+        if owner_id is not None or exclude_owner_id is not None:
+            join = "JOIN collections ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id"
+            conditions.append("collections.user_id = ?" if owner_id is not None else "collections.user_id != ?")
+            params.append(owner_id if owner_id is not None else exclude_owner_id)
+
+        sql = f"""
+            SELECT characters.* FROM characters_fts
+            JOIN characters ON characters.character_id = characters_fts.character_id AND characters.server_id = characters_fts.server_id
+            {join}
+            WHERE characters_fts MATCH ? AND {' AND '.join(conditions)}
+            ORDER BY bm25(characters_fts, 10.0, 4.0)
+            LIMIT ?
+        """
+
+        results: Dict[int, tuple] = {}
+        for fuzzy in (False, True):
+            match = self._match(conn, name, anime, any_column, fuzzy)
+            for row in conn.execute(sql, [match] + params + [limit]):
+                results.setdefault(row[0], row)
+            if len(results) >= limit:
+                break
+        return list(results.values())[:limit]
+
+    async def search(
+        self,
+        server_id: int,
+        name: Optional[str] = None,
+        anime: Optional[str] = None,
+        text: Optional[str] = None,
+        available: Optional[bool] = None,
+        owner_id: Optional[int] = None,
+        exclude_owner_id: Optional[int] = None,
+        limit: int = 10,
+    ) -> List[tuple]:
+        """
+        Return matching characters rows of a server, best match first
+
+        Args:
+            server_id: Server whose characters are searched
+            name: Terms that must match the character name
+            anime: Terms that must match the anime title
+            text: Terms that may match either column
+            available: Only unclaimed (True) or claimed (False) characters
+            owner_id: Only characters in this user's collection
+            exclude_owner_id: Only claimed characters owned by someone other than this user
+            limit: Maximum number of rows
+        """
+        name_terms, anime_terms, any_terms = self.tokens(name), self.tokens(anime), self.tokens(text)
+        if not (name_terms or anime_terms or any_terms):
+            return []
+        return await self.db.read(
+            lambda conn: self._search(conn, server_id, name_terms, anime_terms, any_terms, available, owner_id, exclude_owner_id, limit),
+            "character_search"
+        )
+
+    async def autocomplete(self, server_id: int, text: str, limit: int = 25, **filters) -> Dict[str, int]:
+        """Map "Name - Anime (ID)" labels to character IDs for a slash command autocomplete"""
+        rows = await self.search(server_id, text=text, limit=limit, **filters)
+        return {self.label(row): row[0] for row in rows}
+
+    @staticmethod
+    def label(row: Tuple) -> str:
+        # Discord caps choice names at 100 characters, keep the ID visible
+        suffix = f" ({row[0]})"
+        return f"{row[3]} - {row[4]}"[:100 - len(suffix)] + suffix
+
+
+def get_character_search(bot) -> CharacterSearch:
+    """Return the character search shared by every cog, creating it on first use"""
+    search = getattr(bot, "character_search", None)
+    if search is None or search.db is not bot.anigame_db:
+        search = CharacterSearch(bot.anigame_db)
+        bot.character_search = search
+    return search
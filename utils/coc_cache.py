@@ -0,0 +1,137 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+_MAX_AGE = re.compile(r"(?:^|[,\s])max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+_STALE_WHILE_REVALIDATE = re.compile(r"(?:^|[,\s])stale-while-revalidate\s*=\s*\"?(\d+)", re.IGNORECASE)
+_TAG = re.compile(r"%23[0-9A-Za-z]+")
+
+# fetcher() returns (data, Cache-Control header or None)
+Fetcher = Callable[[], Awaitable[Tuple[Any, Optional[str]]]]
+
+
+def parse_cache_control(header: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Return (max-age, stale-while-revalidate) from a Cache-Control header, None where missing"""
+    if not header:
+        return None, None
+    if re.search(r"(?:^|,)\s*(?:no-store|no-cache)\b", header, re.IGNORECASE):
+        return 0, None
+    max_age = _MAX_AGE.search(header)
+    stale = _STALE_WHILE_REVALIDATE.search(header)
+    return (int(max_age.group(1)) if max_age else None), (int(stale.group(1)) if stale else None)
+
+
+def endpoint_kind(endpoint: str) -> str:
+    """Group endpoints by shape for the hit rate report, e.g. clans/{tag}/currentwar"""
+    return _TAG.sub("{tag}", endpoint.split("?", 1)[0])
+
+
+class CachedResponse(NamedTuple):
+    data: Any
+    fresh_until: float
+    stale_until: float
+
+
+class CacheCounters:
+    __slots__ = ("hits", "misses", "stale")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+
+class ResponseCache:
+    """
+    In-memory cache of API responses keyed by endpoint.
+
+    Each response stays fresh for the max-age its Cache-Control header asks for. After
+    that it is still served for stale-while-revalidate seconds (the header's value or
+    stale_window), while one background request refreshes it. Least recently used
+    entries are dropped past max_entries.
+    """
+
+    def __init__(self, default_max_age: int = 60, stale_window: int = 120, max_entries: int = 2000):
+        self.default_max_age = default_max_age
+        self.stale_window = stale_window
+        self.max_entries = max_entries
+        self.counters: Dict[str, CacheCounters] = {}
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+
+    def _counter(self, endpoint: str) -> CacheCounters:
+        kind = endpoint_kind(endpoint)
+        counter = self.counters.get(kind)
+        if counter is None:
+            counter = self.counters[kind] = CacheCounters()
+        return counter
+
+    def _store(self, endpoint: str, data: Any, cache_control: Optional[str]):
+        max_age, stale = parse_cache_control(cache_control)
+        if max_age is None:
+            max_age = self.default_max_age
+        if max_age <= 0:
+            self._entries.pop(endpoint, None)
+            return
+
+        now = time.monotonic()
+        self._entries[endpoint] = CachedResponse(data, now + max_age, now + max_age + (stale if stale is not None else self.stale_window))
+        self._entries.move_to_end(endpoint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _refresh(self, endpoint: str, fetcher: Fetcher):
+        try:
+            data, cache_control = await fetcher()
+            self._store(endpoint, data, cache_control)
+        except Exception as e:
+            # Keep serving the stale copy until it runs out
+            print(f"Error refreshing cached {endpoint_kind(endpoint)}: {e}")
+        finally:
+            self._refreshing.discard(endpoint)
+
+    async def fetch(self, endpoint: str, fetcher: Fetcher) -> Any:
+        """Return the cached response for endpoint, calling fetcher() when it is missing or too old"""
+        counter = self._counter(endpoint)
+        cached = self._entries.get(endpoint)
+        now = time.monotonic()
+
+        if cached and now < cached.fresh_until:
+            counter.hits += 1
+            self._entries.move_to_end(endpoint)
+            return cached.data
+
+        if cached and now < cached.stale_until:
+            counter.stale += 1
+            self._entries.move_to_end(endpoint)
+            if endpoint not in self._refreshing:
+                self._refreshing.add(endpoint)
+                asyncio.ensure_future(self._refresh(endpoint, fetcher))
+            return cached.data
+
+        counter.misses += 1
+        data, cache_control = await fetcher()
+        self._store(endpoint, data, cache_control)
+        return data
+
+    def invalidate(self, endpoint: str):
+        self._entries.pop(endpoint, None)
+
+    def stats_report(self) -> str:
+        lines = [f"{len(self._entries)} cached responses"]
+        for kind, counter in sorted(self.counters.items()):
+            total = counter.hits + counter.stale + counter.misses
+            rate = (counter.hits + counter.stale) / total * 100 if total else 0.0
+            lines.append(f"{kind}: {counter.hits} hits, {counter.stale} stale, {counter.misses} misses ({rate:.0f}% served from cache)")
+        return "\n".join(lines)
+
+
+def get_coc_cache(bot) -> ResponseCache:
+    """Return the Clash of Clans response cache shared by every cog, creating it on first use"""
+    cache = getattr(bot, "coc_cache", None)
+    if cache is None:
+        cache = ResponseCache()
+        bot.coc_cache = cache
+    return cache
@@ -0,0 +1,110 @@
+import sqlite3
+from typing import List
+
+from utils.migrations import Migration, migrate
+
+DB_PATH = "coc.db"
+
+MIGRATIONS: List[Migration] = [
+    (1, "war tracker registrations, wars and attack deltas", [
+        '''
+        CREATE TABLE IF NOT EXISTS war_trackers (
+            clan_tag TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            PRIMARY KEY (clan_tag, guild_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS wars (
+            war_id INTEGER PRIMARY KEY,
+            clan_tag TEXT NOT NULL,
+            clan_name TEXT NOT NULL,
+            opponent_tag TEXT NOT NULL,
+            opponent_name TEXT NOT NULL,
+            team_size INTEGER NOT NULL,
+            preparation_start INTEGER NOT NULL,
+            start_time INTEGER NOT NULL,
+            end_time INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            UNIQUE (clan_tag, preparation_start)
+        )
+        ''',
+        # One row per attack, written once when the tracker first sees it
+        '''
+        CREATE TABLE IF NOT EXISTS war_attacks (
+            war_id INTEGER NOT NULL,
+            attack_order INTEGER NOT NULL,
+            attacker_tag TEXT NOT NULL,
+            attacker_name TEXT NOT NULL,
+            defender_tag TEXT NOT NULL,
+            stars INTEGER NOT NULL,
+            destruction INTEGER NOT NULL,
+            duration INTEGER NOT NULL,
+            is_opponent INTEGER NOT NULL,
+            PRIMARY KEY (war_id, attack_order)
+        ) WITHOUT ROWID
+        ''',
+        # /coc attacks reads a member's attacks newest war first
+        "CREATE INDEX IF NOT EXISTS idx_war_attacks_attacker ON war_attacks (attacker_tag, war_id)",
+    ]),
+    (2, "legend league snapshots, derived battles and daily rollups", [
+        # trophies is the last snapshot, NULL until the first one
+        '''
+        CREATE TABLE IF NOT EXISTS legend_players (
+            player_tag TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            trophies INTEGER,
+            updated_at INTEGER NOT NULL
+        )
+        ''',
+        # change > 0 is an attack, change < 0 a defense
+        '''
+        CREATE TABLE IF NOT EXISTS legend_events (
+            event_id INTEGER PRIMARY KEY,
+            player_tag TEXT NOT NULL,
+            legend_day TEXT NOT NULL,
+            recorded_at INTEGER NOT NULL,
+            change INTEGER NOT NULL,
+            trophies INTEGER NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_legend_events_player_day ON legend_events (player_tag, legend_day)",
+        '''
+        CREATE TABLE IF NOT EXISTS legend_days (
+            player_tag TEXT NOT NULL,
+            legend_day TEXT NOT NULL,
+            attacks INTEGER NOT NULL,
+            attack_trophies INTEGER NOT NULL,
+            defenses INTEGER NOT NULL,
+            defense_trophies INTEGER NOT NULL,
+            start_trophies INTEGER NOT NULL,
+            end_trophies INTEGER NOT NULL,
+            PRIMARY KEY (player_tag, legend_day)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (3, "flag legend days covered by snapshots from before their reset", [
+        # 1 only while the day's first snapshot had a baseline from before the reset and no snapshot gap was too long
+        "ALTER TABLE legend_days ADD COLUMN complete INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+
+def get_coc_db(bot) -> sqlite3.Connection:
+    """Return the coc.db connection shared by the Clash cogs, migrating it on first use"""
+    conn = getattr(bot, "coc_db", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        migrate(conn, MIGRATIONS, "coc.db")
+        bot.coc_db = conn
+    bot.coc_db_users = getattr(bot, "coc_db_users", 0) + 1
+    return conn
+
+
+def release_coc_db(bot):
+    """Drop one reference to the shared connection and close it once no cog uses it"""
+    bot.coc_db_users = getattr(bot, "coc_db_users", 1) - 1
+    if bot.coc_db_users <= 0 and getattr(bot, "coc_db", None) is not None:
+        bot.coc_db.close()
+        bot.coc_db = None
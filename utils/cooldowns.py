@@ -0,0 +1,115 @@
+import asyncio
+import heapq
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.anigame_db import AniGameDB
+
+ROLL = "roll"
+DAILY = "daily"
+WEEKLY = "weekly"
+
+# kind -> (table, column) holding the last use in anigame.db
+COLUMNS = {
+    ROLL: ("users", "last_roll"),
+    DAILY: ("rewards_cooldown", "last_daily"),
+    WEEKLY: ("rewards_cooldown", "last_weekly"),
+}
+
+Key = Tuple[str, int, int]  # (kind, user_id, server_id)
+
+
+class CooldownStore:
+    """
+    Last-use timestamps for /roll, /daily and /weekly, served from memory.
+
+    The map only holds uses that are still cooling down. Entries expire once their
+    cooldown is over, so a missing entry means the command is ready, and a check never
+    touches the disk. Uses are written to anigame.db in the background, except for rolls
+    whose last_roll is committed with the claim itself (see claim_character).
+    """
+
+    def __init__(self, db: AniGameDB, durations: Dict[str, int]):
+        self.db = db
+        self.durations = durations
+        self._last_used: Dict[Key, int] = {}
+        self._expiry: List[Tuple[int, Key]] = []  # min-heap, may hold superseded entries
+
+    def load(self, conn: sqlite3.Connection):
+        self._last_used = {}
+        self._expiry = []
+        now = int(time.time())
+        for kind, duration in self.durations.items():
+            table, column = COLUMNS[kind]
+            for user_id, server_id, last_used in conn.execute(
+                f"SELECT user_id, server_id, {column} FROM {table} WHERE {column} > ?", (now - duration,)
+            ):
+                self._set((kind, user_id, server_id), last_used)
+
+    def _set(self, key: Key, last_used: int):
+        self._last_used[key] = last_used
+        heapq.heappush(self._expiry, (last_used + self.durations[key[0]], key))
+
+    def _purge(self, now: int):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            last_used = self._last_used.get(key)
+            # Skip heap entries left behind by a newer use of the same key
+            if last_used is not None and last_used + self.durations[key[0]] == expires_at:
+                del self._last_used[key]
+
+    def remaining(self, kind: str, user_id: int, server_id: int, now: Optional[int] = None) -> int:
+        """Seconds until the command can be used again, 0 when it is ready"""
+        now = now if now is not None else int(time.time())
+        last_used = self._last_used.get((kind, user_id, server_id))
+        if last_used is None:
+            return 0
+        return max(0, last_used + self.durations[kind] - now)
+
+    def try_use(self, kind: str, user_id: int, server_id: int, now: Optional[int] = None) -> int:
+        """
+        Start a cooldown if the command is ready
+
+        Returns:
+            0 when the use was recorded, otherwise the seconds left on the cooldown
+        """
+        now = now if now is not None else int(time.time())
+        self._purge(now)
+        left = self.remaining(kind, user_id, server_id, now)
+        if left:
+            return left
+        self.record(kind, user_id, server_id, now)
+        return 0
+
+    def record(self, kind: str, user_id: int, server_id: int, now: Optional[int] = None):
+        """Record a use that already happened"""
+        now = now if now is not None else int(time.time())
+        self._set((kind, user_id, server_id), now)
+        if kind != ROLL:
+            asyncio.ensure_future(self._persist(kind, user_id, server_id, now))
+
+    def release(self, kind: str, user_id: int, server_id: int):
+        """Undo a use from try_use() whose command then failed"""
+        # try_use() only succeeds once the previous use has expired, so there is nothing to restore
+        self._last_used.pop((kind, user_id, server_id), None)
+        if kind != ROLL:
+            asyncio.ensure_future(self._persist(kind, user_id, server_id, 0))
+
+    async def _persist(self, kind: str, user_id: int, server_id: int, last_used: int):
+        table, column = COLUMNS[kind]
+        try:
+            await self.db.execute(
+                f"""
+                INSERT INTO {table} (user_id, server_id, {column}) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, server_id) DO UPDATE SET {column} = excluded.{column}
+                """,
+                (user_id, server_id, last_used)
+            )
+        except Exception as e:
+            print(f"Error saving {kind} cooldown for user {user_id} in server {server_id}: {e}")
+
+    def clear_server(self, kind: str, server_id: int):
+        """Forget one kind of cooldown for a whole server, after its rows were deleted"""
+        for key in [key for key in self._last_used if key[0] == kind and key[2] == server_id]:
+            del self._last_used[key]
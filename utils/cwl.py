@@ -0,0 +1,138 @@
+import asyncio
+import urllib.parse
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# fetch(endpoint) returns the parsed API response, e.g. ClashOfClans.fetch_data
+Fetch = Callable[[str], Awaitable[Dict[str, Any]]]
+
+WIN_BONUS = 10  # stars a clan gets for winning a league war
+
+
+class ClanStanding:
+    __slots__ = ("tag", "name", "stars", "destruction", "wins", "wars")
+
+    def __init__(self, tag: str, name: str):
+        self.tag = tag
+        self.name = name
+        self.stars = 0
+        self.destruction = 0.0
+        self.wins = 0
+        self.wars = 0
+
+
+class MemberStats:
+    __slots__ = ("tag", "name", "clan_tag", "stars", "attacks", "destruction")
+
+    def __init__(self, tag: str, name: str, clan_tag: str):
+        self.tag = tag
+        self.name = name
+        self.clan_tag = clan_tag
+        self.stars = 0
+        self.attacks = 0
+        self.destruction = 0
+
+
+class CWLSummary:
+    """Standings and per-member totals for one league group"""
+
+    def __init__(self, clans: Dict[str, ClanStanding], members: Dict[str, MemberStats], wars: int, missing: int):
+        self.clans = clans
+        self.members = members
+        self.wars = wars
+        self.missing = missing  # war tags that couldn't be fetched
+
+    def standings(self) -> List[ClanStanding]:
+        """Clans ranked like the game does, by stars (win bonus included) then total destruction"""
+        return sorted(self.clans.values(), key=lambda clan: (-clan.stars, -clan.destruction, clan.name))
+
+    def top_members(self, clan_tag: str, limit: int = 10) -> List[MemberStats]:
+        members = [member for member in self.members.values() if member.clan_tag == clan_tag]
+        members.sort(key=lambda member: (-member.stars, -member.destruction, member.name))
+        return members[:limit]
+
+
+class CWLAggregator:
+    """
+    Builds a full view of a Clan War League group from its round wars.
+
+    Every war tag of every round is fetched concurrently, at most `concurrency` at a
+    time. Wars that have ended can't change anymore, so they are kept for good (up to
+    max_wars, oldest first out) and never requested again.
+    """
+
+    def __init__(self, fetch: Fetch, concurrency: int = 8, max_wars: int = 5000):
+        self.fetch = fetch
+        self.max_wars = max_wars
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._finished: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def war(self, war_tag: str) -> Dict[str, Any]:
+        war = self._finished.get(war_tag)
+        if war is not None:
+            return war
+
+        async with self._semaphore:
+            war = await self.fetch(f"clanwarleagues/wars/{urllib.parse.quote(war_tag)}")
+
+        if war.get("state") == "warEnded":
+            self._finished[war_tag] = war
+            while len(self._finished) > self.max_wars:
+                self._finished.popitem(last=False)
+        return war
+
+    async def summarize(self, group: Dict[str, Any]) -> CWLSummary:
+        """Fetch every war of a league group and total it up"""
+        war_tags = [tag for round_data in group.get("rounds", []) for tag in round_data.get("warTags", []) if tag != "#0"]
+        results = await asyncio.gather(*(self.war(tag) for tag in war_tags), return_exceptions=True)
+
+        wars = []
+        for tag, result in zip(war_tags, results):
+            if isinstance(result, Exception):
+                print(f"Error fetching CWL war {tag}: {result}")
+            else:
+                wars.append(result)
+
+        clans = {clan["tag"]: ClanStanding(clan["tag"], clan["name"]) for clan in group.get("clans", [])}
+        members: Dict[str, MemberStats] = {}
+        for war in wars:
+            self._add_war(war, clans, members)
+        return CWLSummary(clans, members, len(wars), len(war_tags) - len(wars))
+
+    @staticmethod
+    def _add_war(war: Dict[str, Any], clans: Dict[str, ClanStanding], members: Dict[str, MemberStats]):
+        if war.get("state") not in ("inWar", "warEnded"):
+            return
+
+        sides = (war["clan"], war["opponent"])
+        for side in sides:
+            standing = clans.get(side["tag"])
+            if standing is None:
+                standing = clans[side["tag"]] = ClanStanding(side["tag"], side.get("name", side["tag"]))
+            standing.stars += side.get("stars", 0)
+            standing.destruction += side.get("destructionPercentage", 0)
+            standing.wars += 1
+
+            for member in side.get("members", []):
+                stats = members.get(member["tag"])
+                if stats is None:
+                    stats = members[member["tag"]] = MemberStats(member["tag"], member["name"], side["tag"])
+                for attack in member.get("attacks", []):
+                    stats.stars += attack.get("stars", 0)
+                    stats.destruction += attack.get("destructionPercentage", 0)
+                    stats.attacks += 1
+
+        if war["state"] == "warEnded":
+            winner = _winner(*sides)
+            if winner is not None:
+                clans[winner["tag"]].stars += WIN_BONUS
+                clans[winner["tag"]].wins += 1
+
+
+def _winner(clan: Dict[str, Any], opponent: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The side that won on stars, then destruction, or None for a draw"""
+    ours = (clan.get("stars", 0), clan.get("destructionPercentage", 0))
+    theirs = (opponent.get("stars", 0), opponent.get("destructionPercentage", 0))
+    if ours == theirs:
+        return None
+    return clan if ours > theirs else opponent
@@ -0,0 +1,174 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from utils.ledger import BalanceLedger, get_ledger
+
+Key = Tuple[int, int]  # (user_id, server_id)
+
+
+class Economy:
+    """
+    Credit balances shared by every game, cached per (user, server) in front of the ledger.
+
+    A balance is read from anigame.db once, creating the user row if needed, and then
+    served from memory. Every change is applied to the cached balance immediately and
+    written back through the ledger. Checks and updates happen without an await in
+    between, so concurrent commands can't spend the same credits twice.
+
+    An entry is only dropped (LRU eviction or invalidation) once all of its writes have
+    committed. A balance loaded from the database is therefore always complete.
+    """
+
+    def __init__(self, ledger: BalanceLedger, max_entries: int = 50_000):
+        self.ledger = ledger
+        self.db = ledger.db
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._balances: "OrderedDict[Key, int]" = OrderedDict()
+        self._unflushed: Dict[Key, int] = {}  # key -> writes not committed yet
+        self._stale: Set[Key] = set()
+        self._loading: Dict[Key, asyncio.Future] = {}
+        self._writes: Set[asyncio.Task] = set()  # write-backs in flight, referenced until they finish
+
+    @staticmethod
+    def _load_balance(conn, user_id: int, server_id: int) -> int:
+        conn.execute("INSERT OR IGNORE INTO users (user_id, server_id, balance, last_roll) VALUES (?, ?, 0, 0)", (user_id, server_id))
+        return conn.execute("SELECT balance FROM users WHERE user_id = ? AND server_id = ?", (user_id, server_id)).fetchone()[0]
+
+    async def _load(self, key: Key) -> int:
+        if key in self._balances:
+            self.hits += 1
+            self._balances.move_to_end(key)
+            return self._balances[key]
+
+        # Concurrent misses for the same user share one query
+        loading = self._loading.get(key)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        self.misses += 1
+        loading = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            balance = await self.db.write(lambda conn: self._load_balance(conn, *key), "economy_load")
+        except Exception as e:
+            loading.set_exception(e)
+            loading.exception()  # Waiters re-raise it, don't warn when there are none
+            raise
+        finally:
+            del self._loading[key]
+
+        self._balances[key] = balance
+        self._evict()
+        loading.set_result(balance)
+        return balance
+
+    def _evict(self):
+        if len(self._balances) <= self.max_entries:
+            return
+        for key in list(self._balances):
+            if len(self._balances) <= self.max_entries:
+                break
+            if key not in self._unflushed:
+                del self._balances[key]
+
+    def _apply(self, user_id: int, server_id: int, amount: int) -> int:
+        """Change a cached balance and queue the write, the caller must have loaded it"""
+        key = (user_id, server_id)
+        balance = self._balances[key] = self._balances[key] + amount
+        self._unflushed[key] = self._unflushed.get(key, 0) + 1
+        task = asyncio.ensure_future(self._write_back(key, amount))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return balance
+
+    async def _write_back(self, key: Key, amount: int):
+        try:
+            await self.ledger.credit(key[0], key[1], amount)
+        except Exception as e:
+            # The cached balance no longer matches the database, reload it once writes settle
+            print(f"Error writing balance for user {key[0]} in server {key[1]}: {e}")
+            self._stale.add(key)
+        finally:
+            self._unflushed[key] -= 1
+            if not self._unflushed[key]:
+                del self._unflushed[key]
+                if key in self._stale:
+                    self._stale.discard(key)
+                    self._balances.pop(key, None)
+
+    async def ensure_user(self, user_id: int, server_id: int):
+        """Make sure the user has a row in the users table for the server"""
+        await self._load((user_id, server_id))
+
+    async def balance(self, user_id: int, server_id: int) -> int:
+        return await self._load((user_id, server_id))
+
+    async def credit(self, user_id: int, server_id: int, amount: int) -> int:
+        """Add amount to a balance and return the new balance"""
+        await self._load((user_id, server_id))
+        return self._apply(user_id, server_id, amount)
+
+    async def debit(self, user_id: int, server_id: int, amount: int) -> Optional[int]:
+        """Remove amount only if the balance covers it, returning the new balance or None"""
+        balance = await self._load((user_id, server_id))
+        if balance < amount:
+            return None
+        return self._apply(user_id, server_id, -amount)
+
+    async def debit_many(self, server_id: int, amounts: Dict[int, int]) -> Optional[Dict[int, int]]:
+        """Debit several users at once (e.g. both stakes of a match), all or nothing"""
+        for user_id in amounts:
+            await self._load((user_id, server_id))
+        if any(self._balances[(user_id, server_id)] < amount for user_id, amount in amounts.items()):
+            return None
+        return {user_id: self._apply(user_id, server_id, -amount) for user_id, amount in amounts.items()}
+
+    async def transfer(self, sender_id: int, receiver_id: int, server_id: int, amount: int) -> Optional[Tuple[int, int]]:
+        """Move amount between two users, returning both new balances or None if the sender can't cover it"""
+        await self._load((receiver_id, server_id))
+        await self._load((sender_id, server_id))
+        if self._balances[(sender_id, server_id)] < amount:
+            return None
+        # Both writes are queued in the same tick, so the ledger commits them in one transaction
+        return self._apply(sender_id, server_id, -amount), self._apply(receiver_id, server_id, amount)
+
+    def apply_committed(self, user_id: int, server_id: int, amount: int):
+        """Account for a change another transaction already committed, e.g. credit_in_transaction()"""
+        key = (user_id, server_id)
+        if key in self._balances:
+            self._balances[key] += amount
+
+    def invalidate(self, user_id: int, server_id: int):
+        """Forget a cached balance so the next read comes from the database"""
+        key = (user_id, server_id)
+        if key in self._unflushed:
+            self._stale.add(key)
+        else:
+            self._balances.pop(key, None)
+
+    def invalidate_server(self, server_id: int):
+        for key in [key for key in self._balances if key[1] == server_id]:
+            self.invalidate(*key)
+
+    async def drain(self):
+        """Wait until every queued balance change has been committed, e.g. before the engine closes"""
+        while self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        await self.ledger.drain()
+
+    def stats_report(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return f"{len(self._balances)} cached balances, {hit_rate:.1f}% hit rate ({self.hits}/{lookups}), {len(self._unflushed)} pending writes"
+
+
+def get_economy(bot) -> Economy:
+    """Return the economy service shared by every cog, creating it on first use"""
+    ledger = get_ledger(bot)
+    economy = getattr(bot, "economy", None)
+    if economy is None or economy.ledger is not ledger:
+        economy = Economy(ledger)
+        bot.economy = economy
+    return economy
@@ -0,0 +1,187 @@
+import asyncio
+import bisect
+import datetime
+import sqlite3
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.anigame_db import AniGameDB
+from utils.ledger import get_ledger
+from utils.valuation import expected_price
+
+BALANCE = "balance"
+COLLECTION_SIZE = "collection"
+COLLECTION_VALUE = "value"
+METRICS = (BALANCE, COLLECTION_SIZE, COLLECTION_VALUE)
+
+
+class RankedBoard:
+    """
+    One server's scores for one metric, kept sorted by (score desc, user_id).
+
+    Rank and top-N lookups are binary searches over the sorted keys. An update is a
+    binary search plus a list insert, which is a memmove even with tens of thousands
+    of players. Users with a score of zero or less are not ranked.
+    """
+
+    __slots__ = ("_keys", "_scores")
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int]] = []  # (-score, user_id)
+        self._scores: Dict[int, int] = {}
+
+    @classmethod
+    def from_scores(cls, scores: Dict[int, int]) -> "RankedBoard":
+        """Build a board from user_id -> score in one sort"""
+        board = cls()
+        board._scores = {user_id: score for user_id, score in scores.items() if score > 0}
+        board._keys = sorted((-score, user_id) for user_id, score in board._scores.items())
+        return board
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set(self, user_id: int, score: int):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect.bisect_left(self._keys, (-old, user_id))]
+            del self._scores[user_id]
+        if score > 0:
+            bisect.insort(self._keys, (-score, user_id))
+            self._scores[user_id] = score
+
+    def score(self, user_id: int) -> int:
+        return self._scores.get(user_id, 0)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a user, or None when they are unranked"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._keys, (-score, user_id)) + 1
+
+    def top(self, limit: int = 10, offset: int = 0) -> List[Tuple[int, int]]:
+        """(user_id, score) pairs from rank offset + 1 onwards"""
+        return [(user_id, -negative) for negative, user_id in self._keys[offset:offset + limit]]
+
+
+class Leaderboards:
+    """
+    Per-server rankings by balance, collection size and collection value.
+
+    Loaded from anigame.db once, then kept current without scanning: balances arrive
+    from the ledger after every flush, and commands that change a collection call
+    refresh_collections() for the users involved, which re-reads only their rows.
+    Collection value is the sum of each card's expected sell price.
+
+    Full rebuilds read into new boards on a reader thread and are swapped in on the
+    event loop, so /leaderboard never sees a board that is being rebuilt. Rebuilds run
+    one at a time, and updates that arrive during one are replayed onto its new boards.
+    """
+
+    def __init__(self, db: AniGameDB, value_of: Callable[[Optional[int]], int] = expected_price):
+        self.db = db
+        self.value_of = value_of
+        self.ledger = None
+        self._boards: Dict[Tuple[int, str], RankedBoard] = {}
+        self._year = datetime.datetime.now().year
+        self._replay: Optional[List[Tuple[Callable, tuple]]] = None  # updates made during a rebuild
+        self._rebuilding = asyncio.Lock()  # one rebuild at a time, each owns the replay buffer
+
+    def board(self, server_id: int, metric: str) -> RankedBoard:
+        board = self._boards.get((server_id, metric))
+        if board is None:
+            board = self._boards[(server_id, metric)] = RankedBoard()
+        return board
+
+    def build(self, conn: sqlite3.Connection) -> Dict[Tuple[int, str], RankedBoard]:
+        """Read every ranking from anigame.db into new boards, leaving the live ones alone"""
+        scores: Dict[Tuple[int, str], Dict[int, int]] = {}
+        for user_id, server_id, balance in conn.execute("SELECT user_id, server_id, balance FROM users"):
+            scores.setdefault((server_id, BALANCE), {})[user_id] = balance
+
+        for user_id, server_id, anime_year in conn.execute("""
+            SELECT collections.user_id, collections.server_id, characters.anime_year
+            FROM collections
+            JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
+        """):
+            sizes = scores.setdefault((server_id, COLLECTION_SIZE), {})
+            sizes[user_id] = sizes.get(user_id, 0) + 1
+            values = scores.setdefault((server_id, COLLECTION_VALUE), {})
+            values[user_id] = values.get(user_id, 0) + self.value_of(anime_year)
+
+        return {key: RankedBoard.from_scores(board_scores) for key, board_scores in scores.items()}
+
+    def install(self, boards: Dict[Tuple[int, str], RankedBoard]):
+        """Swap in boards from build(), must run on the event loop"""
+        self._boards = boards
+        self._year = datetime.datetime.now().year
+
+    async def rebuild(self):
+        async with self._rebuilding:
+            self._replay = []
+            try:
+                boards = await self.db.read(self.build, "leaderboard_load")
+                replay = self._replay
+            finally:
+                self._replay = None
+            self.install(boards)
+            for update, args in replay:
+                update(*args)
+
+    def set_balance(self, user_id: int, server_id: int, balance: int):
+        if self._replay is not None:
+            self._replay.append((self.set_balance, (user_id, server_id, balance)))
+        self.board(server_id, BALANCE).set(user_id, balance)
+
+    def set_collection(self, user_id: int, server_id: int, years: List[Optional[int]]):
+        """Rank a user's collection from the anime years of every card in it"""
+        if self._replay is not None:
+            self._replay.append((self.set_collection, (user_id, server_id, years)))
+        self.board(server_id, COLLECTION_SIZE).set(user_id, len(years))
+        self.board(server_id, COLLECTION_VALUE).set(user_id, sum(self.value_of(year) for year in years))
+
+    @staticmethod
+    def _collection_years(conn: sqlite3.Connection, server_id: int, user_ids: List[int]) -> Dict[int, List[Optional[int]]]:
+        years: Dict[int, List[Optional[int]]] = {user_id: [] for user_id in user_ids}
+        for user_id in user_ids:
+            for (anime_year,) in conn.execute("""
+                SELECT characters.anime_year
+                FROM collections
+                JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
+                WHERE collections.user_id = ? AND collections.server_id = ?
+            """, (user_id, server_id)):
+                years[user_id].append(anime_year)
+        return years
+
+    async def refresh_collections(self, server_id: int, user_ids: Iterable[int]):
+        """Re-rank the collections of users whose cards just changed hands"""
+        # Prices depend on card age, so rebuild everything once the year rolls over
+        if datetime.datetime.now().year != self._year:
+            await self.rebuild()
+            return
+
+        user_ids = list(user_ids)
+        years = await self.db.read(lambda conn: self._collection_years(conn, server_id, user_ids), "leaderboard_refresh")
+        for user_id, user_years in years.items():
+            self.set_collection(user_id, server_id, user_years)
+
+    def clear_server(self, server_id: int):
+        if self._replay is not None:
+            self._replay.append((self.clear_server, (server_id,)))
+        for metric in METRICS:
+            self._boards.pop((server_id, metric), None)
+
+
+def get_leaderboards(bot) -> Leaderboards:
+    """Return the leaderboards shared by every cog, loading them and subscribing to the ledger on first use"""
+    ledger = get_ledger(bot)
+    leaderboards = getattr(bot, "leaderboards", None)
+    if leaderboards is None or leaderboards.db is not bot.anigame_db or leaderboards.ledger is not ledger:
+        leaderboards = Leaderboards(bot.anigame_db)
+        leaderboards.install(bot.anigame_db.read_sync(leaderboards.build, "leaderboard_load"))
+        ledger.listeners.append(leaderboards.set_balance)
+        leaderboards.ledger = ledger
+        bot.leaderboards = leaderboards
+    return leaderboards
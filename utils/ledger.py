@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+from typing import Callable, List, Optional, Set, Tuple
+
+from utils.anigame_db import AniGameDB
+
+
+class BalanceLedger:
+    """
+    Write-coalescing ledger for the users.balance column.
+
+    Every balance change is a single UPSERT (balance = balance + ?) so there is no
+    read-modify-write race between cogs. Changes that arrive within flush_window
+    seconds of each other are applied in one writer transaction, which means one
+    commit for a burst of /daily, /gamble, /pay or blackjack payouts.
+    """
+
+    def __init__(self, db: AniGameDB, flush_window: float = 0.01, max_batch: int = 500):
+        self.db = db
+        self.flush_window = flush_window
+        self.max_batch = max_batch
+        self.flushes = 0
+        self.entries = 0
+        self._pending: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()  # batches being written, referenced until they commit
+        # Called with (user_id, server_id, balance) for every committed change, e.g. by the leaderboards
+        self.listeners: List[Callable[[int, int, int], None]] = []
+
+    async def credit(self, user_id: int, server_id: int, amount: int) -> int:
+        """Add amount (may be negative) to a balance and return the new balance"""
+        return await self._enqueue(user_id, server_id, amount)
+
+    async def _enqueue(self, user_id: int, server_id: int, amount: int):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_id, server_id, amount, future))
+
+        if len(self._pending) >= self.max_batch or self.flush_window <= 0:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write_batch(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def drain(self):
+        """Write every pending change now and wait for all batches to commit"""
+        self._flush()
+        while self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _write_batch(self, batch):
+        entries = [entry[:3] for entry in batch]
+        try:
+            results = await self.db.write(lambda conn: self._apply(conn, entries), "ledger_flush")
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.flushes += 1
+        self.entries += len(batch)
+        for (user_id, server_id, _, future), balance in zip(batch, results):
+            self.notify(user_id, server_id, balance)
+            if not future.done():
+                future.set_result(balance)
+
+    def notify(self, user_id: int, server_id: int, balance: int):
+        """Tell listeners about a committed balance, also for credits made with credit_in_transaction()"""
+        for listener in self.listeners:
+            try:
+                listener(user_id, server_id, balance)
+            except Exception as e:
+                print(f"Error in balance listener: {e}")
+
+    @staticmethod
+    def credit_in_transaction(conn: sqlite3.Connection, user_id: int, server_id: int, amount: int) -> int:
+        """Apply a credit inside a caller's writer transaction, so it commits together with their other changes"""
+        return BalanceLedger._apply(conn, [(user_id, server_id, amount)])[0]
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, entries) -> List[int]:
+        """Apply every queued change in arrival order inside the writer transaction"""
+        results = []
+        for user_id, server_id, amount in entries:
+            row = conn.execute(
+                """
+                INSERT INTO users (user_id, server_id, balance, last_roll) VALUES (?, ?, ?, 0)
+                ON CONFLICT (user_id, server_id) DO UPDATE SET balance = balance + excluded.balance
+                RETURNING balance
+                """,
+                (user_id, server_id, amount)
+            ).fetchone()
+            results.append(row[0])
+        return results
+
+
+def get_ledger(bot) -> BalanceLedger:
+    """Return the balance ledger shared by every cog, creating it on first use"""
+    ledger = getattr(bot, "balance_ledger", None)
+    if ledger is None or ledger.db is not bot.anigame_db:
+        ledger = BalanceLedger(bot.anigame_db)
+        bot.balance_ledger = ledger
+    return ledger
@@ -0,0 +1,240 @@
+import datetime
+import sqlite3
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from utils.war_tracker import normalize_tag
+
+RESET_HOUR = 5  # Legend League days run from 05:00 UTC to 05:00 UTC
+MAX_BATTLE_TROPHIES = 40  # most trophies a single attack or defense can move
+MAX_DAILY_BATTLES = 8  # attacks (and defenses) a player gets per Legend League day
+MAX_DAY_SWING = MAX_DAILY_BATTLES * MAX_BATTLE_TROPHIES  # anything bigger between snapshots is a season reset
+MAX_SNAPSHOT_GAP = 900  # a longer gap between snapshots may hide battles, the day is then incomplete
+
+
+def legend_day(timestamp: float) -> str:
+    """The Legend League day (YYYY-MM-DD) a unix timestamp falls in"""
+    return datetime.datetime.utcfromtimestamp(timestamp - RESET_HOUR * 3600).strftime("%Y-%m-%d")
+
+
+def next_reset(now: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """The next daily reset as a naive UTC datetime"""
+    now = now or datetime.datetime.utcnow()
+    reset = now.replace(hour=RESET_HOUR, minute=0, second=0, microsecond=0)
+    if reset <= now:
+        reset += datetime.timedelta(days=1)
+    return reset
+
+
+def split_change(delta: int) -> List[int]:
+    """
+    Split a trophy change between two snapshots into the battles behind it.
+
+    A battle moves at most 40 trophies, so a change of +70 is at least two attacks.
+    An attack and a defense that both happen between two snapshots cancel out, so the
+    result is only an estimate: the fewest battles that explain the change, spread evenly.
+    """
+    if delta == 0:
+        return []
+    count = -(-abs(delta) // MAX_BATTLE_TROPHIES)
+    size, extra = divmod(abs(delta), count)
+    sign = 1 if delta > 0 else -1
+    return [sign * (size + 1)] * extra + [sign * size] * (count - extra)
+
+
+class LegendDay(NamedTuple):
+    player_tag: str
+    name: str
+    legend_day: str
+    attacks: int
+    attack_trophies: int
+    defenses: int
+    defense_trophies: int
+    start_trophies: int
+    end_trophies: int
+    complete: bool  # snapshotted from before the reset without long gaps
+
+    @property
+    def overflowed(self) -> bool:
+        """More battles were inferred than a day allows, so the split of the trophy changes is off"""
+        return self.attacks > MAX_DAILY_BATTLES or self.defenses > MAX_DAILY_BATTLES
+
+    @property
+    def shown_attacks(self) -> int:
+        return min(self.attacks, MAX_DAILY_BATTLES)
+
+    @property
+    def shown_defenses(self) -> int:
+        return min(self.defenses, MAX_DAILY_BATTLES)
+
+
+class LegendTracker:
+    """
+    Legend League history for tracked players, stored in coc.db.
+
+    The API only reports a player's current trophies, so the tracker snapshots every
+    tracked player every few minutes and turns each trophy change into the attacks
+    (gains) and defenses (losses) behind it. Battles are kept in legend_events and
+    summed per player and Legend League day in legend_days. A day is only marked
+    complete when it was snapshotted from before its reset without long gaps, and the
+    day commands only skip the API for complete days. Players are tracked on request,
+    up to max_players.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_players: int = 500):
+        self.conn = conn
+        self.max_players = max_players
+        self._trophies: Dict[str, Optional[int]] = {}  # player_tag -> last snapshot
+        self._updated: Dict[str, int] = {}  # player_tag -> time of the last snapshot
+
+    def load(self):
+        self._trophies = {}
+        self._updated = {}
+        for player_tag, trophies, updated_at in self.conn.execute("SELECT player_tag, trophies, updated_at FROM legend_players"):
+            self._trophies[player_tag] = trophies
+            self._updated[player_tag] = updated_at
+
+    def tracked(self) -> List[str]:
+        return list(self._trophies)
+
+    @property
+    def full(self) -> bool:
+        return len(self._trophies) >= self.max_players
+
+    def is_tracked(self, player_tag: str) -> bool:
+        return normalize_tag(player_tag) in self._trophies
+
+    def track(self, player_tag: str, name: str) -> bool:
+        """Start snapshotting a player, returns False if they already were or the tracker is full"""
+        player_tag = normalize_tag(player_tag)
+        if player_tag in self._trophies or self.full:
+            return False
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO legend_players (player_tag, name, trophies, updated_at) VALUES (?, ?, NULL, ?)",
+                (player_tag, name, int(time.time()))
+            )
+        self._trophies[player_tag] = None
+        return True
+
+    def untrack(self, player_tag: str):
+        """Stop snapshotting a player, their recorded days are kept"""
+        player_tag = normalize_tag(player_tag)
+        if player_tag not in self._trophies:
+            return
+        del self._trophies[player_tag]
+        self._updated.pop(player_tag, None)
+        with self.conn:
+            self.conn.execute("DELETE FROM legend_players WHERE player_tag = ?", (player_tag,))
+
+    def snapshot(self, player_tag: str, player_data: Dict[str, Any], now: Optional[float] = None) -> List[int]:
+        """
+        Record a player's current trophies from a players/{tag} response
+
+        Returns:
+            The trophy change of every battle derived from the snapshot
+        """
+        player_tag = normalize_tag(player_tag)
+        if player_tag not in self._trophies:
+            return []
+
+        league = (player_data.get("league") or {}).get("name", "")
+        if "Legend" not in league or "legendStatistics" not in player_data:
+            # Dropped out of Legend League, nothing left to track
+            self.untrack(player_tag)
+            return []
+
+        now = int(now if now is not None else time.time())
+        day = legend_day(now)
+        trophies = player_data["trophies"]
+        previous = self._trophies[player_tag]
+        previous_at = self._updated.get(player_tag)
+
+        # Battles can only be told apart between close snapshots of a known baseline
+        complete = previous is not None and previous_at is not None and now - previous_at <= MAX_SNAPSHOT_GAP
+        if previous is None or abs(trophies - previous) > MAX_DAY_SWING:
+            # First snapshot or a season reset, start a new baseline
+            previous = trophies
+            complete = False
+        changes = split_change(trophies - previous)
+        attacks = [change for change in changes if change > 0]
+        defenses = [change for change in changes if change < 0]
+
+        with self.conn:
+            self.conn.execute(
+                "UPDATE legend_players SET name = ?, trophies = ?, updated_at = ? WHERE player_tag = ?",
+                (player_data.get("name", player_tag), trophies, now, player_tag)
+            )
+            # The first snapshot of a day creates its row, even without battles. It is only
+            # complete if that snapshot continues one from before the reset
+            self.conn.execute(
+                """
+                INSERT INTO legend_days
+                (player_tag, legend_day, attacks, attack_trophies, defenses, defense_trophies, start_trophies, end_trophies, complete)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (player_tag, legend_day) DO UPDATE SET
+                    complete = complete AND excluded.complete,
+                    attacks = attacks + excluded.attacks,
+                    attack_trophies = attack_trophies + excluded.attack_trophies,
+                    defenses = defenses + excluded.defenses,
+                    defense_trophies = defense_trophies + excluded.defense_trophies,
+                    end_trophies = excluded.end_trophies
+                """,
+                (player_tag, day, len(attacks), sum(attacks), len(defenses), sum(defenses), previous, trophies, int(complete))
+            )
+            running = previous
+            events = []
+            for change in changes:
+                running += change
+                events.append((player_tag, day, now, change, running))
+            self.conn.executemany(
+                "INSERT INTO legend_events (player_tag, legend_day, recorded_at, change, trophies) VALUES (?, ?, ?, ?, ?)",
+                events
+            )
+
+        self._trophies[player_tag] = trophies
+        self._updated[player_tag] = now
+        return changes
+
+    def day(self, player_tag: str, day: Optional[str] = None) -> Optional[LegendDay]:
+        """A player's rollup for a Legend League day (today by default), None if nothing was recorded"""
+        row = self.conn.execute(
+            """
+            SELECT legend_days.player_tag, COALESCE(legend_players.name, legend_days.player_tag), legend_days.legend_day,
+                   attacks, attack_trophies, defenses, defense_trophies, start_trophies, end_trophies, complete
+            FROM legend_days
+            LEFT JOIN legend_players ON legend_players.player_tag = legend_days.player_tag
+            WHERE legend_days.player_tag = ? AND legend_days.legend_day = ?
+            """,
+            (normalize_tag(player_tag), day or legend_day(time.time()))
+        ).fetchone()
+        if not row:
+            return None
+        return LegendDay(*row[:-1], complete=bool(row[-1]))
+
+    def latest_day(self, player_tag: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT MAX(legend_day) FROM legend_days WHERE player_tag = ?", (normalize_tag(player_tag),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def events(self, player_tag: str, day: str) -> List[Tuple[int, int, int]]:
+        """(recorded_at, change, trophies after) of each battle on a day, in order"""
+        return self.conn.execute(
+            """
+            SELECT recorded_at, change, trophies FROM legend_events
+            WHERE player_tag = ? AND legend_day = ?
+            ORDER BY event_id
+            """,
+            (normalize_tag(player_tag), day)
+        ).fetchall()
+
+
+def get_legend_tracker(bot) -> LegendTracker:
+    """Return the Legend League tracker shared by the Clash cogs, on the connection from get_coc_db()"""
+    tracker = getattr(bot, "legend_tracker", None)
+    if tracker is None or tracker.conn is not bot.coc_db:
+        tracker = LegendTracker(bot.coc_db)
+        tracker.load()
+        bot.legend_tracker = tracker
+    return tracker
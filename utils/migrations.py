@@ -0,0 +1,46 @@
+import sqlite3
+from typing import Callable, List, Sequence, Tuple, Union
+
+# (version, description, SQL statements or a function that receives the connection)
+Migration = Tuple[int, str, Union[Sequence[str], Callable[[sqlite3.Connection], None]]]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: List[Migration], name: str = "database") -> int:
+    """
+    Apply every migration newer than the database's user_version, in version order.
+
+    Each migration runs in its own transaction together with the version bump, unless
+    the caller already holds a transaction, in which case everything joins it.
+    Returns the resulting schema version.
+    """
+    current = schema_version(conn)
+    owns_transaction = not conn.in_transaction
+
+    for version, description, step in sorted(migrations, key=lambda migration: migration[0]):
+        if version <= current:
+            continue
+
+        if owns_transaction:
+            conn.execute("BEGIN")
+        try:
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            if owns_transaction:
+                conn.execute("COMMIT")
+        except Exception:
+            if owns_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+        print(f"Applied {name} migration {version}: {description}")
+        current = version
+
+    return current
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import nextcord
+
+Subscription = Tuple[int, int, int]  # (user_id, guild_id, channel_id)
+
+
+class NotificationDispatcher:
+    """
+    Fan-out sender for notifications that go to many subscribers at once.
+
+    Subscribers are grouped per channel and their mentions packed into as few messages
+    as Discord's length limit allows. Channels are sent to concurrently, but each
+    channel (Discord's rate limit route) only ever has one send in flight.
+    """
+
+    def __init__(self, bot, max_channels: int = 10, message_limit: int = 2000, history: int = 500):
+        self.bot = bot
+        self.message_limit = message_limit
+        self.latencies: Deque[float] = deque(maxlen=history)  # seconds from event to delivery
+        self.messages_sent = 0
+        self._channels = asyncio.Semaphore(max_channels)
+        self._routes: Dict[int, asyncio.Semaphore] = {}
+
+    def pack_mentions(self, user_ids: Iterable[int]) -> List[str]:
+        """Join user mentions into as few messages as the length limit allows"""
+        messages = []
+        current = ""
+        for user_id in user_ids:
+            mention = f"<@{user_id}>"
+            if current and len(current) + 1 + len(mention) > self.message_limit:
+                messages.append(current)
+                current = mention
+            else:
+                current = f"{current} {mention}" if current else mention
+        if current:
+            messages.append(current)
+        return messages
+
+    def _route(self, channel_id: int) -> asyncio.Semaphore:
+        route = self._routes.get(channel_id)
+        if route is None:
+            route = self._routes[channel_id] = asyncio.Semaphore(1)
+        return route
+
+    async def dispatch(self, subscriptions: Iterable[Subscription], embed: nextcord.Embed, event_time: Optional[float] = None) -> int:
+        """
+        Notify every subscriber, returning the number of messages sent
+
+        Args:
+            subscriptions: (user_id, guild_id, channel_id) rows
+            embed: Embed attached to the first message in each channel
+            event_time: Unix timestamp of the event, used to measure delivery latency
+        """
+        by_channel: Dict[Tuple[int, int], List[int]] = {}
+        for user_id, guild_id, channel_id in subscriptions:
+            users = by_channel.setdefault((guild_id, channel_id), [])
+            if user_id not in users:
+                users.append(user_id)
+
+        started = time.time()
+        results = await asyncio.gather(
+            *(self._send_channel(channel_id, users, embed) for (_, channel_id), users in by_channel.items())
+        )
+        sent = sum(results)
+        self.messages_sent += sent
+
+        if sent:
+            latency = time.time() - (event_time or started)
+            self.latencies.append(latency)
+            print(f"Delivered notification to {len(by_channel)} channels in {sent} messages, {latency:.1f}s after the event")
+        return sent
+
+    async def _send_channel(self, channel_id: int, user_ids: List[int], embed: nextcord.Embed) -> int:
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            return 0
+
+        sent = 0
+        # Queue on the channel's route before taking a global slot, so sends waiting for
+        # a busy channel don't hold slots other channels could use
+        async with self._route(channel_id), self._channels:
+            for index, content in enumerate(self.pack_mentions(user_ids)):
+                try:
+                    await channel.send(content, embed=embed if index == 0 else None)
+                    sent += 1
+                except Exception as e:
+                    print(f"Error sending notification to channel {channel_id}: {str(e)}")
+                    break
+        return sent
+
+    def latency_report(self) -> str:
+        if not self.latencies:
+            return "No notifications delivered yet"
+        ordered = sorted(self.latencies)
+        p50 = ordered[len(ordered) // 2]
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return f"{self.messages_sent} messages, delivery latency p50 {p50:.1f}s / p95 {p95:.1f}s / max {ordered[-1]:.1f}s"
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one.
+
+    The first caller starts fn() as a task, and everyone who asks for the same key
+    before it finishes awaits that task and gets the same result or exception. Nothing
+    is kept once it finishes, so results are never staler than a direct call. A caller
+    being cancelled doesn't cancel the request for the others.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Waiters re-raise it, don't warn when there are none
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats_report(self) -> str:
+        total = self.calls + self.shared
+        rate = self.shared / total * 100 if total else 0.0
+        return f"{self.calls} requests sent, {self.shared} callers coalesced ({rate:.0f}%), {len(self._tasks)} in flight"
@@ -0,0 +1,74 @@
+import sqlite3
+from typing import Dict, List, Set, Tuple
+
+Subscriber = Tuple[int, int, int]  # (user_id, guild_id, channel_id)
+
+
+class SubscriptionIndex:
+    """
+    In-memory mirror of anime_subscriptions and notified_episodes.
+
+    Loaded once at startup and kept current by the commands that write those tables,
+    so the airing scheduler and the dispatcher never have to query SQLite.
+    """
+
+    def __init__(self):
+        # (user_id, anime_id, guild_id) is the table's UNIQUE key
+        self._channels: Dict[Tuple[int, int, int], int] = {}
+        self._by_anime: Dict[int, Set[Tuple[int, int]]] = {}  # anime_id -> {(user_id, guild_id)}
+        self._by_user: Dict[int, Set[Tuple[int, int]]] = {}  # user_id -> {(anime_id, guild_id)}
+        self._notified: Dict[int, Set[int]] = {}  # anime_id -> notified episode numbers
+
+    def load(self, conn: sqlite3.Connection):
+        self.__init__()
+        for user_id, anime_id, guild_id, channel_id in conn.execute(
+            "SELECT user_id, anime_id, guild_id, channel_id FROM anime_subscriptions"
+        ):
+            self.add(user_id, anime_id, guild_id, channel_id)
+        for anime_id, episode in conn.execute("SELECT anime_id, episode_number FROM notified_episodes"):
+            self._notified.setdefault(anime_id, set()).add(episode)
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def anime_ids(self) -> List[int]:
+        return list(self._by_anime)
+
+    def subscribers(self, anime_id: int) -> List[Subscriber]:
+        return [
+            (user_id, guild_id, self._channels[(user_id, anime_id, guild_id)])
+            for user_id, guild_id in self._by_anime.get(anime_id, ())
+        ]
+
+    def add(self, user_id: int, anime_id: int, guild_id: int, channel_id: int):
+        self._channels[(user_id, anime_id, guild_id)] = channel_id
+        self._by_anime.setdefault(anime_id, set()).add((user_id, guild_id))
+        self._by_user.setdefault(user_id, set()).add((anime_id, guild_id))
+
+    def remove(self, user_id: int, anime_id: int):
+        """Drop a user's subscriptions to an anime in every guild"""
+        for entry in [entry for entry in self._by_user.get(user_id, ()) if entry[0] == anime_id]:
+            guild_id = entry[1]
+            del self._channels[(user_id, anime_id, guild_id)]
+            self._by_user[user_id].discard(entry)
+            subscribers = self._by_anime[anime_id]
+            subscribers.discard((user_id, guild_id))
+            if not subscribers:
+                del self._by_anime[anime_id]
+        if not self._by_user.get(user_id, True):
+            del self._by_user[user_id]
+
+    def set_channel(self, user_id: int, guild_id: int, channel_id: int):
+        """Move all of a user's subscriptions in a guild to another channel"""
+        for anime_id, entry_guild in self._by_user.get(user_id, ()):
+            if entry_guild == guild_id:
+                self._channels[(user_id, anime_id, guild_id)] = channel_id
+
+    def is_notified(self, anime_id: int, episode: int) -> bool:
+        return episode in self._notified.get(anime_id, ())
+
+    def mark_notified(self, anime_id: int, episode: int):
+        self._notified.setdefault(anime_id, set()).add(episode)
+
+    def forget_notified(self, anime_id: int):
+        self._notified.pop(anime_id, None)
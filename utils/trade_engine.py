@@ -0,0 +1,202 @@
+import sqlite3
+import time
+from typing import List, NamedTuple, Optional
+
+from utils.anigame_db import AniGameDB
+
+PENDING = "pending"
+COMPLETED = "completed"
+DECLINED = "declined"
+EXPIRED = "expired"
+
+
+class TradeError(Exception):
+    """A trade that can't go through, the message is shown to the user as is"""
+
+
+class Trade(NamedTuple):
+    trade_id: int
+    sender_id: int
+    receiver_id: int
+    server_id: int
+    character_id: int
+    request_char_id: int  # 0 when any of the receiver's characters will do
+    created_at: int
+    channel_id: Optional[int]
+    message_id: Optional[int]
+
+
+class TradeResult(NamedTuple):
+    trade: Trade
+    offered_name: str
+    received_id: int
+    received_name: str
+
+
+_TRADE_SQL = """
+    SELECT trades.trade_id, sender_id, receiver_id, server_id, character_id,
+           COALESCE(trade_requests.request_char_id, 0), created_at, channel_id, message_id
+    FROM trades
+    LEFT JOIN trade_requests ON trade_requests.trade_id = trades.trade_id
+"""
+
+
+class TradeEngine:
+    """
+    Pending trades of anigame.db, each state change done in one writer transaction.
+
+    Ownership is checked by the swap itself: every collection row is moved with an
+    UPDATE that only matches while the expected user still owns the character, and
+    any miss rolls the whole trade back. A trade only leaves the pending state once,
+    so a double click or a late expiry can't complete it twice.
+    """
+
+    def __init__(self, db: AniGameDB, ttl: int = 86400):
+        self.db = db
+        self.ttl = ttl
+
+    @staticmethod
+    def _owns(conn: sqlite3.Connection, user_id: int, server_id: int, character_id: int) -> Optional[tuple]:
+        return conn.execute("""
+            SELECT characters.character_id, characters.name, characters.image_url
+            FROM collections
+            JOIN characters ON collections.character_id = characters.character_id AND collections.server_id = characters.server_id
+            WHERE collections.user_id = ? AND collections.server_id = ? AND collections.character_id = ?
+        """, (user_id, server_id, character_id)).fetchone()
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, trade_id: int, status: Optional[str] = None) -> Optional[Trade]:
+        sql = _TRADE_SQL + " WHERE trades.trade_id = ?"
+        params = [trade_id]
+        if status is not None:
+            sql += " AND trades.status = ?"
+            params.append(status)
+        row = conn.execute(sql, params).fetchone()
+        return Trade(*row) if row else None
+
+    async def create(self, sender_id: int, receiver_id: int, server_id: int, offer_id: int, request_id: int = 0):
+        """
+        Record a pending trade after checking both sides own their characters
+
+        Returns:
+            (trade_id, offered (id, name, image_url), requested (id, name, image_url) or None)
+        """
+        now = int(time.time())
+
+        def run(conn):
+            offered = self._owns(conn, sender_id, server_id, offer_id)
+            if not offered:
+                raise TradeError("You don't own the character you're trying to offer!")
+
+            requested = None
+            if request_id > 0:
+                requested = self._owns(conn, receiver_id, server_id, request_id)
+                if not requested:
+                    raise TradeError("That user doesn't own the character you're requesting!")
+
+            trade_id = conn.execute(
+                "INSERT INTO trades (sender_id, receiver_id, server_id, character_id, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (sender_id, receiver_id, server_id, offer_id, PENDING, now)
+            ).lastrowid
+            if request_id > 0:
+                conn.execute("INSERT INTO trade_requests (trade_id, request_char_id) VALUES (?, ?)", (trade_id, request_id))
+            return trade_id, offered, requested
+
+        return await self.db.write(run, "trade_create")
+
+    async def attach_message(self, trade_id: int, channel_id: int, message_id: int):
+        """Remember where the offer was posted so an expiry can update it"""
+        await self.db.execute("UPDATE trades SET channel_id = ?, message_id = ? WHERE trade_id = ?", (channel_id, message_id, trade_id))
+
+    async def accept(self, trade_id: int, user_id: int) -> TradeResult:
+        """Swap both characters and complete the trade, raising TradeError if it can't go through"""
+        now = int(time.time())
+
+        def run(conn):
+            trade = self._get(conn, trade_id, PENDING)
+            if not trade or trade.created_at <= now - self.ttl:
+                raise TradeError("This trade is no longer valid!")
+            if trade.receiver_id != user_id:
+                raise TradeError("This trade isn't for you to accept!")
+
+            received_id = trade.request_char_id
+            if received_id == 0:
+                # Any character will do, take a random one of the receiver's
+                row = conn.execute(
+                    "SELECT character_id FROM collections WHERE user_id = ? AND server_id = ? ORDER BY RANDOM() LIMIT 1",
+                    (trade.receiver_id, trade.server_id)
+                ).fetchone()
+                if not row:
+                    raise TradeError("You don't have any characters to trade!")
+                received_id = row[0]
+
+            moved = conn.execute(
+                "UPDATE collections SET user_id = ? WHERE user_id = ? AND server_id = ? AND character_id = ?",
+                (trade.receiver_id, trade.sender_id, trade.server_id, trade.character_id)
+            ).rowcount
+            if not moved:
+                raise TradeError("The sender no longer owns the offered character!")
+
+            moved = conn.execute(
+                "UPDATE collections SET user_id = ? WHERE user_id = ? AND server_id = ? AND character_id = ?",
+                (trade.sender_id, trade.receiver_id, trade.server_id, received_id)
+            ).rowcount
+            if not moved:
+                raise TradeError("You no longer own the requested character!")
+
+            conn.execute("UPDATE trades SET status = ? WHERE trade_id = ?", (COMPLETED, trade_id))
+
+            names = dict(conn.execute(
+                "SELECT character_id, name FROM characters WHERE server_id = ? AND character_id IN (?, ?)",
+                (trade.server_id, trade.character_id, received_id)
+            ).fetchall())
+            return TradeResult(
+                trade,
+                names.get(trade.character_id, f"Character #{trade.character_id}"),
+                received_id,
+                names.get(received_id, f"Character #{received_id}"),
+            )
+
+        return await self.db.write(run, "trade_accept")
+
+    async def decline(self, trade_id: int, user_id: int) -> Trade:
+        def run(conn):
+            trade = self._get(conn, trade_id, PENDING)
+            if not trade:
+                raise TradeError("This trade is no longer valid!")
+            if trade.receiver_id != user_id:
+                raise TradeError("This trade isn't for you to decline!")
+            conn.execute("UPDATE trades SET status = ? WHERE trade_id = ?", (DECLINED, trade_id))
+            return trade
+
+        return await self.db.write(run, "trade_decline")
+
+    async def expire(self, now: Optional[int] = None) -> List[Trade]:
+        """Mark every pending trade older than the TTL as expired and return them"""
+        cutoff = (now if now is not None else int(time.time())) - self.ttl
+
+        def run(conn):
+            rows = conn.execute(
+                _TRADE_SQL + " WHERE trades.status = ? AND trades.created_at <= ?", (PENDING, cutoff)
+            ).fetchall()
+            conn.executemany("UPDATE trades SET status = ? WHERE trade_id = ?", [(EXPIRED, row[0]) for row in rows])
+            return [Trade(*row) for row in rows]
+
+        return await self.db.write(run, "trade_expire")
+
+    async def pending(self) -> List[Trade]:
+        """Every pending trade, used to re-attach their buttons after a restart"""
+        return await self.db.read(
+            lambda conn: [Trade(*row) for row in conn.execute(_TRADE_SQL + " WHERE trades.status = ?", (PENDING,))],
+            "trade_pending"
+        )
+
+    async def incoming(self, receiver_id: int, server_id: int) -> List[Trade]:
+        """Pending trades offered to a user in a server, oldest first"""
+        return await self.db.read(
+            lambda conn: [Trade(*row) for row in conn.execute(
+                _TRADE_SQL + " WHERE trades.receiver_id = ? AND trades.status = ? AND trades.server_id = ? ORDER BY trades.created_at",
+                (receiver_id, PENDING, server_id)
+            )],
+            "trade_incoming"
+        )
@@ -0,0 +1,54 @@
+import datetime
+from typing import Optional, Sequence
+
+import numpy as np
+
+# (maximum age in years, lowest price, highest price), newest band first
+PRICE_BANDS = [
+    (1, 130, 150),  # current year or last year
+    (3, 100, 130),
+    (5, 80, 100),
+]
+OLDER_PRICE = (50, 80)
+UNKNOWN_YEAR_PRICE = (50, 150)
+
+
+class CharacterValuation:
+    """
+    Sell prices for characters based on the year their anime started.
+
+    Whole batches are priced at once with NumPy: ages are bucketed into price bands
+    and one draw from a seeded generator picks each price within its band (inclusive).
+    """
+
+    def __init__(self, seed: Optional[int] = None, current_year: Optional[int] = None):
+        self.rng = np.random.default_rng(seed)
+        self.current_year = current_year
+
+    def price_batch(self, years: Sequence[Optional[int]]) -> np.ndarray:
+        """Return one price per anime year (None or 0 for an unknown year)"""
+        years = np.array([year or 0 for year in years], dtype=np.int64)
+        if years.size == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        current_year = self.current_year or datetime.datetime.now().year
+        age = current_year - years
+        unknown = years == 0
+
+        conditions = [unknown] + [age <= max_age for max_age, _, _ in PRICE_BANDS]
+        low = np.select(conditions, [UNKNOWN_YEAR_PRICE[0]] + [band[1] for band in PRICE_BANDS], OLDER_PRICE[0])
+        high = np.select(conditions, [UNKNOWN_YEAR_PRICE[1]] + [band[2] for band in PRICE_BANDS], OLDER_PRICE[1])
+        return self.rng.integers(low, high, endpoint=True)
+
+    def price(self, year: Optional[int]) -> int:
+        return int(self.price_batch([year])[0])
+
+
+def expected_price(year: Optional[int], current_year: Optional[int] = None) -> int:
+    """Midpoint of a card's price band, a stable value for ranking collections"""
+    if not year:
+        low, high = UNKNOWN_YEAR_PRICE
+    else:
+        age = (current_year or datetime.datetime.now().year) - year
+        low, high = next(((band_low, band_high) for max_age, band_low, band_high in PRICE_BANDS if age <= max_age), OLDER_PRICE)
+    return (low + high) // 2
@@ -0,0 +1,254 @@
+import calendar
+import sqlite3
+import time
+import urllib.parse
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+# fetch(endpoint) returns the parsed API response, e.g. ClashOfClans.fetch_data
+Fetch = Callable[[str], Awaitable[Dict[str, Any]]]
+
+PREPARATION = "preparation"
+IN_WAR = "inWar"
+WAR_ENDED = "warEnded"
+NOT_IN_WAR = "notInWar"
+
+
+def normalize_tag(tag: str) -> str:
+    return "#" + tag.strip().lstrip("#").upper()
+
+
+def parse_api_time(value: str) -> int:
+    """Unix timestamp from the API's 20240101T120000.000Z format"""
+    return calendar.timegm(time.strptime(value, "%Y%m%dT%H%M%S.%fZ"))
+
+
+class WarAttack(NamedTuple):
+    attack_order: int
+    attacker_tag: str
+    attacker_name: str
+    defender_tag: str
+    defender_name: str
+    stars: int
+    destruction: int
+    duration: int
+    is_opponent: bool
+
+
+class TrackedClan:
+    __slots__ = ("tag", "channels", "war_id", "seen", "primed", "next_poll")
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.channels: Dict[int, int] = {}  # guild_id -> channel_id
+        self.war_id: Optional[int] = None
+        self.seen: Set[int] = set()  # attack orders already stored for war_id
+        self.primed = False  # False until the first poll, whose attacks aren't announced
+        self.next_poll = 0.0
+
+
+class WarTracker:
+    """
+    Follows the current war of every registered clan and records each attack once.
+
+    Clans are polled every battle_interval seconds on battle day. During preparation
+    the tracker sleeps until the war starts, and with no war it only checks every
+    idle_interval. Each poll is diffed against the attack orders already stored for
+    the war, so only new attacks are written to coc.db and returned for announcing.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, fetch: Fetch, battle_interval: int = 120,
+                 idle_interval: int = 1800, retry_interval: int = 300):
+        self.conn = conn
+        self.fetch = fetch
+        self.battle_interval = battle_interval
+        self.idle_interval = idle_interval
+        self.retry_interval = retry_interval
+        self.clans: Dict[str, TrackedClan] = {}
+
+    def load(self):
+        self.clans = {}
+        for clan_tag, guild_id, channel_id in self.conn.execute("SELECT clan_tag, guild_id, channel_id FROM war_trackers"):
+            self._clan(clan_tag).channels[guild_id] = channel_id
+
+        # Resume the latest unfinished war of each clan where the last run left off
+        for clan in self.clans.values():
+            row = self.conn.execute(
+                "SELECT war_id, state FROM wars WHERE clan_tag = ? ORDER BY war_id DESC LIMIT 1", (clan.tag,)
+            ).fetchone()
+            if row and row[1] != WAR_ENDED:
+                self._resume(clan, row[0])
+                clan.primed = True
+
+    def _clan(self, clan_tag: str) -> TrackedClan:
+        clan = self.clans.get(clan_tag)
+        if clan is None:
+            clan = self.clans[clan_tag] = TrackedClan(clan_tag)
+        return clan
+
+    def _resume(self, clan: TrackedClan, war_id: int):
+        clan.war_id = war_id
+        clan.seen = {order for (order,) in self.conn.execute("SELECT attack_order FROM war_attacks WHERE war_id = ?", (war_id,))}
+
+    def register(self, guild_id: int, channel_id: int, clan_tag: str) -> bool:
+        """Post a clan's attacks to a channel, returns False if it was already tracked there"""
+        clan_tag = normalize_tag(clan_tag)
+        clan = self._clan(clan_tag)
+        is_new = guild_id not in clan.channels
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO war_trackers (clan_tag, guild_id, channel_id) VALUES (?, ?, ?)
+                ON CONFLICT (clan_tag, guild_id) DO UPDATE SET channel_id = excluded.channel_id
+                """,
+                (clan_tag, guild_id, channel_id)
+            )
+        clan.channels[guild_id] = channel_id
+        return is_new
+
+    def unregister(self, guild_id: int, clan_tag: str) -> bool:
+        clan_tag = normalize_tag(clan_tag)
+        clan = self.clans.get(clan_tag)
+        if clan is None or guild_id not in clan.channels:
+            return False
+        with self.conn:
+            self.conn.execute("DELETE FROM war_trackers WHERE clan_tag = ? AND guild_id = ?", (clan_tag, guild_id))
+        del clan.channels[guild_id]
+        if not clan.channels:
+            del self.clans[clan_tag]
+        return True
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        now = now if now is not None else time.time()
+        return [clan.tag for clan in self.clans.values() if clan.next_poll <= now]
+
+    async def poll(self, clan_tag: str, now: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], List[WarAttack]]:
+        """
+        Fetch a clan's current war and store the attacks made since the last poll
+
+        Returns:
+            The war response (None if the request failed) and the new attacks to announce
+        """
+        clan = self.clans.get(clan_tag)
+        if clan is None:
+            return None, []
+
+        try:
+            war = await self.fetch(f"clans/{urllib.parse.quote(clan_tag)}/currentwar")
+        except Exception as e:
+            # Private war logs and API outages both land here
+            print(f"Error polling war for clan {clan_tag}: {e}")
+            clan.next_poll = (now if now is not None else time.time()) + self.retry_interval
+            return None, []
+
+        now = now if now is not None else time.time()
+        new_attacks: List[WarAttack] = []
+        if war.get("state") in (PREPARATION, IN_WAR, WAR_ENDED) and "preparationStartTime" in war:
+            new_attacks = self._record(clan, war)
+
+        announce = clan.primed
+        clan.primed = True
+        clan.next_poll = self._next_poll(war, now)
+        return war, new_attacks if announce else []
+
+    def _record(self, clan: TrackedClan, war: Dict[str, Any]) -> List[WarAttack]:
+        with self.conn:
+            war_id = self.conn.execute(
+                """
+                INSERT INTO wars (clan_tag, clan_name, opponent_tag, opponent_name, team_size, preparation_start, start_time, end_time, state)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (clan_tag, preparation_start) DO UPDATE SET state = excluded.state, end_time = excluded.end_time
+                RETURNING war_id
+                """,
+                (
+                    clan.tag, war["clan"].get("name", ""), war["opponent"]["tag"], war["opponent"].get("name", ""), war.get("teamSize", 0),
+                    parse_api_time(war["preparationStartTime"]), parse_api_time(war["startTime"]),
+                    parse_api_time(war["endTime"]), war["state"],
+                )
+            ).fetchone()[0]
+            if war_id != clan.war_id:
+                self._resume(clan, war_id)
+
+            new_attacks = [attack for attack in self._attacks(war) if attack.attack_order not in clan.seen]
+            self.conn.executemany(
+                """
+                INSERT OR IGNORE INTO war_attacks
+                (war_id, attack_order, attacker_tag, attacker_name, defender_tag, stars, destruction, duration, is_opponent)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (war_id, attack.attack_order, attack.attacker_tag, attack.attacker_name, attack.defender_tag,
+                     attack.stars, attack.destruction, attack.duration, int(attack.is_opponent))
+                    for attack in new_attacks
+                ]
+            )
+
+        clan.seen.update(attack.attack_order for attack in new_attacks)
+        new_attacks.sort(key=lambda attack: attack.attack_order)
+        return new_attacks
+
+    @staticmethod
+    def _attacks(war: Dict[str, Any]) -> List[WarAttack]:
+        names = {
+            member["tag"]: member["name"]
+            for side in ("clan", "opponent") for member in war[side].get("members", [])
+        }
+        attacks = []
+        for side in ("clan", "opponent"):
+            for member in war[side].get("members", []):
+                for attack in member.get("attacks", []):
+                    attacks.append(WarAttack(
+                        attack["order"], member["tag"], member["name"], attack["defenderTag"],
+                        names.get(attack["defenderTag"], attack["defenderTag"]), attack.get("stars", 0),
+                        attack.get("destructionPercentage", 0), attack.get("duration", 0), side == "opponent",
+                    ))
+        return attacks
+
+    def _next_poll(self, war: Dict[str, Any], now: float) -> float:
+        state = war.get("state")
+        if state == IN_WAR:
+            # Fast on battle day, with one last poll right after the end to catch the final attacks
+            end_time = parse_api_time(war["endTime"])
+            return min(now + self.battle_interval, max(end_time, now + 1))
+        if state == PREPARATION:
+            # Nothing can happen until battle day
+            start_time = parse_api_time(war["startTime"])
+            return min(max(start_time, now + 1), now + self.idle_interval)
+        return now + self.idle_interval
+
+    def member_history(self, player_tag: str, limit: int = 10) -> Tuple[tuple, List[tuple]]:
+        """
+        A member's attack totals and latest attacks from the recorded wars
+
+        Returns:
+            (attacks, stars, average destruction, three stars) and up to limit
+            (opponent name, start time, stars, destruction) rows, newest first
+        """
+        player_tag = normalize_tag(player_tag)
+        # A war between two tracked clans is stored once per clan, count each attack once
+        # by war identity (preparation start plus both clan tags) and attack order
+        attacks = """
+            SELECT CASE war_attacks.is_opponent WHEN 1 THEN wars.clan_name ELSE wars.opponent_name END AS opponent,
+                   wars.start_time, war_attacks.attack_order, war_attacks.stars, war_attacks.destruction
+            FROM war_attacks
+            JOIN wars ON wars.war_id = war_attacks.war_id
+            WHERE war_attacks.attacker_tag = ?
+            GROUP BY wars.preparation_start, MIN(wars.clan_tag, wars.opponent_tag), MAX(wars.clan_tag, wars.opponent_tag),
+                     war_attacks.attack_order, war_attacks.defender_tag
+        """
+        totals = self.conn.execute(
+            f"""
+            SELECT COUNT(*), COALESCE(SUM(stars), 0), COALESCE(AVG(destruction), 0), COALESCE(SUM(stars = 3), 0)
+            FROM ({attacks})
+            """,
+            (player_tag,)
+        ).fetchone()
+        recent = self.conn.execute(
+            f"""
+            SELECT opponent, start_time, stars, destruction
+            FROM ({attacks})
+            ORDER BY start_time DESC, attack_order DESC
+            LIMIT ?
+            """,
+            (player_tag, limit)
+        ).fetchall()
+        return totals, recent